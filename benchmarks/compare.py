@@ -0,0 +1,75 @@
+"""
+Сравнивает результаты прогона с сохранённым baseline и сообщает о регрессиях.
+
+Запуск: python -m benchmarks.compare benchmark-results.json benchmarks/baseline.json [--threshold 0.1]
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+# Разница меньше этой считается шумом, даже если в процентах она большая
+MIN_LATENCY_DELTA_MS = 1.0
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+
+    def check_latency(name: str, now: dict, before: dict) -> None:
+        for key in LATENCY_KEYS:
+            if key not in now or key not in before:
+                continue
+            if now[key] > before[key] * (1 + threshold) and now[key] - before[key] >= MIN_LATENCY_DELTA_MS:
+                regressions.append(f"{name}: {key} {before[key]} -> {now[key]}")
+
+    check_latency("total", current["total"], baseline["total"])
+    if current["total"]["throughput_rps"] < baseline["total"]["throughput_rps"] * (1 - threshold):
+        regressions.append(
+            f"total: throughput {baseline['total']['throughput_rps']} -> {current['total']['throughput_rps']} rps"
+        )
+
+    for name, before in baseline["endpoints"].items():
+        now = current["endpoints"].get(name)
+        if now is None:
+            continue
+        check_latency(name, now, before)
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {now['errors']}")
+        # Число SQL-запросов не шумит: любой рост — это новый запрос в коде
+        queries_now, queries_before = now.get("queries_per_request"), before.get("queries_per_request")
+        if queries_now is not None and queries_before is not None and queries_now > queries_before + 0.5:
+            regressions.append(f"{name}: queries per request {queries_before} -> {queries_now}")
+
+    return regressions
+
+
+def print_regressions(regressions: List[str]) -> None:
+    if not regressions:
+        print("No regressions against baseline")
+        return
+    print(f"{len(regressions)} regressions against baseline:")
+    for line in regressions:
+        print(f"  {line}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare benchmark results with a baseline")
+    parser.add_argument("current")
+    parser.add_argument("baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    with open(args.current) as f:
+        current = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(current, baseline, args.threshold)
+    print_regressions(regressions)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Заполняет локальную базу синтетическими данными через COPY: пользователи,
+граф подписок со степенным распределением, посты и комментарии, растянутые
+во времени. После загрузки пересчитывает счётчики, ленты и рекомендации.
+
+Запуск: python -m benchmarks.generate --users 10000 [--truncate]
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List
+
+import asyncpg
+import bcrypt
+
+from settings import settings
+import src.main  # noqa: F401  регистрирует все модели
+from src.commands.backfill_timeline import backfill
+from src.commands.reconcile_counters import reconcile_all
+from src.commands.refresh_suggestions import refresh
+
+
+# Все синтетические пользователи входят с этим паролем
+PASSWORD = "password"
+
+TABLES = ["comments", "timeline", "follows", "posts", "users"]
+
+
+def zipf_weights(n: int, alpha: float) -> List[float]:
+    """Накопленные веса степенного закона: i-й по популярности получает 1 / i^alpha"""
+    return list(itertools.accumulate(1.0 / (rank ** alpha) for rank in range(1, n + 1)))
+
+
+def pick(rng: random.Random, cum_weights: List[float]) -> int:
+    """Индекс по накопленным весам за O(log n)"""
+    return bisect.bisect_right(cum_weights, rng.random() * cum_weights[-1])
+
+
+def recent_time(rng: random.Random, start: datetime, end: datetime) -> datetime:
+    # Квадрат смещает распределение к концу интервала: свежих записей больше
+    return end - (end - start) * (rng.random() ** 2)
+
+
+class Generator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.now = datetime.now(timezone.utc)
+        self.start = self.now - timedelta(days=args.days)
+        # Популярность (подписчики) и активность (посты) — разные перестановки пользователей
+        self.popular = self.rng.sample(range(1, args.users + 1), args.users)
+        self.active = self.rng.sample(range(1, args.users + 1), args.users)
+        self.popularity = zipf_weights(args.users, args.alpha)
+        self.popularity_rank = {user_id: rank for rank, user_id in enumerate(self.popular, 1)}
+        self.activity = zipf_weights(args.users, args.alpha)
+        self.user_created: List[datetime] = []
+        self.post_created: List[datetime] = []
+        self.post_cum_weights: List[float] = []
+
+    def users(self) -> Iterator[tuple]:
+        hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode()
+        for user_id in range(1, self.args.users + 1):
+            created = self.start + (self.now - self.start) * self.rng.random()
+            self.user_created.append(created)
+            yield user_id, f"user{user_id}", f"user{user_id}@example.com", hashed, created, created
+
+    def follows(self) -> Iterator[tuple]:
+        mean = self.args.follows_per_user
+        for follower_id in range(1, self.args.users + 1):
+            # Число подписок тоже с длинным хвостом: большинство подписано на
+            # немногих, единицы — на сотни
+            degree = min(int(self.rng.expovariate(1 / mean)), self.args.users - 1)
+            targets = set()
+            for _ in range(degree * 2):
+                if len(targets) >= degree:
+                    break
+                followed_id = self.popular[pick(self.rng, self.popularity)]
+                if followed_id != follower_id:
+                    targets.add(followed_id)
+            for followed_id in targets:
+                yield follower_id, followed_id
+
+    def posts(self) -> Iterator[tuple]:
+        total = self.args.users * self.args.posts_per_user
+        for post_id in range(1, total + 1):
+            author_id = self.active[pick(self.rng, self.activity)]
+            created = recent_time(self.rng, self.user_created[author_id - 1], self.now)
+            self.post_created.append(created)
+            # Комментируют в основном посты популярных авторов
+            weight = 1.0 / (self.popularity_rank[author_id] ** self.args.alpha)
+            self.post_cum_weights.append((self.post_cum_weights[-1] if self.post_cum_weights else 0.0) + weight)
+            title = f"Post {post_id} by user{author_id}"
+            yield post_id, title, self._text(), author_id, created, created
+
+    def comments(self) -> Iterator[tuple]:
+        total = int(self.args.users * self.args.posts_per_user * self.args.comments_per_post)
+        for comment_id in range(1, total + 1):
+            post_index = pick(self.rng, self.post_cum_weights)
+            author_id = self.rng.randint(1, self.args.users)
+            created = recent_time(self.rng, self.post_created[post_index], self.now)
+            yield comment_id, self._text(12), author_id, post_index + 1, created, created
+
+    def _text(self, words: int = 40) -> str:
+        return " ".join(self.rng.choices(VOCABULARY, k=self.rng.randint(words // 2, words)))
+
+
+VOCABULARY = (
+    "postgres index query latency cache replica feed follow comment post user "
+    "python fastapi async pool cursor keyset search vector bench load test "
+    "блог пост комментарий подписка лента поиск индекс запрос кэш реплика"
+).split()
+
+
+async def copy(connection, table: str, columns: List[str], records: Iterator[tuple]) -> None:
+    started = time.perf_counter()
+    result = await connection.copy_records_to_table(table, columns=columns, records=records)
+    print(f"{table}: {result} in {time.perf_counter() - started:.1f}s")
+
+
+async def generate(args) -> None:
+    generator = Generator(args)
+    dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+    connection = await asyncpg.connect(dsn)
+    try:
+        if args.truncate:
+            await connection.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+
+        await copy(connection, "users",
+                   ["id", "username", "email", "hashed_password", "created_at", "updated_at"],
+                   generator.users())
+        await copy(connection, "follows", ["follower_id", "followed_id"], generator.follows())
+        await copy(connection, "posts",
+                   ["id", "title", "content", "author_id", "created_at", "updated_at"],
+                   generator.posts())
+        await copy(connection, "comments",
+                   ["id", "content", "author_id", "post_id", "created_at", "updated_at"],
+                   generator.comments())
+
+        # id задавали явно — сдвигаем последовательности за них
+        for table in ("users", "posts", "comments"):
+            await connection.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+            )
+    finally:
+        await connection.close()
+
+    await reconcile_all(batch_size=5000)
+    await backfill(days=args.days, batch_size=1000)
+    await refresh(batch_size=200, everyone=True)
+
+    connection = await asyncpg.connect(dsn)
+    try:
+        await connection.execute("ANALYZE")
+    finally:
+        await connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load synthetic users, follows, posts and comments")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--follows-per-user", type=float, default=30, help="mean out-degree")
+    parser.add_argument("--posts-per-user", type=int, default=5)
+    parser.add_argument("--comments-per-post", type=float, default=3)
+    parser.add_argument("--alpha", type=float, default=1.1, help="power-law exponent of popularity")
+    parser.add_argument("--days", type=int, default=365, help="time span of generated rows")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="empty the tables first")
+    args = parser.parse_args()
+    asyncio.run(generate(args))
+
+
+if __name__ == "__main__":
+    main()
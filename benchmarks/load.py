@@ -0,0 +1,551 @@
+"""
+Нагрузочный прогон по всем эндпоинтам роутеров. Пишет в JSON p50/p95/p99,
+пропускную способность и число SQL-запросов на запрос (из /metrics).
+
+Запуск:
+    python -m benchmarks.load --duration 30 --concurrency 32 --output results.json
+    python -m benchmarks.load --mode uvicorn ...      # настоящий сервер в отдельном процессе
+    python -m benchmarks.load --url http://host:8000   # уже запущенный сервер
+    python -m benchmarks.load ... --baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import func, select
+
+from benchmarks.compare import compare, print_regressions
+from benchmarks.generate import PASSWORD, VOCABULARY
+
+
+@dataclass
+class Scenario:
+    name: str
+    weight: float
+    run: Callable[[httpx.AsyncClient, "State"], Awaitable[Optional[httpx.Response]]]
+
+
+SCENARIOS: List[Scenario] = []
+
+
+def scenario(method: str, route: str, weight: float):
+    # Имя совпадает с меткой маршрута в /metrics — так сопоставляем число SQL-запросов
+    def register(fn):
+        SCENARIOS.append(Scenario(f"{method} {route}", weight, fn))
+        return fn
+    return register
+
+
+class State:
+    """Границы данных в базе и то, что создал сам прогон (для PUT/DELETE)"""
+
+    def __init__(self, seed: int, max_user_id: int, max_post_id: int, max_comment_id: int):
+        self.rng = random.Random(seed)
+        self.run_id = f"{int(time.time())}{seed}"
+        self.names = itertools.count()
+        self.max_user_id = max(max_user_id, 1)
+        self.max_post_id = max(max_post_id, 1)
+        self.max_comment_id = max(max_comment_id, 1)
+        self.users: List[int] = []
+        self.posts: List[int] = []
+        self.comments: List[int] = []
+        self.follows: List[tuple] = []
+
+    def user(self) -> int:
+        return self.rng.randint(1, self.max_user_id)
+
+    def post(self) -> int:
+        return self.rng.randint(1, self.max_post_id)
+
+    def comment(self) -> int:
+        return self.rng.randint(1, self.max_comment_id)
+
+    def name(self) -> str:
+        return f"bench{self.run_id}-{next(self.names)}"
+
+    def text(self, words: int = 20) -> str:
+        return " ".join(self.rng.choices(VOCABULARY, k=words))
+
+    def take(self, items: List) -> Optional:
+        return items.pop(self.rng.randrange(len(items))) if items else None
+
+
+def ndjson(rows: List[dict]) -> bytes:
+    return b"".join(json.dumps(row).encode() + b"\n" for row in rows)
+
+
+def remember(response: httpx.Response, items: List[int]) -> httpx.Response:
+    if response.status_code == 201:
+        items.append(response.json()["id"])
+    return response
+
+
+# --- Пользователи ---
+
+@scenario("POST", "/users/", 1)
+async def register_user(client, state):
+    name = state.name()
+    response = await client.post("/users/", json={"username": name, "email": f"{name}@example.com", "password": PASSWORD})
+    return remember(response, state.users)
+
+
+@scenario("POST", "/users/login", 1)
+async def login_user(client, state):
+    return await client.post("/users/login", json={"username": f"user{state.user()}", "password": PASSWORD})
+
+
+@scenario("POST", "/users/follows/bulk", 0.5)
+async def create_follows_bulk(client, state):
+    rows = [{"follower_id": state.user(), "followed_id": state.user()} for _ in range(20)]
+    return await client.post("/users/follows/bulk", json=rows)
+
+
+@scenario("POST", "/users/follows/import", 0.5)
+async def import_follows(client, state):
+    rows = [{"follower_id": state.user(), "followed_id": state.user()} for _ in range(20)]
+    return await client.post("/users/follows/import", content=ndjson(rows))
+
+
+@scenario("GET", "/users/{user_id}", 10)
+async def get_user(client, state):
+    return await client.get(f"/users/{state.user()}")
+
+
+@scenario("GET", "/users/", 3)
+async def get_users(client, state):
+    return await client.get("/users/", params={"limit": 20})
+
+
+@scenario("PUT", "/users/{user_id}", 1)
+async def update_user(client, state):
+    if not state.users:
+        return None
+    user_id = state.rng.choice(state.users)
+    return await client.put(f"/users/{user_id}", json={"email": f"{state.name()}@example.com"})
+
+
+@scenario("DELETE", "/users/{user_id}", 0.5)
+async def delete_user(client, state):
+    user_id = state.take(state.users)
+    return await client.delete(f"/users/{user_id}") if user_id else None
+
+
+@scenario("POST", "/users/{user_id}/follow", 3)
+async def follow_user(client, state):
+    follower_id, followed_id = state.user(), state.user()
+    response = await client.post(f"/users/{followed_id}/follow", params={"current_user_id": follower_id})
+    if response.status_code == 200 and response.json()["detail"] == "Successfully followed":
+        state.follows.append((follower_id, followed_id))
+    return response
+
+
+@scenario("POST", "/users/{user_id}/follow/bulk", 0.5)
+async def follow_users_bulk(client, state):
+    return await client.post(f"/users/{state.user()}/follow/bulk", json=[state.user() for _ in range(100)])
+
+
+@scenario("DELETE", "/users/{user_id}/unfollow", 2)
+async def unfollow_user(client, state):
+    pair = state.take(state.follows)
+    if not pair:
+        return None
+    follower_id, followed_id = pair
+    return await client.delete(f"/users/{followed_id}/unfollow", params={"current_user_id": follower_id})
+
+
+@scenario("GET", "/users/{user_id}/followers", 3)
+async def get_followers(client, state):
+    return await client.get(f"/users/{state.user()}/followers")
+
+
+@scenario("GET", "/users/{user_id}/following", 3)
+async def get_following(client, state):
+    return await client.get(f"/users/{state.user()}/following")
+
+
+@scenario("GET", "/users/{user_id}/feed", 10)
+async def get_feed(client, state):
+    return await client.get(f"/users/{state.user()}/feed", params={"limit": 20})
+
+
+@scenario("GET", "/users/{user_id}/suggestions", 2)
+async def get_suggestions(client, state):
+    return await client.get(f"/users/{state.user()}/suggestions")
+
+
+@scenario("GET", "/users/{user_id}/mutuals", 1)
+async def get_mutuals(client, state):
+    return await client.get(f"/users/{state.user()}/mutuals", params={"other": state.user()})
+
+
+# --- Посты ---
+
+def new_post(state) -> dict:
+    return {"title": state.text(5), "content": state.text(40), "author_id": state.user()}
+
+
+@scenario("POST", "/posts/", 3)
+async def create_post(client, state):
+    return remember(await client.post("/posts/", json=new_post(state)), state.posts)
+
+
+@scenario("GET", "/posts/{post_id}/comments/tree", 5)
+async def get_comment_tree(client, state):
+    return await client.get(f"/posts/{state.post()}/comments/tree", params={"limit": 50})
+
+
+@scenario("POST", "/posts/bulk", 0.5)
+async def create_posts_bulk(client, state):
+    return await client.post("/posts/bulk", json=[new_post(state) for _ in range(10)])
+
+
+@scenario("POST", "/posts/import", 0.5)
+async def import_posts(client, state):
+    return await client.post("/posts/import", content=ndjson([new_post(state) for _ in range(10)]))
+
+
+@scenario("GET", "/posts/export", 0.5)
+async def export_posts(client, state):
+    return await client.get("/posts/export", params={"author_id": state.user()})
+
+
+@scenario("GET", "/posts/search", 5)
+async def search_posts(client, state):
+    return await client.get("/posts/search", params={"q": state.text(2), "limit": 10})
+
+
+@scenario("GET", "/posts/{post_id}", 20)
+async def get_post(client, state):
+    return await client.get(f"/posts/{state.post()}")
+
+
+@scenario("GET", "/posts/", 10)
+async def get_posts(client, state):
+    return await client.get("/posts/", params={"limit": 20})
+
+
+@scenario("GET", "/posts/", 3)
+async def get_posts_with_relations(client, state):
+    return await client.get("/posts/", params={"limit": 20, "include": "author,comments"})
+
+
+@scenario("PUT", "/posts/{post_id}", 1)
+async def update_post(client, state):
+    if not state.posts:
+        return None
+    return await client.put(f"/posts/{state.rng.choice(state.posts)}", json={"title": state.text(5)})
+
+
+@scenario("DELETE", "/posts/{post_id}", 1)
+async def delete_post(client, state):
+    post_id = state.take(state.posts)
+    return await client.delete(f"/posts/{post_id}") if post_id else None
+
+
+# --- Комментарии ---
+
+def new_comment(state) -> dict:
+    return {"content": state.text(12), "author_id": state.user(), "post_id": state.post()}
+
+
+@scenario("POST", "/comments/", 5)
+async def create_comment(client, state):
+    return remember(await client.post("/comments/", json=new_comment(state)), state.comments)
+
+
+@scenario("POST", "/comments/", 2)
+async def reply_to_comment(client, state):
+    if not state.comments:
+        return None
+    parent = await client.get(f"/comments/{state.rng.choice(state.comments)}")
+    if parent.status_code != 200:
+        return None
+    comment = {**new_comment(state), "post_id": parent.json()["post_id"], "parent_id": parent.json()["id"]}
+    return remember(await client.post("/comments/", json=comment), state.comments)
+
+
+@scenario("POST", "/comments/bulk", 0.5)
+async def create_comments_bulk(client, state):
+    return await client.post("/comments/bulk", json=[new_comment(state) for _ in range(10)])
+
+
+@scenario("POST", "/comments/import", 0.5)
+async def import_comments(client, state):
+    return await client.post("/comments/import", content=ndjson([new_comment(state) for _ in range(10)]))
+
+
+@scenario("GET", "/comments/export", 0.5)
+async def export_comments(client, state):
+    return await client.get("/comments/export", params={"post_id": state.post()})
+
+
+@scenario("GET", "/comments/{comment_id}", 5)
+async def get_comment(client, state):
+    return await client.get(f"/comments/{state.comment()}")
+
+
+@scenario("GET", "/comments/{comment_id}/replies", 2)
+async def get_replies(client, state):
+    return await client.get(f"/comments/{state.comment()}/replies")
+
+
+@scenario("GET", "/comments/", 8)
+async def get_comments(client, state):
+    return await client.get("/comments/", params={"post_id": state.post(), "limit": 20})
+
+
+@scenario("PUT", "/comments/{comment_id}", 1)
+async def update_comment(client, state):
+    if not state.comments:
+        return None
+    return await client.put(f"/comments/{state.rng.choice(state.comments)}", json={"content": state.text(12)})
+
+
+@scenario("DELETE", "/comments/{comment_id}", 1)
+async def delete_comment(client, state):
+    comment_id = state.take(state.comments)
+    return await client.delete(f"/comments/{comment_id}") if comment_id else None
+
+
+# --- Прогон ---
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, name: str, elapsed: float, status: str, error: bool) -> None:
+        self.latencies[name].append(elapsed)
+        self.statuses[name][status] += 1
+        if error:
+            self.errors[name] += 1
+
+
+async def worker(client: httpx.AsyncClient, state: State, deadline: float, recorder: Optional[Recorder]) -> None:
+    weights = [item.weight for item in SCENARIOS]
+    while time.perf_counter() < deadline:
+        item = state.rng.choices(SCENARIOS, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await item.run(client, state)
+        except httpx.HTTPError as e:
+            if recorder:
+                recorder.record(item.name, time.perf_counter() - started, type(e).__name__, True)
+            continue
+        if response is None:
+            continue
+        if recorder:
+            # 4xx бывают ожидаемо (уже подписан, случайный id удалён), ошибка — только 5xx
+            recorder.record(item.name, time.perf_counter() - started, str(response.status_code),
+                            response.status_code >= 500)
+
+
+async def run_for(client, state, seconds: float, concurrency: int, recorder: Optional[Recorder]) -> None:
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(worker(client, state, deadline, recorder) for _ in range(concurrency)))
+
+
+METRIC_LINE = re.compile(r'^db_queries_per_request_(sum|count)\{method="([^"]+)",route="([^"]+)"\} (\S+)$')
+
+
+async def scrape_queries(client: httpx.AsyncClient) -> Dict[str, Dict[str, float]]:
+    response = await client.get("/metrics")
+    totals: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for line in response.text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            kind, method, route, value = match.groups()
+            totals[f"{method} {route}"][kind] = float(value)
+    return totals
+
+
+def percentile(values: List[float], q: float) -> float:
+    # Ближайший ранг по отсортированному списку
+    index = max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))
+    return values[index]
+
+
+def summarize(recorder: Recorder, before: dict, after: dict, seconds: float) -> dict:
+    endpoints = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        queries = None
+        if name in after:
+            count = after[name].get("count", 0) - before.get(name, {}).get("count", 0)
+            total = after[name].get("sum", 0) - before.get(name, {}).get("sum", 0)
+            queries = round(total / count, 2) if count else None
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": recorder.errors.get(name, 0),
+            "statuses": dict(recorder.statuses[name]),
+            "throughput_rps": round(len(latencies) / seconds, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "queries_per_request": queries,
+        }
+
+    everything = sorted(itertools.chain.from_iterable(recorder.latencies.values()))
+    total = {
+        "requests": len(everything),
+        "errors": sum(recorder.errors.values()),
+        "throughput_rps": round(len(everything) / seconds, 2),
+    }
+    if everything:
+        total.update({
+            "p50_ms": round(percentile(everything, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(everything, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(everything, 0.99) * 1000, 2),
+        })
+    return {"total": total, "endpoints": endpoints}
+
+
+async def dataset_bounds() -> Dict[str, int]:
+    from src.database import AsyncSessionLocal
+    from src.models.users import User
+    from src.models.posts import Post
+    from src.models.comments import Comment
+
+    async with AsyncSessionLocal() as db:
+        return {
+            "max_user_id": await db.scalar(select(func.max(User.id))) or 0,
+            "max_post_id": await db.scalar(select(func.max(Post.id))) or 0,
+            "max_comment_id": await db.scalar(select(func.max(Comment.id))) or 0,
+        }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def drive(client: httpx.AsyncClient, args, bounds: Dict[str, int]) -> dict:
+    state = State(args.seed, **bounds)
+    if args.warmup:
+        await run_for(client, state, args.warmup, args.concurrency, None)
+
+    recorder = Recorder()
+    before = await scrape_queries(client)
+    started = time.perf_counter()
+    await run_for(client, state, args.duration, args.concurrency, recorder)
+    elapsed = time.perf_counter() - started
+    after = await scrape_queries(client)
+
+    result = summarize(recorder, before, after, elapsed)
+    result["meta"] = {
+        "mode": "url" if args.url else args.mode,
+        "concurrency": args.concurrency,
+        "duration_seconds": round(elapsed, 2),
+        "seed": args.seed,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        **bounds,
+    }
+    return result
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            try:
+                await client.get("/")
+                return
+            except httpx.TransportError:
+                if time.perf_counter() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+
+# Весь прогон идёт от одного клиента: лимит на клиента мерил бы сам себя
+NO_RATE_LIMIT = {"RATE_LIMIT_READ_PER_SECOND": "0", "RATE_LIMIT_WRITE_PER_SECOND": "0"}
+
+
+async def benchmark(args) -> dict:
+    import src.main  # noqa: F401  регистрирует все модели
+    from src.admission import RATES
+    from src.database import engine
+
+    bounds = await dataset_bounds()
+    await engine.dispose()
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+            return await drive(client, args, bounds)
+
+    if args.mode == "uvicorn":
+        base_url = f"http://127.0.0.1:{args.port}"
+        server = subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "src.main:app",
+            "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning",
+        ], env={**os.environ, **NO_RATE_LIMIT})
+        try:
+            await wait_until_ready(base_url)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+                return await drive(client, args, bounds)
+        finally:
+            server.terminate()
+            server.wait()
+
+    # В процессе: без сети, но и без lifespan от сервера — запускаем его сами
+    app = src.main.app
+    for priority in RATES:
+        RATES[priority] = (0, 0)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            return await drive(client, args, bounds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Drive load through every API endpoint")
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--url", help="benchmark an already running server instead")
+    parser.add_argument("--port", type=int, default=8765, help="port for --mode uvicorn")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    result = asyncio.run(benchmark(args))
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    total = result["total"]
+    print(f"{total['requests']} requests, {total['throughput_rps']} rps, "
+          f"p50 {total.get('p50_ms')} ms, p95 {total.get('p95_ms')} ms, p99 {total.get('p99_ms')} ms, "
+          f"{total['errors']} errors -> {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        print_regressions(regressions)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
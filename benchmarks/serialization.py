@@ -0,0 +1,86 @@
+"""
+Микробенчмарк слоя сериализации списков без базы и HTTP: страница ORM-объектов
+через response_model (как FastAPI) против строк Row через rows_response.
+
+Запуск: python -m benchmarks.serialization [--rows 100] [--repeat 2000]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+
+import src.main  # noqa: F401  регистрирует все модели
+from src.models.posts import Post
+from src.schemas.posts import PostResponse
+from src.serialization import rows_response
+
+from benchmarks.generate import VOCABULARY
+
+
+def sample(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": post_id,
+            "title": f"Post {post_id}",
+            "content": " ".join(VOCABULARY[:30]),
+            "author_id": post_id % 97 + 1,
+            "created_at": now - timedelta(minutes=post_id),
+            "updated_at": now,
+            "comment_count": post_id % 13,
+        }
+        for post_id in range(1, count + 1)
+    ]
+
+
+def as_rows(values: List[dict]) -> list:
+    # Настоящие Row, как из db.execute(select(*columns))
+    keys = list(PostResponse.model_fields)
+    result = IteratorResult(SimpleResultMetaData(keys), iter([tuple(row[key] for key in keys) for row in values]))
+    return result.all()
+
+
+def measure(name: str, render: Callable[[], bytes], repeat: int, rows: int) -> float:
+    render()  # прогрев: построение сериализаторов
+    started = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    elapsed = time.perf_counter() - started
+    print(f"{name:>6}: {elapsed / repeat * 1e6:8.1f} us/page, {rows * repeat / elapsed:10.0f} rows/s")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare ORM and row-based list serialization")
+    parser.add_argument("--rows", type=int, default=100, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    values = sample(args.rows)
+    posts = [Post(**row) for row in values]
+    rows = as_rows(values)
+    adapter = TypeAdapter(List[PostResponse])
+
+    def orm_path() -> bytes:
+        # Что делает FastAPI с response_model: валидация from_attributes,
+        # затем dump в JSON-совместимые объекты и json.dumps в JSONResponse
+        validated = adapter.validate_python(posts, from_attributes=True)
+        return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+    def row_path() -> bytes:
+        return rows_response(PostResponse, rows).body
+
+    assert json.loads(orm_path()) == json.loads(row_path()), "paths render different JSON"
+
+    orm = measure("orm", orm_path, args.repeat, args.rows)
+    row = measure("rows", row_path, args.repeat, args.rows)
+    print(f"speedup: {orm / row:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,121 @@ class Settings(BaseSettings):
     DATABASE_HOST: str   
     DATABASE_PORT: str
 
+    # Пул соединений SQLAlchemy
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Открывать DB_POOL_SIZE соединений при старте приложения
+    DB_POOL_WARMUP: bool = True
+    # Кэши подготовленных выражений: asyncpg и адаптера SQLAlchemy.
+    # За pgbouncer в режиме transaction оба нужно выставить в 0
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # statement_timeout на стороне сервера, мс; 0 — без ограничения
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+
+    # Реплики для чтения: строки подключения через запятую (postgresql+asyncpg://...)
+    DATABASE_REPLICA_URLS: str = ""
+    # Реплика с отставанием больше порога временно исключается из чтения
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_HEALTH_INTERVAL_SECONDS: float = 5.0
+    # Сколько секунд после записи клиент читает с primary (read-your-writes)
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+
+    # Авторы с числом подписчиков выше порога не рассылаются по лентам при
+    # создании поста, а подмешиваются в ленту при чтении
+    FEED_FANOUT_THRESHOLD: int = 10000
+    # Сколько последних постов автора попадает в ленту при подписке на него
+    FEED_FOLLOW_BACKFILL: int = 50
+
+    # Рекомендации «на кого подписаться»: сколько хранить на пользователя и
+    # сколько подписок брать на каждом шаге обхода (выборка у больших аккаунтов)
+    SUGGESTIONS_PER_USER: int = 50
+    SUGGESTIONS_FOLLOWING_SAMPLE: int = 200
+    SUGGESTIONS_HOP_SAMPLE: int = 200
+    # Подписки ставят фоновый пересчёт очереди не чаще раза в столько секунд
+    # (0 — только командой refresh_suggestions) и по столько пользователей за задачу
+    SUGGESTIONS_REFRESH_INTERVAL_SECONDS: float = 60.0
+    SUGGESTIONS_REFRESH_BATCH_SIZE: int = 200
+
+    # posts и comments разбиты на месячные секции по created_at: сколько месяцев
+    # вперёд держать готовыми и как часто фоновая задача это проверяет (0 — только
+    # командой python -m src.commands.partitions ensure)
+    PARTITIONS_MONTHS_AHEAD: int = 3
+    PARTITIONS_MAINTENANCE_INTERVAL_SECONDS: float = 86400.0
+
+    # Удаление пользователя: сколько строк каждого вида (подписки, посты,
+    # комментарии, ленты) удаляется за проход. Если хватило одного прохода,
+    # DELETE /users/{id} удаляет сразу, иначе остальное дочищает фоновая задача
+    USERS_PURGE_BATCH_SIZE: int = 1000
+
+    # Сколько последних комментариев встраивается в пост при ?include=comments
+    INCLUDE_COMMENTS_LIMIT: int = 5
+
+    # Максимум строк в одном запросе POST /.../bulk
+    BULK_MAX_ROWS: int = 10000
+    # Размер пачки (и транзакции) при потоковом NDJSON-импорте
+    IMPORT_BATCH_SIZE: int = 5000
+    # Наибольшая строка NDJSON в байтах: без предела строка без переводов
+    # строки копилась бы в памяти целиком
+    IMPORT_MAX_LINE_BYTES: int = 1048576
+
+    # Кэш одиночных GET (пост, пользователь, комментарий)
+    CACHE_ENABLED: bool = True
+    CACHE_TTL_SECONDS: float = 30.0
+    CACHE_MAX_SIZE: int = 10000
+
+    # Хэширование паролей: стоимость bcrypt и размер отдельного пула потоков
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    # Сколько хэширований может ждать свободного потока, дальше — 503
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # Фоновые задачи: сколько выполняется одновременно в процессе приложения
+    # (0 — только отдельным воркером python -m src.commands.worker), сколько
+    # забирать за раз и как часто опрашивать очередь, когда она пуста
+    JOBS_CONCURRENCY: int = 4
+    JOBS_BATCH_SIZE: int = 10
+    JOBS_POLL_INTERVAL_SECONDS: float = 1.0
+    # Сколько задача может выполняться, прежде чем её заберёт другой воркер
+    JOBS_LEASE_SECONDS: float = 300.0
+    # Попытки до перевода в dead и экспоненциальная пауза между ними
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_BACKOFF_BASE_SECONDS: float = 5.0
+    JOBS_BACKOFF_MAX_SECONDS: float = 3600.0
+    # Сколько хранить выполненные задачи (и их ключи идемпотентности)
+    JOBS_RETENTION_HOURS: float = 24.0
+    # Сколько ждать выполняющиеся задачи при остановке
+    JOBS_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0
+
+    # Допуск запросов к БД: сколько одновременно (0 — DB_POOL_SIZE + DB_MAX_OVERFLOW
+    # минус JOBS_CONCURRENCY), какую долю слотов могут занять чтения, сколько
+    # запросов и как долго ждут слот, прежде чем получить 503
+    ADMISSION_MAX_CONCURRENCY: int = 0
+    ADMISSION_READ_SHARE: float = 0.8
+    ADMISSION_MAX_QUEUE: int = 100
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 1.0
+
+    # Token bucket на клиента и маршрут: запросов в секунду и запас (0 — без лимита)
+    RATE_LIMIT_READ_PER_SECOND: float = 20.0
+    RATE_LIMIT_READ_BURST: int = 40
+    RATE_LIMIT_WRITE_PER_SECOND: float = 5.0
+    RATE_LIMIT_WRITE_BURST: int = 10
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    # Брать адрес клиента из X-Forwarded-For (только за доверенным прокси)
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+
+    # SSE-события (/posts/{id}/events, /users/{id}/events): подписчиков на процесс,
+    # размер очереди подписчика (переполнилась — отключаем) и период heartbeat
+    EVENTS_MAX_SUBSCRIBERS: int = 1000
+    EVENTS_QUEUE_SIZE: int = 100
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+
+    # Больше стольких SQL-запросов на один HTTP-запрос — предупреждение о N+1; 0 — не проверять
+    METRICS_N_PLUS_ONE_THRESHOLD: int = 20
+
     model_config = {
         "env_file": ".env", 
         "env_file_encoding": "utf-8",
@@ -17,4 +132,9 @@ class Settings(BaseSettings):
         """Формирует строку подключения к базе данных"""
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.POSTGRES_DB}"
 
+    @property
+    def REPLICA_URLS(self) -> list[str]:
+        """Список строк подключения к репликам"""
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+
 settings = Settings()
\ No newline at end of file
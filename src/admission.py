@@ -0,0 +1,250 @@
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+from settings import settings
+
+
+READ = "read"
+WRITE = "write"
+# Порядок выдачи освободившихся слотов: записи раньше чтений
+PRIORITIES = (WRITE, READ)
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Не ходят в БД или держат соединение клиента часами (SSE) — слот им не нужен
+UNLIMITED_ROUTES = {
+    "/", "/metrics", "/cache/stats", "/db/pool/stats", "/db/replicas/stats",
+    "/jobs/stats", "/events/stats", "/admission/stats", "/password-hasher/stats",
+    "/posts/{post_id}/events", "/users/{user_id}/events",
+}
+
+
+class RateLimitBackend(ABC):
+    """
+    Хранилище token bucket. Состояние в процессе делит лимит между
+    воркерами; общий бэкенд (Redis с атомарным скриптом) даёт один лимит
+    на все процессы
+    """
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Берёт токен. 0 — запрос пропускаем, иначе — через сколько секунд появится токен"""
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Корзины в процессе; самые давно не использованные вытесняются сверх max_keys"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            # Вытесненная корзина просто начнётся заново полной
+            self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> Dict[str, int]:
+        return {"buckets": len(self._buckets)}
+
+
+class AdmissionController:
+    """
+    Ограничивает число одновременных запросов к БД ёмкостью пула. Чтения
+    занимают не больше read_share слотов — остальное остаётся записям.
+    Лишние запросы ждут в короткой очереди (записи обслуживаются первыми),
+    а если очередь полна или ожидание дольше queue_timeout — сразу 503,
+    вместо того чтобы все маршруты разом упирались в DB_POOL_TIMEOUT
+    """
+
+    def __init__(self, capacity: int, read_share: float, max_queue: int, queue_timeout: float):
+        self.capacity = capacity
+        self.limits = {WRITE: capacity, READ: max(1, int(capacity * read_share))}
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = {WRITE: 0, READ: 0}
+        self._waiters: Dict[str, deque] = {WRITE: deque(), READ: deque()}
+        self.admitted = {WRITE: 0, READ: 0}
+        self.queued_total = {WRITE: 0, READ: 0}
+        self.wait_seconds_total = {WRITE: 0.0, READ: 0.0}
+        self.shed: Dict[Tuple[str, str], int] = {}
+
+    @property
+    def in_use(self) -> int:
+        return sum(self.active.values())
+
+    def queued(self, priority: str) -> int:
+        return sum(1 for waiter in self._waiters[priority] if not waiter.done())
+
+    def _can_admit(self, priority: str) -> bool:
+        return self.in_use < self.capacity and self.active[priority] < self.limits[priority]
+
+    def _grant(self, priority: str) -> None:
+        self.active[priority] += 1
+        self.admitted[priority] += 1
+
+    def record_shed(self, priority: str, reason: str) -> None:
+        self.shed[(priority, reason)] = self.shed.get((priority, reason), 0) + 1
+
+    async def acquire(self, priority: str) -> bool:
+        # Без очереди впереди — сразу; иначе встаём за ждущими, чтобы не обгонять их
+        if self._can_admit(priority) and not any(self.queued(p) for p in PRIORITIES[:PRIORITIES.index(priority) + 1]):
+            self._grant(priority)
+            return True
+        if sum(self.queued(p) for p in PRIORITIES) >= self.max_queue:
+            self.record_shed(priority, "queue_full")
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        self.queued_total[priority] += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.record_shed(priority, "queue_timeout")
+            return False
+        except asyncio.CancelledError:
+            # Слот могли выдать в момент отмены — возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self.release(priority)
+            raise
+        finally:
+            self.wait_seconds_total[priority] += time.perf_counter() - started
+            try:
+                self._waiters[priority].remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self, priority: str) -> None:
+        self.active[priority] -= 1
+        for next_priority in PRIORITIES:
+            waiters = self._waiters[next_priority]
+            while waiters and self._can_admit(next_priority):
+                waiter = waiters.popleft()
+                if waiter.done():
+                    continue
+                self._grant(next_priority)
+                waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "limits": dict(self.limits),
+            "active": dict(self.active),
+            "queued": {priority: self.queued(priority) for priority in PRIORITIES},
+            "admitted": dict(self.admitted),
+            "queued_total": dict(self.queued_total),
+            "wait_seconds_total": dict(self.wait_seconds_total),
+            "shed": {f"{priority}:{reason}": count for (priority, reason), count in self.shed.items()},
+        }
+
+
+def default_capacity() -> int:
+    """Все соединения пула primary, кроме занятых фоновыми задачами"""
+    connections = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    return max(connections - settings.JOBS_CONCURRENCY, 1)
+
+
+admission = AdmissionController(
+    capacity=settings.ADMISSION_MAX_CONCURRENCY or default_capacity(),
+    read_share=settings.ADMISSION_READ_SHARE,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+rate_limits = InMemoryBackend(max_keys=settings.RATE_LIMIT_MAX_KEYS)
+
+RATES = {
+    READ: (settings.RATE_LIMIT_READ_PER_SECOND, settings.RATE_LIMIT_READ_BURST),
+    WRITE: (settings.RATE_LIMIT_WRITE_PER_SECOND, settings.RATE_LIMIT_WRITE_BURST),
+}
+
+
+def _match_route(request: Request):
+    # Роутер ещё не отработал — ищем маршрут сами, чтобы лимиты и метрики
+    # были по шаблону пути, а не по конкретному URL
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def client_id(request: Request) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+async def admission_control(request: Request, call_next):
+    """Token bucket на клиента и маршрут (429), затем слот БД по приоритету (503)"""
+    route = _match_route(request)
+    if route is None or route.path in UNLIMITED_ROUTES:
+        return await call_next(request)
+    # Метрики снаружи увидят шаблон маршрута и у отклонённых запросов
+    request.scope["route"] = route
+
+    priority = READ if request.method in SAFE_METHODS else WRITE
+    rate, burst = RATES[priority]
+    if rate > 0:
+        wait = await rate_limits.take(f"{client_id(request)}:{request.method} {route.path}", rate, burst)
+        if wait > 0:
+            admission.record_shed(priority, "rate_limited")
+            return _reject(429, "Too many requests", wait)
+
+    if not await admission.acquire(priority):
+        return _reject(503, "Server is overloaded", settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        admission.release(priority)
+        raise
+    # Потоковые выгрузки читают строки из БД, пока отдают тело, поэтому слот
+    # держится до последнего куска, а не до заголовков
+    response.body_iterator = _release_after_body(response.body_iterator, priority)
+    return response
+
+
+async def _release_after_body(body, priority: str):
+    # finally срабатывает и при обрыве: asyncio закрывает брошенный генератор
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        admission.release(priority)
+
+
+def admission_stats() -> dict:
+    return {**admission.stats(), "rate_limiter": rate_limits.stats()}
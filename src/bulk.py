@@ -0,0 +1,290 @@
+import json
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Sequence, Set, Tuple, Type
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Integer, column, select, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from src.cache import cache, post_key, user_key
+from src.counters import adjust_many
+from src.db_errors import integrity_errors
+from src.events import POST_TOPIC, USER_TOPIC, notified, notify_cte
+from src.feed import fan_out_posts
+from src.models.users import ACTIVE, follows, not_deleted, User
+from src.models.posts import Post
+from src.models.comments import Comment
+from src.schemas.bulk import BulkResponse, BulkRowError
+from src.suggestions import mark_stale
+
+
+# Строка пачки: (порядковый номер во входных данных, провалидированная схема)
+Rows = List[Tuple[int, Any]]
+# Загрузчик возвращает (сколько создано, id созданных строк, ошибки по
+# строкам, ключи кэша, которые нужно сбросить после commit)
+LoadResult = Tuple[int, List[int], List[BulkRowError], Set[str]]
+Loader = Callable[[AsyncSession, Rows], Awaitable[LoadResult]]
+
+NOTHING_LOADED: LoadResult = (0, [], [], set())
+
+# Сколько ошибок отдаём в ответе; остальные только учитываются в failed
+MAX_REPORTED_ERRORS = 1000
+
+# Ссылки проверены existing_ids, но строку могли удалить до вставки
+REFERENCE_ERRORS = {
+    name: (409, "Referenced row was deleted during the request, retry")
+    for name in (
+        "posts_author_id_fkey",
+        "comments_author_id_fkey",
+        "comments_post_id_fkey",
+        "comments_parent_id_fkey",
+        "follows_follower_id_fkey",
+        "follows_followed_id_fkey",
+    )
+}
+
+
+def validate_rows(schema: Type[BaseModel], items: Sequence[Tuple[int, Any]]) -> Tuple[Rows, List[BulkRowError]]:
+    """Валидирует каждую строку схемой, не прерываясь на первой ошибке"""
+    valid, errors = [], []
+    for index, item in items:
+        try:
+            valid.append((index, schema.model_validate(item)))
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append(BulkRowError(index=index, detail=detail))
+    return valid, errors
+
+
+async def existing_ids(db: AsyncSession, model, ids, *conditions) -> set:
+    """
+    Одна проверка ссылок на всю пачку вместо запроса на строку. conditions —
+    что ещё требуется от строки (например, пользователь не помечен на удаление)
+    """
+    if not ids:
+        return set()
+    result = await db.scalars(select(model.id).where(model.id.in_(ids), *conditions))
+    return set(result)
+
+
+def split_missing(rows: Rows, checks) -> Tuple[Rows, List[BulkRowError]]:
+    """checks — список (имя поля, множество существующих id, текст ошибки)"""
+    valid, errors = [], []
+    for index, row in rows:
+        for field, known, detail in checks:
+            if getattr(row, field) not in known:
+                errors.append(BulkRowError(index=index, detail=detail))
+                break
+        else:
+            valid.append((index, row))
+    return valid, errors
+
+
+async def parent_posts(db: AsyncSession, parent_ids) -> dict:
+    """{id родительского комментария: id его поста} одним запросом на пачку"""
+    parent_ids = parent_ids - {None}
+    if not parent_ids:
+        return {}
+    result = await db.execute(select(Comment.id, Comment.post_id).where(Comment.id.in_(parent_ids)))
+    return dict(result.tuples())
+
+
+async def notify_created(db: AsyncSession, rows: Sequence, topic_prefix: str, topic: str, event: str) -> None:
+    """
+    События о созданных строках, как у одиночных записей: rows — строки
+    RETURNING, topic — их колонка с id темы. Источник — VALUES из уже
+    полученных строк, без повторного чтения таблицы
+    """
+    if not rows:
+        return
+    names = list(rows[0]._fields)
+    created = values(*(column(name, Integer) for name in names), name="created").data([tuple(row) for row in rows])
+    notify = notify_cte(created, topic_prefix, created.c[topic], event, **{name: created.c[name] for name in names})
+    await db.execute(select(notified(notify)))
+
+
+def split_foreign_parents(rows: Rows, parents: dict) -> Tuple[Rows, List[BulkRowError]]:
+    """Ответ должен ссылаться на существующий комментарий того же поста"""
+    valid, errors = [], []
+    for index, row in rows:
+        if row.parent_id is not None and row.parent_id not in parents:
+            errors.append(BulkRowError(index=index, detail="Parent comment not found"))
+        elif row.parent_id is not None and parents[row.parent_id] != row.post_id:
+            errors.append(BulkRowError(index=index, detail="Parent comment belongs to another post"))
+        else:
+            valid.append((index, row))
+    return valid, errors
+
+
+async def load_posts(db: AsyncSession, rows: Rows) -> LoadResult:
+    authors = await existing_ids(db, User, {row.author_id for _, row in rows}, ACTIVE)
+    rows, errors = split_missing(rows, [("author_id", authors, "Author not found")])
+    if not rows:
+        return 0, [], errors, set()
+
+    result = await db.execute(
+        insert(Post).returning(Post.id, Post.author_id, sort_by_parameter_order=True),
+        [row.model_dump() for _, row in rows],
+    )
+    created = result.all()
+    ids = [post.id for post in created]
+    author_counts = Counter(post.author_id for post in created)
+    await adjust_many(db, User, "post_count", author_counts)
+    await fan_out_posts(db, ids)
+    await notify_created(db, created, USER_TOPIC, "author_id", "post.created")
+    return len(ids), ids, errors, {user_key(author_id) for author_id in author_counts}
+
+
+async def load_comments(db: AsyncSession, rows: Rows) -> LoadResult:
+    authors = await existing_ids(db, User, {row.author_id for _, row in rows}, ACTIVE)
+    posts = await existing_ids(db, Post, {row.post_id for _, row in rows}, not_deleted(Post.author_id))
+    rows, errors = split_missing(rows, [
+        ("author_id", authors, "Author not found"),
+        ("post_id", posts, "Post not found"),
+    ])
+    rows, parent_errors = split_foreign_parents(rows, await parent_posts(db, {row.parent_id for _, row in rows}))
+    errors += parent_errors
+    if not rows:
+        return 0, [], errors, set()
+
+    result = await db.execute(
+        insert(Comment).returning(
+            Comment.id, Comment.post_id, Comment.author_id, Comment.parent_id, sort_by_parameter_order=True
+        ),
+        [row.model_dump() for _, row in rows],
+    )
+    created = result.all()
+    ids = [comment.id for comment in created]
+    author_counts = Counter(comment.author_id for comment in created)
+    post_counts = Counter(comment.post_id for comment in created)
+    await adjust_many(db, User, "comment_count", author_counts)
+    await adjust_many(db, Post, "comment_count", post_counts)
+    await notify_created(db, created, POST_TOPIC, "post_id", "comment.created")
+    keys = {user_key(author_id) for author_id in author_counts} | {post_key(post_id) for post_id in post_counts}
+    return len(ids), ids, errors, keys
+
+
+async def load_follows(db: AsyncSession, rows: Rows) -> LoadResult:
+    users = await existing_ids(
+        db, User, {user_id for _, row in rows for user_id in (row.follower_id, row.followed_id)}, ACTIVE
+    )
+    rows, errors = split_missing(rows, [
+        ("follower_id", users, "Current user not found"),
+        ("followed_id", users, "User not found"),
+    ])
+    if not rows:
+        return 0, [], errors, set()
+
+    result = await db.execute(
+        insert(follows)
+        .on_conflict_do_nothing()
+        .returning(follows.c.follower_id, follows.c.followed_id),
+        [row.model_dump() for _, row in rows],
+    )
+    created = result.all()
+    inserted = {tuple(row) for row in created}
+
+    seen = set()
+    for index, row in rows:
+        pair = (row.follower_id, row.followed_id)
+        if pair not in inserted or pair in seen:
+            errors.append(BulkRowError(index=index, detail="Already following"))
+        seen.add(pair)
+
+    await adjust_many(db, User, "following_count", Counter(follower for follower, _ in inserted))
+    await adjust_many(db, User, "follower_count", Counter(followed for _, followed in inserted))
+    await mark_stale(db, [follower for follower, _ in inserted])
+    await notify_created(db, created, USER_TOPIC, "followed_id", "follow.created")
+    return len(inserted), [], errors, {user_key(user_id) for pair in inserted for user_id in pair}
+
+
+async def _load(db: AsyncSession, loader: Loader, rows: Rows) -> LoadResult:
+    """Загружает пачку и коммитит её; кэш сбрасывается после commit"""
+    if not rows:
+        return NOTHING_LOADED
+    async with integrity_errors(db, REFERENCE_ERRORS):
+        loaded = await loader(db, rows)
+        await db.commit()
+    await cache.invalidate(*loaded[3])
+    return loaded
+
+
+def _record(response: BulkResponse, loaded: LoadResult, errors: List[BulkRowError], keep_ids: bool) -> None:
+    created, ids, load_errors, _ = loaded
+    errors = sorted(errors + load_errors, key=lambda e: e.index)
+    response.created += created
+    response.failed += len(errors)
+    if keep_ids:
+        response.ids.extend(ids)
+    room = MAX_REPORTED_ERRORS - len(response.errors)
+    if room > 0:
+        response.errors.extend(errors[:room])
+
+
+async def bulk_create(db: AsyncSession, items: List[Any], schema: Type[BaseModel], loader: Loader) -> BulkResponse:
+    """Создаёт пачку строк одной транзакцией; ошибочные строки пропускаются"""
+    if len(items) > settings.BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Too many rows, max {settings.BULK_MAX_ROWS}")
+
+    response = BulkResponse()
+    rows, errors = validate_rows(schema, list(enumerate(items)))
+    loaded = await _load(db, loader, rows)
+
+    _record(response, loaded, errors, keep_ids=True)
+    return response
+
+
+async def iter_ndjson(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Построчно разбирает NDJSON из тела запроса, не читая его целиком.
+    Строка длиннее IMPORT_MAX_LINE_BYTES прерывает импорт ответом 413
+    """
+    buffer = b""
+    index = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines + [buffer]:
+            if len(line) > settings.IMPORT_MAX_LINE_BYTES:
+                raise HTTPException(
+                    status_code=413, detail=f"Line too long, max {settings.IMPORT_MAX_LINE_BYTES} bytes"
+                )
+        for line in lines:
+            if line.strip():
+                yield index, _parse_line(line)
+                index += 1
+    if buffer.strip():
+        yield index, _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        # Невалидный JSON отдаём как есть — validate_rows сообщит об ошибке
+        return line.decode(errors="replace")
+
+
+async def import_ndjson(db: AsyncSession, request: Request, schema: Type[BaseModel], loader: Loader) -> BulkResponse:
+    """Потоковый импорт: каждая пачка IMPORT_BATCH_SIZE строк — отдельная транзакция"""
+    response = BulkResponse()
+    batch = []
+
+    async def flush():
+        rows, errors = validate_rows(schema, batch)
+        loaded = await _load(db, loader, rows)
+        _record(response, loaded, errors, keep_ids=False)
+        batch.clear()
+
+    async for index, item in iter_ndjson(request):
+        batch.append((index, item))
+        if len(batch) >= settings.IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+
+    return response
+
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from settings import settings
+
+
+class CacheBackend(ABC):
+    """
+    Интерфейс хранилища кэша. Значения — JSON-совместимые объекты, поэтому
+    общий бэкенд (Redis, memcached) может хранить их как есть после json.dumps
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class LRUBackend(CacheBackend):
+    """In-process LRU с TTL и ограничением по числу записей"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class Cache:
+    """
+    Read-through кэш поверх бэкенда. Одновременные промахи по одному ключу
+    объединяются: в БД идёт только первый запрос, остальные ждут его результат
+    """
+
+    def __init__(self, backend: CacheBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Ключи, инвалидированные во время загрузки: их результат не сохраняем
+        self._stale: set = set()
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        if not self.enabled:
+            return await loader()
+
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # Отменили первый запрос, а не нас — загружаем сами
+                return await loader()
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже доставлено ждущим; без этого asyncio ругается в лог
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(value)
+            if value is not None and key not in self._stale:
+                await self.backend.set(key, value)
+            return value
+        finally:
+            del self._inflight[key]
+            self._stale.discard(key)
+
+    async def invalidate(self, *keys: str) -> None:
+        for key in keys:
+            if key in self._inflight:
+                self._stale.add(key)
+            await self.backend.delete(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            **self.backend.stats(),
+        }
+
+
+def post_key(post_id: int) -> str:
+    return f"post:{post_id}"
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def comment_key(comment_id: int) -> str:
+    return f"comment:{comment_id}"
+
+
+cache = Cache(
+    LRUBackend(max_size=settings.CACHE_MAX_SIZE, ttl=settings.CACHE_TTL_SECONDS),
+    enabled=settings.CACHE_ENABLED,
+)
@@ -0,0 +1,59 @@
+"""
+Заполняет таблицу timeline по существующим подпискам.
+
+Запуск: python -m src.commands.backfill_timeline [--days 30] [--batch-size 1000]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from src.database import AsyncSessionLocal, engine
+from src.feed import is_high_fanout
+from src.models.users import follows, User  # noqa
+from src.models.posts import Post  # noqa
+from src.models.comments import Comment  # noqa
+from src.models.timeline import timeline
+
+
+async def backfill(days: int, batch_size: int) -> None:
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+
+    async with AsyncSessionLocal() as db:
+        max_id = await db.scalar(select(func.max(follows.c.follower_id))) or 0
+
+        # Идём по диапазонам follower_id, чтобы каждая транзакция была короткой
+        for low in range(0, max_id + 1, batch_size):
+            rows = (
+                select(follows.c.follower_id, Post.id, Post.author_id, Post.created_at)
+                .join(Post, Post.author_id == follows.c.followed_id)
+                .where(
+                    follows.c.follower_id >= low,
+                    follows.c.follower_id < low + batch_size,
+                    Post.created_at >= since,
+                    ~is_high_fanout(follows.c.followed_id),
+                )
+            )
+            result = await db.execute(
+                insert(timeline)
+                .from_select(['user_id', 'post_id', 'author_id', 'created_at'], rows)
+                .on_conflict_do_nothing()
+            )
+            await db.commit()
+            print(f"followers {low}..{low + batch_size - 1}: {result.rowcount} rows")
+
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill home timelines from follows")
+    parser.add_argument("--days", type=int, default=30, help="how far back to copy posts")
+    parser.add_argument("--batch-size", type=int, default=1000, help="follower ids per transaction")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.days, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Секции posts и comments: список, создание на месяцы вперёд и архивация
+холодных месяцев. Отцеплённые секции остаются отдельными таблицами —
+их можно выгрузить pg_dump -t и удалить (или сразу --drop). Счётчики
+comment_count и post_count архив не трогает: при необходимости после
+архивации запустите reconcile_counters.
+
+Запуск: python -m src.commands.partitions list
+        python -m src.commands.partitions ensure [--months-ahead 3]
+        python -m src.commands.partitions archive --before 2025-01 [--drop]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from settings import settings
+from src.database import AsyncSessionLocal, engine
+from src.partitions import PARTITIONED_TABLES, archive_partitions, ensure_partitions, list_partitions
+
+
+async def show() -> None:
+    async with AsyncSessionLocal() as db:
+        for table in PARTITIONED_TABLES:
+            for partition in await list_partitions(db, table):
+                if partition.is_default:
+                    print(f"{partition.name}: DEFAULT")
+                    continue
+                lower = partition.lower.isoformat() if partition.lower else "MINVALUE"
+                upper = partition.upper.isoformat() if partition.upper else "MAXVALUE"
+                print(f"{partition.name}: {lower} .. {upper}")
+    await engine.dispose()
+
+
+async def ensure(months_ahead: int) -> None:
+    async with AsyncSessionLocal() as db:
+        created = await ensure_partitions(db, months_ahead)
+        await db.commit()
+    print(f"created {len(created)} partitions: {', '.join(created) or '-'}")
+    await engine.dispose()
+
+
+async def archive(before: datetime, drop: bool, batch_size: int) -> None:
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        for line in await archive_partitions(connection, before, drop, batch_size):
+            print(line)
+    await engine.dispose()
+
+
+def month(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m").replace(tzinfo=timezone.utc)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of posts and comments")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="show partitions and their bounds")
+    ensure_parser = commands.add_parser("ensure", help="create partitions for the coming months")
+    ensure_parser.add_argument("--months-ahead", type=int, default=settings.PARTITIONS_MONTHS_AHEAD)
+    archive_parser = commands.add_parser("archive", help="detach partitions that end before a month")
+    archive_parser.add_argument("--before", type=month, required=True, help="YYYY-MM, first month to keep")
+    archive_parser.add_argument("--drop", action="store_true", help="drop detached partitions")
+    archive_parser.add_argument("--batch-size", type=int, default=5000, help="timeline rows deleted per statement")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        asyncio.run(show())
+    elif args.command == "ensure":
+        asyncio.run(ensure(args.months_ahead))
+    else:
+        asyncio.run(archive(args.before, args.drop, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Пересчитывает денормализованные счётчики users и posts по исходным таблицам
+и исправляет расхождения.
+
+Запуск: python -m src.commands.reconcile_counters [--batch-size 5000]
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import func, or_, select, update
+
+from src.database import AsyncSessionLocal, engine
+from src.models.users import follows, User
+from src.models.posts import Post
+from src.models.comments import Comment
+
+
+def user_counters():
+    return {
+        "follower_count": select(func.count()).where(follows.c.followed_id == User.id).scalar_subquery(),
+        "following_count": select(func.count()).where(follows.c.follower_id == User.id).scalar_subquery(),
+        "post_count": select(func.count(Post.id)).where(Post.author_id == User.id).scalar_subquery(),
+        "comment_count": select(func.count(Comment.id)).where(Comment.author_id == User.id).scalar_subquery(),
+    }
+
+
+def post_counters():
+    return {
+        "comment_count": select(func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery(),
+    }
+
+
+async def reconcile(model, counters, batch_size: int) -> None:
+    async with AsyncSessionLocal() as db:
+        max_id = await db.scalar(select(func.max(model.id))) or 0
+
+        for low in range(0, max_id + 1, batch_size):
+            # Обновляем только строки, где счётчик разошёлся с фактом
+            drifted = or_(*(getattr(model, name) != value for name, value in counters.items()))
+            result = await db.execute(
+                update(model)
+                .where(model.id >= low, model.id < low + batch_size, drifted)
+                .values(**counters)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if result.rowcount:
+                print(f"{model.__tablename__} {low}..{low + batch_size - 1}: fixed {result.rowcount} rows")
+
+
+async def reconcile_all(batch_size: int) -> None:
+    await reconcile(User, user_counters(), batch_size)
+    await reconcile(Post, post_counters(), batch_size)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Repair drifted social counters")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per transaction")
+    args = parser.parse_args()
+    asyncio.run(reconcile_all(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Пересчитывает рекомендации «на кого подписаться» для пользователей, чьи
+подписки изменились с прошлого запуска.
+
+Запуск: python -m src.commands.refresh_suggestions [--batch-size 200] [--all]
+"""
+import argparse
+import asyncio
+
+from src.database import AsyncSessionLocal, engine
+from src.models.users import follows, User  # noqa
+from src.models.posts import Post  # noqa
+from src.models.comments import Comment  # noqa
+from src.suggestions import mark_all_stale, refresh_batch
+
+
+async def refresh(batch_size: int, everyone: bool) -> None:
+    async with AsyncSessionLocal() as db:
+        if everyone:
+            await mark_all_stale(db)
+            await db.commit()
+
+        total = 0
+        while True:
+            # Каждая пачка — своя короткая транзакция
+            user_ids = await refresh_batch(db, batch_size)
+            await db.commit()
+            if not user_ids:
+                break
+            total += len(user_ids)
+            print(f"refreshed {len(user_ids)} users ({total} total)")
+
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recompute who-to-follow suggestions")
+    parser.add_argument("--batch-size", type=int, default=200, help="users per transaction")
+    parser.add_argument("--all", action="store_true", help="recompute for every user that follows someone")
+    args = parser.parse_args()
+    asyncio.run(refresh(args.batch_size, args.all))
+
+
+if __name__ == "__main__":
+    main()
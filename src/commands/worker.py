@@ -0,0 +1,64 @@
+"""
+Отдельный процесс фоновых задач: масштабируется независимо от HTTP-воркеров.
+В самом приложении тогда можно выставить JOBS_CONCURRENCY=0.
+
+Запуск: python -m src.commands.worker [--concurrency 8] [--batch-size 10]
+        python -m src.commands.worker --requeue-dead [--kind suggestions.refresh]
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from settings import settings
+from src.database import AsyncSessionLocal, engine
+from src.models.users import follows, User  # noqa
+from src.models.posts import Post  # noqa
+from src.models.comments import Comment  # noqa
+from src.jobs import WorkerPool, requeue_dead
+import src.suggestions  # noqa: F401  регистрирует обработчики задач
+import src.partitions  # noqa: F401
+import src.purge  # noqa: F401
+
+
+async def run(concurrency: int, batch_size: int, poll_interval: float) -> None:
+    pool = WorkerPool(concurrency, batch_size, poll_interval)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    pool.start()
+    print(f"worker {pool.worker_id} started, concurrency {concurrency}")
+    await stopping.wait()
+    await pool.stop()
+    print(f"worker stopped: {pool.stats()}")
+    await engine.dispose()
+
+
+async def requeue(kind: str) -> None:
+    async with AsyncSessionLocal() as db:
+        count = await requeue_dead(db, kind)
+        await db.commit()
+    print(f"requeued {count} dead jobs")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--concurrency", type=int, default=settings.JOBS_CONCURRENCY or 4, help="jobs run at once")
+    parser.add_argument("--batch-size", type=int, default=settings.JOBS_BATCH_SIZE, help="jobs claimed per query")
+    parser.add_argument("--poll-interval", type=float, default=settings.JOBS_POLL_INTERVAL_SECONDS)
+    parser.add_argument("--requeue-dead", action="store_true", help="put dead jobs back in the queue and exit")
+    parser.add_argument("--kind", help="only requeue jobs of this kind")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.requeue_dead:
+        asyncio.run(requeue(args.kind))
+    else:
+        asyncio.run(run(args.concurrency, args.batch_size, args.poll_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Tuple, Union
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.pagination import set_next_cursor
+
+
+Version = Tuple[int, Union[datetime, str, None]]
+
+
+def _as_datetime(value: Union[datetime, str, None]) -> Optional[datetime]:
+    # Из кэша updated_at приходит строкой (model_dump(mode="json"))
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def validators(versions: Iterable[Version]) -> Tuple[str, Optional[datetime]]:
+    """
+    ETag и Last-Modified для набора строк по их (id, updated_at).
+    Для одиночной сущности это список из одной пары
+    """
+    digest = hashlib.md5()
+    last_modified = None
+    for row_id, updated_at in versions:
+        updated_at = _as_datetime(updated_at)
+        digest.update(f"{row_id}:{updated_at.isoformat() if updated_at else ''};".encode())
+        if updated_at and (last_modified is None or updated_at > last_modified):
+            last_modified = updated_at
+    return f'W/"{digest.hexdigest()}"', last_modified
+
+
+def is_conditional(request: Request, listing: bool = False) -> bool:
+    if listing:
+        return "if-none-match" in request.headers
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2)
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def _headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    headers = {"ETag": etag}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def set_validators(response: Response, versions: Iterable[Version]) -> None:
+    etag, last_modified = validators(versions)
+    response.headers.update(_headers(etag, last_modified))
+
+
+async def check_not_modified(
+    request: Request, db: AsyncSession, version_query, limit: Optional[int] = None
+) -> Optional[Response]:
+    """
+    Дешёвая проверка до загрузки ORM-объектов и сериализации: version_query
+    выбирает только (id, updated_at) тех же строк, что вернёт эндпоинт.
+    Для страниц списка передаётся limit, а version_query выбирает ещё и
+    created_at: 304 тогда несёт тот же X-Next-Cursor, что и полный ответ.
+    Списки сверяются только по If-None-Match: удалённая строка сдвигает
+    страницу, не меняя max(updated_at), и If-Modified-Since этого не заметит.
+    Возвращает готовый ответ 304 или None, если нужно отдавать тело
+    """
+    listing = limit is not None
+    if not is_conditional(request, listing):
+        return None
+    result = await db.execute(version_query)
+    rows = result.all()
+    if not rows:
+        return None
+    etag, last_modified = validators((row.id, row.updated_at) for row in rows)
+    if not_modified(request, etag, None if listing else last_modified):
+        response = Response(status_code=304, headers=_headers(etag, last_modified))
+        if listing:
+            set_next_cursor(response, rows, limit)
+        return response
+    return None
@@ -0,0 +1,60 @@
+from typing import Mapping
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def adjust(db: AsyncSession, model, row_id, **deltas: int) -> None:
+    """
+    Атомарно сдвигает счётчики строки в транзакции вызывающего:
+    adjust(db, User, user_id, post_count=1)
+
+    row_id может быть скаляром или подзапросом с набором id
+    """
+    values = {name: getattr(model, name) + delta for name, delta in deltas.items()}
+    condition = model.id.in_(row_id) if hasattr(row_id, "subquery") else model.id == row_id
+    await db.execute(
+        update(model)
+        .where(condition)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def adjust_cte(model, row_id, name: str, **deltas: int):
+    """
+    То же, что adjust, но как CTE: сдвиг счётчиков выполняется тем же
+    оператором, что и основная запись (WITH ... INSERT/DELETE ... RETURNING)
+    """
+    table = model.__table__
+    values = {column: table.c[column] + delta for column, delta in deltas.items()}
+    return update(table).where(table.c.id == row_id).values(**values).cte(name)
+
+
+def subtract_counts_cte(model, row_ids, column: str, name: str):
+    """
+    Вычитает из счётчика column по единице за каждое вхождение id в row_ids
+    (столбец удаляющего CTE): повторы сводятся GROUP BY, чтобы строка
+    обновлялась в операторе один раз
+    """
+    table = model.__table__
+    counts = select(row_ids.label("id"), func.count().label("n")).group_by(row_ids).subquery()
+    return (
+        update(table)
+        .where(table.c.id == counts.c.id)
+        .values({column: table.c[column] - counts.c.n})
+        .cte(name)
+    )
+
+
+async def adjust_many(db: AsyncSession, model, column: str, deltas: Mapping[int, int]) -> None:
+    """Сдвигает один счётчик у многих строк одним executemany: {id: delta}"""
+    if not deltas:
+        return
+    table = model.__table__
+    await db.execute(
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values({column: table.c[column] + bindparam("delta")}),
+        [{"row_id": row_id, "delta": delta} for row_id, delta in deltas.items()],
+    )
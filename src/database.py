@@ -1,14 +1,74 @@
+import asyncio
+import logging
+import time
+
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from settings import settings
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.ext.asyncio import AsyncAttrs
 
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_async_engine(
-    DATABASE_URL
-)
+
+class PoolStats:
+    """Сколько запросы ждут соединение из пула и как часто не дожидаются"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет время ожидания соединения"""
+
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.timeouts += 1
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+
+def make_engine(url: str):
+    connect_args = {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+
+    # Статистика живёт на классе: пул пересоздаётся через recreate() тем же классом
+    pool_class = type("InstrumentedPool", (InstrumentedPool,), {"stats": PoolStats()})
+    return create_async_engine(
+        url,
+        poolclass=pool_class,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+engine = make_engine(DATABASE_URL)
 
 AsyncSessionLocal = async_sessionmaker(
     autocommit=False, 
@@ -22,4 +82,31 @@ class Base(AsyncAttrs, DeclarativeBase):
 
 async def get_db():
     async with AsyncSessionLocal() as db: 
-        yield db 
\ No newline at end of file
+        yield db 
+
+
+def pool_stats(target=None) -> dict:
+    pool = (target or engine).pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checkouts": pool.stats.checkouts,
+        "timeouts": pool.stats.timeouts,
+        "wait_seconds_total": pool.stats.wait_seconds_total,
+        "wait_seconds_max": pool.stats.wait_seconds_max,
+    }
+
+
+async def warm_up_pool(target=None) -> None:
+    """Открывает DB_POOL_SIZE соединений заранее, чтобы первые запросы не ждали connect"""
+    target = target or engine
+    try:
+        connections = await asyncio.gather(*(target.connect() for _ in range(settings.DB_POOL_SIZE)))
+    except Exception:
+        logger.warning("Database pool warm-up failed", exc_info=True)
+        return
+    for connection in connections:
+        await connection.close()
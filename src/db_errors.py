@@ -0,0 +1,30 @@
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def constraint_name(error: IntegrityError) -> Optional[str]:
+    """Имя нарушенного ограничения из исключения asyncpg"""
+    # SQLAlchemy оборачивает исключение asyncpg, оригинал лежит в __cause__
+    original = getattr(error.orig, "__cause__", None) or error.orig
+    return getattr(original, "constraint_name", None)
+
+
+@asynccontextmanager
+async def integrity_errors(db: AsyncSession, errors: Dict[str, Tuple[int, str]]):
+    """
+    Переводит нарушения FK/unique в HTTP-ответы вместо предварительных SELECT:
+    errors — {имя ограничения: (код ответа, текст ошибки)}
+    """
+    try:
+        yield
+    except IntegrityError as e:
+        await db.rollback()
+        name = constraint_name(e)
+        if name in errors:
+            status_code, detail = errors[name]
+            raise HTTPException(status_code=status_code, detail=detail) from e
+        raise
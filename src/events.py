@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Dict, Optional, Set
+
+import asyncpg
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Text, cast, func, literal, select
+
+from settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Один канал на всё приложение; тема события — внутри payload
+CHANNEL = "blog_events"
+
+
+# Префиксы тем: события поста и события пользователя
+POST_TOPIC = "post"
+USER_TOPIC = "user"
+
+
+def post_topic(post_id: int) -> str:
+    return f"{POST_TOPIC}:{post_id}"
+
+
+def user_topic(user_id: int) -> str:
+    return f"{USER_TOPIC}:{user_id}"
+
+
+def notify_cte(source, topic_prefix: str, topic_column, event: str, name: str = "notify", **data):
+    """
+    pg_notify на каждую строку source (обычно CTE INSERT ... RETURNING).
+    Уведомления доставляются только после commit, поэтому событие не
+    опережает данные. В payload — только id и короткие поля: у NOTIFY
+    предел 8000 байт, сами объекты клиент берёт GET-запросом (через кэш).
+    SELECT-CTE без ссылок не выполняется — учитывайте его через notified()
+    """
+    fields = []
+    for key, column in data.items():
+        # Имена колонок из RETURNING — quoted_name, тип по нему не выводится
+        fields += [literal(key, Text), column]
+    payload = func.json_build_object(
+        "topic", func.concat(topic_prefix, ":", topic_column),
+        "event", event,
+        "data", func.json_build_object(*fields),
+    )
+    return select(func.pg_notify(CHANNEL, cast(payload, Text)).label("sent")).select_from(source).cte(name)
+
+
+def notified(notify):
+    """Скалярный подзапрос, который заставляет выполнить notify_cte; равен числу событий"""
+    return select(func.count()).select_from(notify).scalar_subquery()
+
+
+class Subscription:
+    def __init__(self, topic: str):
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        # Очередь переполнилась: клиент не успевает читать и получит reset
+        self.overflowed = False
+
+
+class EventBroker:
+    """
+    Одно выделенное соединение LISTEN на процесс (вне пула) и раздача
+    событий подписчикам через их очереди. Очередь ограничена: медленный
+    подписчик не копит память, а отключается с событием reset и должен
+    перечитать состояние обычными GET
+    """
+
+    def __init__(self):
+        self.topics: Dict[str, Set[Subscription]] = {}
+        self.subscribers = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _listen(self) -> None:
+        dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+        delay = 1.0
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(CHANNEL, self._on_notify)
+                self.connected = True
+                delay = 1.0
+                await closed.wait()
+                logger.warning("Event listener connection closed, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Event listener failed, retrying in %.0fs", delay, exc_info=True)
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Malformed event payload: %r", payload)
+            return
+        for subscription in list(self.topics.get(event.get("topic"), ())):
+            try:
+                subscription.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                self.dropped += 1
+                self._remove(subscription)
+
+    def check_capacity(self) -> None:
+        """503 до начала потока: после первых байт ответа статус уже не поменять"""
+        if self.subscribers >= settings.EVENTS_MAX_SUBSCRIBERS:
+            raise HTTPException(status_code=503, detail="Too many event subscribers", headers={"Retry-After": "5"})
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(topic)
+        self.topics.setdefault(topic, set()).add(subscription)
+        self.subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._remove(subscription)
+
+    def _remove(self, subscription: Subscription) -> None:
+        subscribers = self.topics.get(subscription.topic)
+        if subscribers and subscription in subscribers:
+            subscribers.discard(subscription)
+            self.subscribers -= 1
+            if not subscribers:
+                del self.topics[subscription.topic]
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "subscribers": self.subscribers,
+            "max_subscribers": settings.EVENTS_MAX_SUBSCRIBERS,
+            "topics": len(self.topics),
+            "delivered": self.delivered,
+            "dropped_slow_subscribers": self.dropped,
+        }
+
+
+broker = EventBroker()
+
+
+def _format(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def event_response(request: Request, topic: str) -> StreamingResponse:
+    broker.check_capacity()
+    return StreamingResponse(
+        _stream(request, topic),
+        media_type="text/event-stream",
+        # Без буферизации в nginx и кэшей по дороге
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _stream(request: Request, topic: str) -> AsyncIterator[str]:
+    """
+    Тело SSE-ответа: события темы, а в тишине — комментарий-heartbeat, чтобы
+    прокси не закрывали соединение и отключение клиента замечалось
+    """
+    subscription = broker.subscribe(topic)
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if subscription.overflowed:
+                    yield _format("reset", {"reason": "slow consumer"})
+                    return
+                if await request.is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+            yield _format(event["event"], event["data"])
+            if subscription.overflowed and subscription.queue.empty():
+                yield _format("reset", {"reason": "slow consumer"})
+                return
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Sequence
+
+from fastapi.responses import StreamingResponse
+
+from src.replicas import read_sessionmaker
+
+
+# Сколько строк забираем с серверного курсора за раз
+EXPORT_CHUNK_SIZE = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def _encode_ndjson(names: Sequence[str], rows) -> bytes:
+    return b"".join(
+        json.dumps(dict(zip(names, row)), default=_json_default, ensure_ascii=False).encode() + b"\n"
+        for row in rows
+    )
+
+
+def _encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def stream_rows(query, fmt: str) -> AsyncIterator[bytes]:
+    """
+    Читает результат запроса через серверный курсор пачками по
+    EXPORT_CHUNK_SIZE и сразу отдаёт их клиенту — память не растёт
+    вместе с таблицей. Сессия своя: она живёт ровно столько, сколько поток.
+    Выгрузка читает с реплики, если она есть
+    """
+    names = [column.name for column in query.selected_columns]
+    if fmt == "csv":
+        yield _encode_csv([names])
+
+    async with read_sessionmaker()() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        async for rows in result.partitions():
+            yield _encode_csv(rows) if fmt == "csv" else _encode_ndjson(names, rows)
+
+
+def export_response(query, fmt: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_rows(query, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
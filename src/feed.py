@@ -0,0 +1,126 @@
+from typing import Optional, Sequence
+
+from sqlalchemy import and_, delete, select, true, tuple_, union
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from src.models.users import follows, not_deleted, User
+from src.models.posts import Post
+from src.models.timeline import timeline
+from src.pagination import decode_cursor
+
+
+def is_high_fanout(author_id):
+    """Условие «у автора больше FEED_FANOUT_THRESHOLD подписчиков»"""
+    follower_count = select(User.follower_count).where(User.id == author_id).scalar_subquery()
+    return follower_count > settings.FEED_FANOUT_THRESHOLD
+
+
+def fan_out_cte(new_posts, name: str = "fan_out"):
+    """
+    Рассылка только что созданного поста как CTE: new_posts — CTE
+    INSERT ... RETURNING с колонками id, author_id, created_at
+    """
+    rows = (
+        select(follows.c.follower_id, new_posts.c.id, new_posts.c.author_id, new_posts.c.created_at)
+        .where(follows.c.followed_id == new_posts.c.author_id, ~is_high_fanout(new_posts.c.author_id))
+    )
+    return (
+        insert(timeline)
+        .from_select(['user_id', 'post_id', 'author_id', 'created_at'], rows)
+        .on_conflict_do_nothing()
+        .cte(name)
+    )
+
+
+async def fan_out_posts(db: AsyncSession, post_ids: Sequence[int]) -> None:
+    """Пакетная рассылка: один INSERT ... SELECT на всю пачку постов"""
+    if not post_ids:
+        return
+
+    rows = (
+        select(follows.c.follower_id, Post.id, Post.author_id, Post.created_at)
+        .join(Post, Post.author_id == follows.c.followed_id)
+        .where(Post.id.in_(post_ids), ~is_high_fanout(Post.author_id))
+    )
+    await db.execute(
+        insert(timeline)
+        .from_select(['user_id', 'post_id', 'author_id', 'created_at'], rows)
+        .on_conflict_do_nothing()
+    )
+
+
+def backfill_followed_cte(new_follows, name: str = "backfill_followed"):
+    """
+    Добавляет в ленту последние посты авторов, на которых только что
+    подписались: new_follows — CTE INSERT ... RETURNING с колонками
+    follower_id, followed_id
+    """
+    recent = (
+        select(Post.id, Post.author_id, Post.created_at)
+        .where(Post.author_id == new_follows.c.followed_id)
+        .order_by(Post.created_at.desc())
+        .limit(settings.FEED_FOLLOW_BACKFILL)
+        .lateral("recent")
+    )
+    rows = select(
+        new_follows.c.follower_id, recent.c.id, recent.c.author_id, recent.c.created_at
+    ).select_from(new_follows.join(recent, true())).where(~is_high_fanout(new_follows.c.followed_id))
+    return (
+        insert(timeline)
+        .from_select(['user_id', 'post_id', 'author_id', 'created_at'], rows)
+        .on_conflict_do_nothing()
+        .cte(name)
+    )
+
+
+def drop_followed_cte(removed_follows, name: str = "drop_followed"):
+    """Убирает из ленты посты авторов после отписки: removed_follows — CTE DELETE ... RETURNING"""
+    return delete(timeline).where(
+        timeline.c.user_id == removed_follows.c.follower_id,
+        timeline.c.author_id == removed_follows.c.followed_id,
+    ).cte(name)
+
+
+def feed_query(user_id: int, cursor: Optional[str], limit: int, columns: Sequence = (Post,)):
+    """
+    Лента пользователя от новых к старым: материализованные записи из
+    timeline плюс посты авторов с большим числом подписчиков, подмешанные
+    при чтении. Каждая ветка читает не больше limit строк по своему индексу.
+    columns — что выбрать из posts (по умолчанию ORM-объекты)
+    """
+    # Посты пользователей, помеченных на удаление, отсекаются в каждой ветке,
+    # чтобы страница оставалась полной
+    materialized = select(
+        timeline.c.created_at, timeline.c.post_id.label('id')
+    ).where(timeline.c.user_id == user_id, not_deleted(timeline.c.author_id))
+    high_fanout_authors = select(follows.c.followed_id).where(
+        follows.c.follower_id == user_id,
+        is_high_fanout(follows.c.followed_id),
+        not_deleted(follows.c.followed_id),
+    )
+    merged = select(Post.created_at, Post.id).where(Post.author_id.in_(high_fanout_authors))
+
+    if cursor:
+        position = decode_cursor(cursor)
+        materialized = materialized.where(tuple_(timeline.c.created_at, timeline.c.post_id) < position)
+        # Отдельная граница по created_at — для отсечения секций posts
+        merged = merged.where(tuple_(Post.created_at, Post.id) < position, Post.created_at <= position[0])
+
+    branches = [
+        branch.order_by(branch.selected_columns.created_at.desc(), branch.selected_columns.id.desc())
+        .limit(limit)
+        .subquery()
+        for branch in (materialized, merged)
+    ]
+    page = union(*(select(branch) for branch in branches)).subquery()
+
+    # Соединение по всему ключу (id, created_at): дата выбирает секцию posts,
+    # по одному id пришлось бы заглянуть в индексы всех месяцев
+    return (
+        select(*columns)
+        .join(page, and_(Post.id == page.c.id, Post.created_at == page.c.created_at))
+        .order_by(page.c.created_at.desc(), page.c.id.desc())
+        .limit(limit)
+    )
@@ -0,0 +1,119 @@
+from typing import List, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import ARRAY, Integer, and_, any_, bindparam, case, delete, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.events import USER_TOPIC, notified, notify_cte
+from src.feed import backfill_followed_cte, drop_followed_cte
+from src.models.users import ACTIVE, follows, User
+from src.suggestions import mark_stale_cte, schedule_refresh_cte
+
+
+users_table = User.__table__
+
+
+def _exists(user_id):
+    return select(users_table.c.id).where(users_table.c.id == user_id, ACTIVE).exists()
+
+
+def _side_effects(changed, *ctes):
+    """CTE записи плюс отложенный пересчёт рекомендаций, если что-то изменилось"""
+    refresh = schedule_refresh_cte(select(changed.c.followed_id).exists())
+    return ctes + ((refresh,) if refresh is not None else ())
+
+
+def counters_cte(follower_id: int, changed, delta: int, name: str):
+    """
+    Сдвигает following_count подписчика и follower_count тех, на кого он
+    (от)подписался. Один UPDATE, а не два: при подписке на себя это одна и та
+    же строка, а второе изменение строки в одном операторе Postgres пропускает
+    """
+    targets = select(changed.c.followed_id)
+    count = select(func.count()).select_from(changed).scalar_subquery()
+    return update(users_table).where(
+        or_(
+            and_(users_table.c.id == follower_id, select(changed.c.followed_id).exists()),
+            users_table.c.id.in_(targets),
+        )
+    ).values(
+        follower_count=users_table.c.follower_count + case((users_table.c.id.in_(targets), delta), else_=0),
+        following_count=users_table.c.following_count + case((users_table.c.id == follower_id, count * delta), else_=0),
+    ).cte(name)
+
+
+async def follow_many(db: AsyncSession, follower_id: int, followed_ids: Sequence[int]) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Подписывает follower_id на followed_ids одним оператором: INSERT ...
+    ON CONFLICT DO NOTHING, счётчики, лента и очередь рекомендаций в CTE.
+    Возвращает (новые подписки, уже существовавшие, несуществующие id)
+    """
+    requested = list(dict.fromkeys(followed_ids))
+    # Один параметр-массив вместо тысяч параметров IN (...)
+    ids = bindparam("followed_ids", requested, type_=ARRAY(Integer))
+    follower_exists = _exists(follower_id)
+
+    targets = select(users_table.c.id).where(users_table.c.id == any_(ids), ACTIVE).cte("targets")
+    new_follows = (
+        insert(follows)
+        .from_select(
+            ["follower_id", "followed_id"],
+            select(literal(follower_id), targets.c.id).where(follower_exists),
+        )
+        .on_conflict_do_nothing()
+        .returning(follows.c.follower_id, follows.c.followed_id)
+        .cte("new_follows")
+    )
+    statement = select(
+        follower_exists.label("follower_exists"),
+        select(func.array_agg(targets.c.id)).scalar_subquery().label("existing"),
+        select(func.array_agg(new_follows.c.followed_id)).scalar_subquery().label("created"),
+        notified(notify_cte(
+            new_follows, USER_TOPIC, new_follows.c.followed_id, "follow.created", name="notify_followed",
+            follower_id=new_follows.c.follower_id, followed_id=new_follows.c.followed_id,
+        )).label("notified"),
+    ).add_cte(*_side_effects(
+        new_follows,
+        counters_cte(follower_id, new_follows, 1, "bump_counters"),
+        backfill_followed_cte(new_follows),
+        mark_stale_cte(select(new_follows.c.follower_id).distinct()),
+    ))
+
+    row = (await db.execute(statement)).one()
+    if not row.follower_exists:
+        raise HTTPException(status_code=404, detail="Current user not found")
+
+    existing, created = set(row.existing or ()), set(row.created or ())
+    return (
+        [user_id for user_id in requested if user_id in created],
+        [user_id for user_id in requested if user_id in existing and user_id not in created],
+        [user_id for user_id in requested if user_id not in existing],
+    )
+
+
+async def unfollow(db: AsyncSession, follower_id: int, followed_id: int) -> bool:
+    """Отписка одним оператором; False, если подписки не было"""
+    removed = (
+        delete(follows)
+        .where(follows.c.follower_id == follower_id, follows.c.followed_id == followed_id)
+        .returning(follows.c.follower_id, follows.c.followed_id)
+        .cte("removed_follows")
+    )
+    statement = select(
+        _exists(follower_id).label("follower_exists"),
+        _exists(followed_id).label("followed_exists"),
+        select(func.count()).select_from(removed).scalar_subquery().label("removed"),
+    ).add_cte(*_side_effects(
+        removed,
+        counters_cte(follower_id, removed, -1, "drop_counters"),
+        drop_followed_cte(removed),
+        mark_stale_cte(select(removed.c.follower_id)),
+    ))
+
+    row = (await db.execute(statement)).one()
+    if not row.followed_exists:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not row.follower_exists:
+        raise HTTPException(status_code=404, detail="Current user not found")
+    return row.removed > 0
@@ -0,0 +1,112 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import HTTPException
+from sqlalchemy import ARRAY, Integer, any_, bindparam, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from src.models.comments import Comment
+from src.models.posts import Post
+from src.models.users import ACTIVE, User, not_deleted
+from src.schemas.comments import CommentResponse
+from src.schemas.posts import PostResponse
+from src.schemas.users import UserResponse
+
+
+POST_INCLUDES = {"author", "comments"}
+COMMENT_INCLUDES = {"author", "post"}
+
+users_table = User.__table__
+posts_table = Post.__table__
+comments_table = Comment.__table__
+
+user_columns = [users_table.c[name] for name in UserResponse.model_fields]
+post_columns = [posts_table.c[name] for name in PostResponse.model_fields]
+comment_columns = [comments_table.c[name] for name in CommentResponse.model_fields]
+
+
+def parse_include(include: Optional[str], allowed: Set[str]) -> Set[str]:
+    """?include=author,comments -> {"author", "comments"}; неизвестные имена — 400"""
+    if not include:
+        return set()
+    requested = {name.strip() for name in include.split(",") if name.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include: {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(allowed))}"
+        )
+    return requested
+
+
+def _ids(name: str, values: Iterable[int]):
+    # Один параметр-массив вместо IN (...) с параметром на каждый id
+    return bindparam(name, sorted(set(values)), type_=ARRAY(Integer))
+
+
+async def load_users(db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, dict]:
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    result = await db.execute(select(*user_columns).where(users_table.c.id == any_(_ids("user_ids", user_ids)), ACTIVE))
+    return {row.id: UserResponse.model_validate(row).model_dump() for row in result}
+
+
+async def load_posts(db: AsyncSession, post_ids: Iterable[int]) -> Dict[int, dict]:
+    post_ids = set(post_ids)
+    if not post_ids:
+        return {}
+    result = await db.execute(
+        select(*post_columns).where(posts_table.c.id == any_(_ids("post_ids", post_ids)), not_deleted(posts_table.c.author_id))
+    )
+    return {row.id: PostResponse.model_validate(row).model_dump() for row in result}
+
+
+async def load_recent_comments(db: AsyncSession, post_ids: Iterable[int], limit: int) -> Dict[int, List[dict]]:
+    """
+    До limit последних комментариев каждого поста одним запросом: LATERAL по
+    списку постов, внутри — короткий обратный проход индекса (post_id, created_at, id)
+    """
+    post_ids = set(post_ids)
+    if not post_ids:
+        return {}
+    page = select(func.unnest(_ids("post_ids", post_ids)).label("post_id")).subquery("page")
+    recent = (
+        select(*comment_columns)
+        .where(comments_table.c.post_id == page.c.post_id, not_deleted(comments_table.c.author_id))
+        .order_by(comments_table.c.created_at.desc(), comments_table.c.id.desc())
+        .limit(limit)
+        .lateral("recent")
+    )
+    result = await db.execute(select(recent).select_from(page.join(recent, true())))
+
+    comments: Dict[int, List[dict]] = {post_id: [] for post_id in post_ids}
+    for row in result:
+        comments[row.post_id].append(CommentResponse.model_validate(row).model_dump())
+    return comments
+
+
+async def embed_posts(db: AsyncSession, posts: List[dict], include: Set[str]) -> List[dict]:
+    """Дополняет страницу постов связанными объектами: по запросу на связь, а не на пост"""
+    if "author" in include:
+        authors = await load_users(db, (post["author_id"] for post in posts))
+        for post in posts:
+            post["author"] = authors.get(post["author_id"])
+    if "comments" in include:
+        comments = await load_recent_comments(db, (post["id"] for post in posts), settings.INCLUDE_COMMENTS_LIMIT)
+        for post in posts:
+            post["comments"] = comments.get(post["id"], [])
+    return posts
+
+
+async def embed_comments(db: AsyncSession, comments: List[dict], include: Set[str]) -> List[dict]:
+    """То же для страницы комментариев"""
+    if "author" in include:
+        authors = await load_users(db, (comment["author_id"] for comment in comments))
+        for comment in comments:
+            comment["author"] = authors.get(comment["author_id"])
+    if "post" in include:
+        posts = await load_posts(db, (comment["post_id"] for comment in comments))
+        for comment in comments:
+            comment["post"] = posts.get(comment["post_id"])
+    return comments
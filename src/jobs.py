@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, literal, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from src.database import AsyncSessionLocal
+from src.models.jobs import DONE, PENDING, jobs
+
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[AsyncSession, dict], Awaitable[None]]
+
+# Обработчики по kind; регистрируются декоратором @job при импорте модулей
+HANDLERS: Dict[str, Handler] = {}
+
+# Ключ session.info со списком действий после commit задачи
+AFTER_COMMIT = "jobs.after_commit"
+
+
+def job(kind: str):
+    """
+    Регистрирует обработчик задач kind. Обработчик получает сессию воркера и
+    payload; его изменения коммитятся вместе с отметкой о выполнении, поэтому
+    побочные эффекты в базе применяются ровно один раз
+    """
+    def register(handler: Handler) -> Handler:
+        HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def after_commit(db: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """
+    Откладывает действие обработчика до commit его транзакции — например,
+    сброс кэша: сброшенный раньше ключ успел бы заново заполниться старыми
+    данными. При откате или потере аренды действие не выполняется
+    """
+    db.info.setdefault(AFTER_COMMIT, []).append(callback)
+
+
+def _job_values(
+    kind: str,
+    payload: Optional[dict],
+    run_at: Optional[datetime],
+    delay: float,
+    idempotency_key: Optional[str],
+    max_attempts: Optional[int],
+) -> dict:
+    return {
+        "kind": literal(kind, jobs.c.kind.type),
+        "payload": literal(payload or {}, jobs.c.payload.type),
+        "run_at": literal(run_at, jobs.c.run_at.type) if run_at else func.now() + timedelta(seconds=delay),
+        "max_attempts": literal(max_attempts or settings.JOBS_MAX_ATTEMPTS, jobs.c.max_attempts.type),
+        "idempotency_key": literal(idempotency_key, jobs.c.idempotency_key.type),
+    }
+
+
+async def enqueue(
+    db: AsyncSession,
+    kind: str,
+    payload: Optional[dict] = None,
+    *,
+    run_at: Optional[datetime] = None,
+    delay: float = 0,
+    idempotency_key: Optional[str] = None,
+    max_attempts: Optional[int] = None,
+) -> Optional[int]:
+    """
+    Ставит задачу в очередь в транзакции вызывающего: она станет видна
+    воркерам только после его commit и пропадёт при rollback.
+    Возвращает id или None, если задача с таким idempotency_key уже есть
+    """
+    values = _job_values(kind, payload, run_at, delay, idempotency_key, max_attempts)
+    result = await db.execute(
+        insert(jobs).values(values)
+        .on_conflict_do_nothing(index_elements=[jobs.c.idempotency_key])
+        .returning(jobs.c.id)
+    )
+    return result.scalar_one_or_none()
+
+
+def enqueue_cte(
+    kind: str,
+    payload: Optional[dict] = None,
+    *,
+    run_at: Optional[datetime] = None,
+    delay: float = 0,
+    idempotency_key: Optional[str] = None,
+    max_attempts: Optional[int] = None,
+    when=None,
+    name: str = "enqueue_job",
+):
+    """То же, что enqueue, но как CTE для однооператорных записей; when — условие постановки"""
+    values = _job_values(kind, payload, run_at, delay, idempotency_key, max_attempts)
+    rows = select(*(value.label(column) for column, value in values.items()))
+    if when is not None:
+        rows = rows.where(when)
+    return (
+        insert(jobs)
+        .from_select(list(values), rows)
+        .on_conflict_do_nothing(index_elements=[jobs.c.idempotency_key])
+        .returning(jobs.c.id)
+        .cte(name)
+    )
+
+
+def backoff(attempts: int) -> float:
+    """Пауза перед следующей попыткой: экспонента с разбросом ±20%, чтобы повторы не шли волной"""
+    delay = min(settings.JOBS_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), settings.JOBS_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def claim(db: AsyncSession, worker_id: str, limit: int) -> list:
+    """
+    Забирает до limit готовых задач: queued с наступившим run_at и running с
+    истёкшей арендой. SKIP LOCKED — воркеры не ждут друг друга и не берут
+    одну задачу дважды. Попытка засчитывается при взятии: так учитываются
+    и падения воркера посреди задачи. Задача, чья аренда истекла на
+    последней попытке, не берётся снова, а уходит в dead
+    """
+    await _bury_expired(db, limit)
+    ready = (
+        select(jobs.c.id)
+        .where(
+            text(PENDING),
+            jobs.c.run_at <= func.now(),
+            or_(jobs.c.status == "queued", jobs.c.attempts < jobs.c.max_attempts),
+        )
+        .order_by(jobs.c.run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(jobs)
+        .where(jobs.c.id.in_(ready.scalar_subquery()))
+        .values(
+            status="running",
+            attempts=jobs.c.attempts + 1,
+            run_at=func.now() + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+            locked_by=worker_id,
+        )
+        .returning(jobs.c.id, jobs.c.kind, jobs.c.payload, jobs.c.attempts, jobs.c.max_attempts)
+    )
+    return result.all()
+
+
+async def _bury_expired(db: AsyncSession, limit: int) -> None:
+    # Воркер падал или терял аренду на каждой попытке, и _fail ни разу не
+    # записал результат — иначе такая задача крутилась бы бесконечно
+    exhausted = (
+        select(jobs.c.id)
+        .where(
+            text(PENDING),
+            jobs.c.run_at <= func.now(),
+            jobs.c.status == "running",
+            jobs.c.attempts >= jobs.c.max_attempts,
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        update(jobs)
+        .where(jobs.c.id.in_(exhausted.scalar_subquery()))
+        .values(
+            status="dead",
+            finished_at=func.now(),
+            locked_by=None,
+            last_error="Lease expired on the last attempt",
+        )
+        .returning(jobs.c.id, jobs.c.kind, jobs.c.attempts)
+    )
+    for row in result:
+        logger.error("Job %s (%s) is dead: lease expired after %s attempts", row.id, row.kind, row.attempts)
+
+
+def _owned(claimed):
+    # attempts служит токеном аренды: если аренда истекла и задачу забрал
+    # другой воркер, счётчик уже другой и завершение ничего не изменит
+    return update(jobs).where(jobs.c.id == claimed.id, jobs.c.attempts == claimed.attempts)
+
+
+async def requeue_dead(db: AsyncSession, kind: Optional[str] = None) -> int:
+    """Возвращает задачи из dead в очередь с новым запасом попыток"""
+    statement = update(jobs).where(jobs.c.status == "dead")
+    if kind:
+        statement = statement.where(jobs.c.kind == kind)
+    result = await db.execute(
+        statement.values(status="queued", attempts=0, run_at=func.now(), finished_at=None, locked_by=None)
+    )
+    return result.rowcount
+
+
+async def purge_finished(db: AsyncSession, batch_size: int = 1000) -> int:
+    """Удаляет пачку выполненных задач старше JOBS_RETENTION_HOURS"""
+    expired = (
+        select(jobs.c.id)
+        .where(
+            text(DONE),
+            jobs.c.finished_at < func.now() - timedelta(hours=settings.JOBS_RETENTION_HOURS),
+        )
+        .limit(batch_size)
+    )
+    result = await db.execute(delete(jobs).where(jobs.c.id.in_(expired.scalar_subquery())))
+    return result.rowcount
+
+
+class WorkerPool:
+    """
+    Пул asyncio-воркеров: забирает задачи пачками, выполняет до concurrency
+    одновременно, каждая — в своей сессии и транзакции. Соединения берёт из
+    общего пула приложения, поэтому concurrency держим меньше DB_POOL_SIZE
+    """
+
+    def __init__(self, concurrency: int, batch_size: int, poll_interval: float):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = set()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._loop_task: Optional[asyncio.Task] = None
+        self._next_purge = 0.0
+        self.completed = 0
+        self.retried = 0
+        self.dead = 0
+
+    def start(self) -> None:
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Перестаёт брать задачи и ждёт выполняющиеся; не успевшие вернутся по истечении аренды"""
+        self._stopping = True
+        self._wake.set()
+        if self._loop_task:
+            await self._loop_task
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=settings.JOBS_SHUTDOWN_TIMEOUT_SECONDS)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            claimed = []
+            free = self.concurrency - len(self._tasks)
+            if free > 0:
+                try:
+                    async with AsyncSessionLocal() as db:
+                        claimed = await claim(db, self.worker_id, min(free, self.batch_size))
+                        await db.commit()
+                        await self._purge(db)
+                except Exception:
+                    logger.exception("Failed to claim jobs")
+
+            for row in claimed:
+                task = asyncio.create_task(self._execute(row))
+                self._tasks.add(task)
+                task.add_done_callback(self._done)
+
+            # Полная пачка — в очереди, вероятно, есть ещё: сразу за следующей
+            if free > 0 and len(claimed) == min(free, self.batch_size):
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._wake.set()
+
+    async def _purge(self, db: AsyncSession) -> None:
+        if time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + 60
+        if await purge_finished(db):
+            await db.commit()
+
+    async def _execute(self, row) -> None:
+        handler = HANDLERS.get(row.kind)
+        async with AsyncSessionLocal() as db:
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler for job kind {row.kind!r}")
+                await handler(db, row.payload)
+                result = await db.execute(
+                    _owned(row).values(status="done", finished_at=func.now(), last_error=None, locked_by=None)
+                )
+                if result.rowcount == 0:
+                    # Аренда истекла, задача уже у другого воркера — свои изменения откатываем
+                    logger.warning("Job %s lost its lease, rolling back", row.id)
+                    await db.rollback()
+                    return
+                await db.commit()
+                self.completed += 1
+                for callback in db.info.pop(AFTER_COMMIT, []):
+                    await callback()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                db.info.pop(AFTER_COMMIT, None)
+                await db.rollback()
+                await self._fail(db, row, exc)
+
+    async def _fail(self, db: AsyncSession, row, exc: Exception) -> None:
+        error = f"{type(exc).__name__}: {exc}"
+        if row.attempts >= row.max_attempts:
+            logger.error("Job %s (%s) is dead after %s attempts: %s", row.id, row.kind, row.attempts, error)
+            values = {"status": "dead", "finished_at": func.now()}
+            self.dead += 1
+        else:
+            logger.warning("Job %s (%s) failed, attempt %s: %s", row.id, row.kind, row.attempts, error)
+            values = {"status": "queued", "run_at": func.now() + timedelta(seconds=backoff(row.attempts))}
+            self.retried += 1
+        try:
+            await db.execute(_owned(row).values(last_error=error, locked_by=None, **values))
+            await db.commit()
+        except Exception:
+            # Не записали — задача вернётся в очередь по истечении аренды
+            logger.exception("Failed to record failure of job %s", row.id)
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "running": len(self._tasks),
+            "completed": self.completed,
+            "retried": self.retried,
+            "dead": self.dead,
+        }
+
+
+# Воркеры процесса приложения; запускаются из lifespan, если JOBS_CONCURRENCY > 0
+workers = WorkerPool(settings.JOBS_CONCURRENCY, settings.JOBS_BATCH_SIZE, settings.JOBS_POLL_INTERVAL_SECONDS)
@@ -1,9 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from settings import settings
+from src.database import engine, pool_stats, warm_up_pool
+from src.replicas import check_replicas, dispose_replicas, monitor_replicas, pin_primary_after_write, replica_stats
 from src.routers.users import router as user_router
 from src.routers.posts import router as post_router
 from src.routers.comments import router as comment_router
+from src.cache import cache
+from src.security import password_hasher
+from src.metrics import metrics_response, track_requests
+from src.jobs import workers
+from src.partitions import start_maintenance
+from src.events import broker
+from src.admission import admission_control, admission_stats
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DB_POOL_WARMUP:
+        await warm_up_pool()
+    await check_replicas()
+    monitor = asyncio.create_task(monitor_replicas())
+    await start_maintenance()
+    if settings.JOBS_CONCURRENCY:
+        workers.start()
+    broker.start()
+    yield
+    await broker.stop()
+    await workers.stop()
+    monitor.cancel()
+    await dispose_replicas()
+    await engine.dispose()
+
 
-app = FastAPI(title="Blog API")
+app = FastAPI(title="Blog API", lifespan=lifespan)
+app.middleware("http")(pin_primary_after_write)
+app.middleware("http")(admission_control)
+# Последний добавленный middleware внешний: время считается целиком
+app.middleware("http")(track_requests)
 app.include_router(user_router)
 app.include_router(post_router)
 app.include_router(comment_router)
@@ -12,3 +47,35 @@ app.include_router(comment_router)
 def read_root():
     return {"message": "Welcome to the Blog API!"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats()
+
+@app.get("/db/pool/stats")
+def db_pool_stats():
+    return pool_stats()
+
+@app.get("/db/replicas/stats")
+def db_replicas_stats():
+    return replica_stats()
+
+@app.get("/admission/stats")
+def admission_stats_endpoint():
+    return admission_stats()
+
+@app.get("/events/stats")
+def events_stats():
+    return broker.stats()
+
+@app.get("/jobs/stats")
+def jobs_stats():
+    return workers.stats()
+
+@app.get("/password-hasher/stats")
+def password_hasher_stats():
+    return password_hasher.stats()
+
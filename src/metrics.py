@@ -0,0 +1,251 @@
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+from settings import settings
+from src.database import engine, pool_stats
+from src.replicas import replicas
+from src.admission import PRIORITIES, admission
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Запросы, не попавшие ни в один маршрут (404), сводим в одну метку,
+# чтобы произвольные URL не плодили серии
+UNMATCHED_ROUTE = "unmatched"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Для каждой серии: счётчики по корзинам (без накопления), сумма, количество
+        self.series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (repr(float(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Время обработки запроса до отправки заголовков ответа",
+    ("method", "route"), LATENCY_BUCKETS,
+)
+requests_total = Counter("http_requests_total", "Обработанные запросы", ("method", "route", "status"))
+request_queries = Histogram(
+    "db_queries_per_request", "SQL-запросов на один HTTP-запрос", ("method", "route"), QUERY_COUNT_BUCKETS,
+)
+request_db_seconds = Histogram(
+    "db_seconds_per_request", "Время в БД на один HTTP-запрос", ("method", "route"), LATENCY_BUCKETS,
+)
+n_plus_one_total = Counter(
+    "db_n_plus_one_total", "Запросы, превысившие METRICS_N_PLUS_ONE_THRESHOLD", ("method", "route"),
+)
+in_flight = 0
+
+
+class QueryStats:
+    """SQL-запросы одного HTTP-запроса"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _current.get()
+    # Фоновые задачи и команды выполняются вне HTTP-запроса — их не считаем
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def _handle_error(exception_context):
+    # Упавший запрос не дойдёт до after_cursor_execute — снимаем его отметку
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument(target) -> None:
+    """Считает запросы движка в статистику текущего HTTP-запроса"""
+    sync_engine = target.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+for target in [engine, *(replica.engine for replica in replicas)]:
+    instrument(target)
+
+
+def _route(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+async def track_requests(request: Request, call_next):
+    """Латентность по маршрутам и число SQL-запросов на HTTP-запрос"""
+    global in_flight
+    stats = QueryStats()
+    token = _current.set(stats)
+    in_flight += 1
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        in_flight -= 1
+        _current.reset(token)
+
+        method, route = request.method, _route(request)
+        request_duration.observe(elapsed, method, route)
+        requests_total.inc(method, route, str(status_code))
+        request_queries.observe(stats.count, method, route)
+        request_db_seconds.observe(stats.seconds, method, route)
+
+        threshold = settings.METRICS_N_PLUS_ONE_THRESHOLD
+        if threshold and stats.count > threshold:
+            n_plus_one_total.inc(method, route)
+            logger.warning(
+                "Possible N+1: %s %s made %d SQL queries (%.1f ms in DB)",
+                method, request.url.path, stats.count, stats.seconds * 1000,
+            )
+
+
+def _engine_metric(name: str, help: str, samples: List[Tuple[str, float]], kind: str = "gauge") -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines.extend(f'{name}{{engine="{_escape(label)}"}} {value}' for label, value in samples)
+    return lines
+
+
+def _pool_metrics() -> List[str]:
+    pools = [("primary", pool_stats())]
+    pools += [(replica.engine.url.host, pool_stats(replica.engine)) for replica in replicas]
+
+    def samples(key):
+        return [(label, stats[key]) for label, stats in pools]
+
+    return [
+        *_engine_metric("db_pool_size", "Размер пула соединений", samples("size")),
+        *_engine_metric("db_pool_checked_out", "Соединения, занятые запросами", samples("checked_out")),
+        *_engine_metric("db_pool_overflow", "Соединения сверх DB_POOL_SIZE", samples("overflow")),
+        *_engine_metric("db_pool_checkouts_total", "Выдачи соединений из пула", samples("checkouts"), "counter"),
+        *_engine_metric("db_pool_timeouts_total", "Не дождались соединения за DB_POOL_TIMEOUT", samples("timeouts"), "counter"),
+        *_engine_metric("db_pool_wait_seconds_total", "Суммарное ожидание соединения", samples("wait_seconds_total"), "counter"),
+    ]
+
+
+def _admission_metrics() -> List[str]:
+    stats = admission.stats()
+
+    def by_priority(name: str, help: str, key: str, kind: str = "gauge") -> List[str]:
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines.extend(f'{name}{{priority="{priority}"}} {stats[key][priority]}' for priority in PRIORITIES)
+        return lines
+
+    shed = [
+        "# HELP http_requests_shed_total Отклонённые до обработки: rate_limited (429), queue_full и queue_timeout (503)",
+        "# TYPE http_requests_shed_total counter",
+    ]
+    shed.extend(
+        f'http_requests_shed_total{_format_labels(("priority", "reason"), labels)} {count}'
+        for labels, count in admission.shed.items()
+    )
+    return [
+        "# HELP admission_capacity Слотов БД для запросов",
+        "# TYPE admission_capacity gauge",
+        f"admission_capacity {stats['capacity']}",
+        *by_priority("admission_active", "Запросы, занимающие слот", "active"),
+        *by_priority("admission_queued", "Запросы в очереди за слотом", "queued"),
+        *by_priority("admission_queued_total", "Запросы, ждавшие слот", "queued_total", "counter"),
+        *by_priority("admission_wait_seconds_total", "Суммарное ожидание слота", "wait_seconds_total", "counter"),
+        *shed,
+    ]
+
+
+def render() -> str:
+    lines = [
+        "# HELP http_requests_in_flight Запросы в обработке",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {in_flight}",
+    ]
+    for metric in (request_duration, requests_total, request_queries, request_db_seconds, n_plus_one_total):
+        lines.extend(metric.render())
+    lines.extend(_pool_metrics())
+    lines.extend(_admission_metrics())
+    return "\n".join(lines) + "\n"
+
+
+def metrics_response() -> PlainTextResponse:
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
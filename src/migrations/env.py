@@ -29,6 +29,9 @@ from src.models.users import follows # noqa
 from src.models.users import User  # noqa
 from src.models.posts import Post  # noqa
 from src.models.comments import Comment  # noqa
+from src.models.timeline import timeline  # noqa
+from src.models.suggestions import suggestions, suggestions_stale  # noqa
+from src.models.jobs import jobs  # noqa
 
 # from src.models.posts import Post  # noqa
 # from src.models.comments import Comment  # noqa
@@ -37,6 +40,14 @@ from src.models.comments import Comment  # noqa
 
 target_metadata = Base.metadata
 
+from src.partitions import PARTITION_NAME  # noqa
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Секции posts и comments создают миграция и команда partitions, в моделях
+    # их нет — autogenerate не должен предлагать их удалить
+    return not (type_ == "table" and reflected and compare_to is None and PARTITION_NAME.match(name))
+
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
@@ -46,6 +57,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -62,7 +74,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
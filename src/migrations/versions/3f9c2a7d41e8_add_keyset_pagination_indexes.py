@@ -0,0 +1,34 @@
+"""add keyset pagination indexes
+
+Revision ID: 3f9c2a7d41e8
+Revises: deeb67b8d9d5
+Create Date: 2026-10-18 10:12:31.418203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d41e8'
+down_revision: Union[str, Sequence[str], None] = 'deeb67b8d9d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_posts_author_id_created_at_id', 'posts', ['author_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_posts_created_at_id', 'posts', ['created_at', 'id'], unique=False)
+    op.create_index('ix_comments_post_id_created_at_id', 'comments', ['post_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_created_at_id', table_name='users')
+    op.drop_index('ix_comments_post_id_created_at_id', table_name='comments')
+    op.drop_index('ix_posts_created_at_id', table_name='posts')
+    op.drop_index('ix_posts_author_id_created_at_id', table_name='posts')
@@ -0,0 +1,35 @@
+"""add updated_at columns
+
+Revision ID: 5b8e13f0a6c2
+Revises: c47e0b93d5a1
+Create Date: 2026-10-18 13:08:55.310472
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e13f0a6c2'
+down_revision: Union[str, Sequence[str], None] = 'c47e0b93d5a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = ('users', 'posts', 'comments')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+        # Для существующих строк считаем, что они не менялись с момента создания
+        op.execute(f"UPDATE {table} SET updated_at = created_at WHERE created_at IS NOT NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(TABLES):
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,47 @@
+"""add suggestions tables
+
+Revision ID: 6c1e8f4a9b23
+Revises: 9d3f6a2b7e41
+Create Date: 2026-10-18 15:48:52.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c1e8f4a9b23'
+down_revision: Union[str, Sequence[str], None] = '9d3f6a2b7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('suggestions',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('suggested_id', sa.Integer(), nullable=False),
+    sa.Column('mutual_count', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['suggested_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'suggested_id')
+    )
+    op.create_index('ix_suggestions_user_id_mutual_count', 'suggestions', ['user_id', 'mutual_count', 'suggested_id'], unique=False)
+    op.create_table('suggestions_stale',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('marked_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Существующие пользователи получат рекомендации при первом запуске пересчёта
+    op.execute("INSERT INTO suggestions_stale (user_id) SELECT DISTINCT follower_id FROM follows")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('suggestions_stale')
+    op.drop_index('ix_suggestions_user_id_mutual_count', table_name='suggestions')
+    op.drop_table('suggestions')
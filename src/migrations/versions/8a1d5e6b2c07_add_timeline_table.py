@@ -0,0 +1,40 @@
+"""add timeline table
+
+Revision ID: 8a1d5e6b2c07
+Revises: 3f9c2a7d41e8
+Create Date: 2026-10-18 11:40:02.915337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a1d5e6b2c07'
+down_revision: Union[str, Sequence[str], None] = '3f9c2a7d41e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('timeline',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    op.create_index('ix_timeline_user_id_created_at_post_id', 'timeline', ['user_id', 'created_at', 'post_id'], unique=False)
+    op.create_index('ix_timeline_user_id_author_id', 'timeline', ['user_id', 'author_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_timeline_user_id_author_id', table_name='timeline')
+    op.drop_index('ix_timeline_user_id_created_at_post_id', table_name='timeline')
+    op.drop_table('timeline')
@@ -0,0 +1,34 @@
+"""add follows reverse index
+
+Revision ID: 9d3f6a2b7e41
+Revises: e2d46a9c8f13
+Create Date: 2026-10-18 15:21:07.316842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f6a2b7e41'
+down_revision: Union[str, Sequence[str], None] = 'e2d46a9c8f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Первичный ключ (follower_id, followed_id) не помогает искать подписчиков
+    # по followed_id; индекс строим без блокировки записи
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_follows_followed_id_follower_id', 'follows', ['followed_id', 'follower_id'],
+            unique=False, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_follows_followed_id_follower_id', table_name='follows')
@@ -0,0 +1,90 @@
+"""add comment threads
+
+Revision ID: a7b2c9d4e5f6
+Revises: 6c1e8f4a9b23
+Create Date: 2026-10-18 16:37:40.912556
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b2c9d4e5f6'
+down_revision: Union[str, Sequence[str], None] = '6c1e8f4a9b23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Путь — id предков и самого комментария, по 8 hex-символов через точку.
+# Фиксированная ширина даёт порядок обхода дерева при сортировке по path
+SET_PATH_FUNCTION = """
+CREATE FUNCTION comments_set_path() RETURNS trigger AS $$
+DECLARE
+    parent_path varchar;
+    parent_depth integer;
+    parent_post_id integer;
+BEGIN
+    IF NEW.parent_id IS NOT NULL THEN
+        SELECT path, depth, post_id INTO parent_path, parent_depth, parent_post_id
+        FROM comments WHERE id = NEW.parent_id;
+        IF FOUND AND parent_post_id <> NEW.post_id THEN
+            RAISE EXCEPTION 'parent comment % belongs to another post', NEW.parent_id
+                USING ERRCODE = 'check_violation', CONSTRAINT = 'comments_parent_same_post';
+        END IF;
+    END IF;
+
+    -- Несуществующего родителя отклонит внешний ключ comments_parent_id_fkey
+    IF parent_path IS NULL THEN
+        NEW.path := lpad(to_hex(NEW.id), 8, '0');
+        NEW.depth := 0;
+    ELSE
+        NEW.path := parent_path || '.' || lpad(to_hex(NEW.id), 8, '0');
+        NEW.depth := parent_depth + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('comments', sa.Column('parent_id', sa.Integer(), nullable=True))
+    op.add_column('comments', sa.Column('depth', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('comments', sa.Column('path', sa.String(collation='C'), nullable=True))
+    op.create_foreign_key('comments_parent_id_fkey', 'comments', 'comments', ['parent_id'], ['id'])
+
+    # Все существующие комментарии — корни
+    op.execute("UPDATE comments SET path = lpad(to_hex(id), 8, '0')")
+    op.alter_column('comments', 'path', nullable=False)
+
+    op.execute(SET_PATH_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER comments_set_path BEFORE INSERT ON comments "
+        "FOR EACH ROW EXECUTE FUNCTION comments_set_path()"
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_comments_post_id_path', 'comments', ['post_id', 'path'],
+            unique=False, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_comments_parent_id_id', 'comments', ['parent_id', 'id'],
+            unique=False, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comments_parent_id_id', table_name='comments')
+    op.drop_index('ix_comments_post_id_path', table_name='comments')
+    op.execute("DROP TRIGGER comments_set_path ON comments")
+    op.execute("DROP FUNCTION comments_set_path()")
+    op.drop_constraint('comments_parent_id_fkey', 'comments', type_='foreignkey')
+    op.drop_column('comments', 'path')
+    op.drop_column('comments', 'depth')
+    op.drop_column('comments', 'parent_id')
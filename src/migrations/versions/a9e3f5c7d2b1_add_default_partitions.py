@@ -0,0 +1,47 @@
+"""add default partitions
+
+Revision ID: a9e3f5c7d2b1
+Revises: f1a6c3e8b2d5
+Create Date: 2026-10-19 16:31:05.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9e3f5c7d2b1'
+down_revision: Union[str, Sequence[str], None] = 'f1a6c3e8b2d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LOCK_TIMEOUT = '5s'
+
+# Сначала posts: на неё ссылается внешний ключ comments
+TABLES = ('posts', 'comments')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Строки вне месячных секций (если partitions.maintain отстала) попадают
+    # в DEFAULT, а не роняют вставку. Пока секция пуста, создание месячных
+    # секций проверяет её мгновенно
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    for table in TABLES:
+        op.execute(f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Строки из DEFAULT некуда вернуть — такую секцию не удаляем, а отказываемся
+    for table in reversed(TABLES):
+        op.execute(
+            f"DO $$ BEGIN IF EXISTS (SELECT 1 FROM {table}_default) THEN "
+            f"RAISE EXCEPTION '{table}_default is not empty'; END IF; END $$"
+        )
+        # На секции posts ссылаются внешние ключи — сначала отцепляем
+        op.execute(f'ALTER TABLE {table} DETACH PARTITION {table}_default')
+        op.execute(f'DROP TABLE {table}_default')
@@ -0,0 +1,50 @@
+"""add jobs table
+
+Revision ID: b3e8d1f7c2a9
+Revises: a7b2c9d4e5f6
+Create Date: 2026-10-18 20:05:11.482930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8d1f7c2a9'
+down_revision: Union[str, Sequence[str], None] = 'a7b2c9d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('jobs',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('kind', sa.String(length=100), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), server_default=sa.text("'{}'::jsonb"), nullable=False),
+    sa.Column('status', sa.String(length=16), server_default='queued', nullable=False),
+    sa.Column('run_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('idempotency_key', sa.String(length=200), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index('ix_jobs_run_at_pending', 'jobs', ['run_at'], unique=False,
+                    postgresql_where=sa.text("status IN ('queued', 'running')"))
+    op.create_index('ix_jobs_finished_at_done', 'jobs', ['finished_at'], unique=False,
+                    postgresql_where=sa.text("status = 'done'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_jobs_finished_at_done', table_name='jobs', postgresql_where=sa.text("status = 'done'"))
+    op.drop_index('ix_jobs_run_at_pending', table_name='jobs', postgresql_where=sa.text("status IN ('queued', 'running')"))
+    op.drop_table('jobs')
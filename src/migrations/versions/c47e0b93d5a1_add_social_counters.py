@@ -0,0 +1,49 @@
+"""add social counters
+
+Revision ID: c47e0b93d5a1
+Revises: 8a1d5e6b2c07
+Create Date: 2026-10-18 12:25:47.602118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47e0b93d5a1'
+down_revision: Union[str, Sequence[str], None] = '8a1d5e6b2c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('following_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Начальные значения; дальнейший дрейф чинит src.commands.reconcile_counters
+    op.execute("""
+        UPDATE users SET
+            follower_count = (SELECT count(*) FROM follows WHERE follows.followed_id = users.id),
+            following_count = (SELECT count(*) FROM follows WHERE follows.follower_id = users.id),
+            post_count = (SELECT count(*) FROM posts WHERE posts.author_id = users.id),
+            comment_count = (SELECT count(*) FROM comments WHERE comments.author_id = users.id)
+    """)
+    op.execute("""
+        UPDATE posts SET
+            comment_count = (SELECT count(*) FROM comments WHERE comments.post_id = posts.id)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('posts', 'comment_count')
+    op.drop_column('users', 'comment_count')
+    op.drop_column('users', 'post_count')
+    op.drop_column('users', 'following_count')
+    op.drop_column('users', 'follower_count')
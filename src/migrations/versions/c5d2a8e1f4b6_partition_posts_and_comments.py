@@ -0,0 +1,381 @@
+"""partition posts and comments by month
+
+Revision ID: c5d2a8e1f4b6
+Revises: b3e8d1f7c2a9
+Create Date: 2026-10-18 21:05:12.481930
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d2a8e1f4b6'
+down_revision: Union[str, Sequence[str], None] = 'b3e8d1f7c2a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Миграция рассчитана на заполненные таблицы. Данные не переписываются:
+# существующая таблица становится секцией <table>_legacy с диапазоном
+# (MINVALUE, граница), а новые строки идут в месячные секции. Долгие шаги —
+# дозаполнение, проверки CHECK, уникальные индексы, проверка внешних ключей —
+# идут вне транзакции со слабыми блокировками; под эксклюзивной блокировкой
+# только переключение, которое меняет лишь каталог. Если переключение
+# упало по lock_timeout, upgrade можно просто повторить
+MONTHS_AHEAD = 3
+BATCH_SIZE = 10000
+LOCK_TIMEOUT = '5s'
+
+POSTS_INDEXES = {
+    'ix_posts_author_id_created_at_id': '(author_id, created_at, id)',
+    'ix_posts_created_at_id': '(created_at, id)',
+    'ix_posts_search_vector': 'USING gin (search_vector)',
+}
+COMMENTS_INDEXES = {
+    'ix_comments_post_id_created_at_id': '(post_id, created_at, id)',
+    'ix_comments_post_id_path': '(post_id, path)',
+    'ix_comments_parent_id_id': '(parent_id, id)',
+}
+
+# Внешние ключи на секционированную таблицу должны включать created_at, и
+# ключ на родителя-комментарий потребовал бы хранить ещё и его дату. Поэтому
+# пост и родителя проверяет триггер, с блокировкой FOR KEY SHARE, как это
+# делает сам внешний ключ, и с прежними именами ограничений в ошибках
+SET_PATH_FUNCTION = """
+CREATE OR REPLACE FUNCTION comments_set_path() RETURNS trigger AS $$
+DECLARE
+    post_created_at timestamptz;
+    parent_path varchar;
+    parent_depth integer;
+    parent_post_id integer;
+BEGIN
+    SELECT created_at INTO post_created_at FROM posts WHERE id = NEW.post_id FOR KEY SHARE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'post % does not exist', NEW.post_id
+            USING ERRCODE = 'foreign_key_violation', CONSTRAINT = 'comments_post_id_fkey';
+    END IF;
+    NEW.post_created_at := post_created_at;
+
+    IF NEW.parent_id IS NOT NULL THEN
+        SELECT path, depth, post_id INTO parent_path, parent_depth, parent_post_id
+        FROM comments WHERE id = NEW.parent_id FOR KEY SHARE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'parent comment % does not exist', NEW.parent_id
+                USING ERRCODE = 'foreign_key_violation', CONSTRAINT = 'comments_parent_id_fkey';
+        END IF;
+        IF parent_post_id <> NEW.post_id THEN
+            RAISE EXCEPTION 'parent comment % belongs to another post', NEW.parent_id
+                USING ERRCODE = 'check_violation', CONSTRAINT = 'comments_parent_same_post';
+        END IF;
+    END IF;
+
+    IF parent_path IS NULL THEN
+        NEW.path := lpad(to_hex(NEW.id), 8, '0');
+        NEW.depth := 0;
+    ELSE
+        NEW.path := parent_path || '.' || lpad(to_hex(NEW.id), 8, '0');
+        NEW.depth := parent_depth + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# AFTER, а не BEFORE: ответы, удалённые тем же оператором, уже не видны
+RESTRICT_PARENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION comments_restrict_parent() RETURNS trigger AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM comments WHERE parent_id = OLD.id) THEN
+        RAISE EXCEPTION 'comment % has replies', OLD.id
+            USING ERRCODE = 'foreign_key_violation', CONSTRAINT = 'comments_parent_id_fkey';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+PREVIOUS_SET_PATH_FUNCTION = """
+CREATE OR REPLACE FUNCTION comments_set_path() RETURNS trigger AS $$
+DECLARE
+    parent_path varchar;
+    parent_depth integer;
+    parent_post_id integer;
+BEGIN
+    IF NEW.parent_id IS NOT NULL THEN
+        SELECT path, depth, post_id INTO parent_path, parent_depth, parent_post_id
+        FROM comments WHERE id = NEW.parent_id;
+        IF FOUND AND parent_post_id <> NEW.post_id THEN
+            RAISE EXCEPTION 'parent comment % belongs to another post', NEW.parent_id
+                USING ERRCODE = 'check_violation', CONSTRAINT = 'comments_parent_same_post';
+        END IF;
+    END IF;
+
+    -- Несуществующего родителя отклонит внешний ключ comments_parent_id_fkey
+    IF parent_path IS NULL THEN
+        NEW.path := lpad(to_hex(NEW.id), 8, '0');
+        NEW.depth := 0;
+    ELSE
+        NEW.path := parent_path || '.' || lpad(to_hex(NEW.id), 8, '0');
+        NEW.depth := parent_depth + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def _add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _cutover() -> datetime:
+    """
+    Верхняя граница legacy-секции — начало следующего месяца: строки,
+    вставленные до переключения, ещё проходят CHECK. Если до неё меньше
+    суток, переключение может не успеть — берём месяц после
+    """
+    now = datetime.now(timezone.utc)
+    cutover = _add_months(now.replace(day=1, hour=0, minute=0, second=0, microsecond=0), 1)
+    if cutover - now < timedelta(days=1):
+        cutover = _add_months(cutover, 1)
+    return cutover
+
+
+def _is_partitioned(table: str) -> bool:
+    return op.get_bind().execute(
+        sa.text("SELECT relkind = 'p' FROM pg_class WHERE oid = CAST(:table AS regclass)"), {"table": table}
+    ).scalar()
+
+
+def _set_not_null(table: str, column: str) -> None:
+    # SET NOT NULL без полного прохода под эксклюзивной блокировкой: опирается
+    # на заранее проверенный CHECK
+    name = f'{table}_{column}_not_null'
+    op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}')
+    op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} CHECK ({column} IS NOT NULL) NOT VALID')
+    op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {name}')
+    op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL')
+    op.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+
+
+def _prepare(table: str, cutover: datetime) -> None:
+    """
+    CHECK на диапазон будущей legacy-секции — с ним ATTACH PARTITION не
+    сканирует таблицу — и уникальный индекс (id, created_at) под первичный ключ
+    """
+    _set_not_null(table, 'created_at')
+    op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_legacy_range')
+    op.execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT {table}_legacy_range "
+        f"CHECK (created_at < '{cutover.isoformat()}') NOT VALID"
+    )
+    op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_legacy_range')
+    op.execute('RESET lock_timeout')
+    op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {table}_id_created_at_key')
+    op.execute(f'CREATE UNIQUE INDEX CONCURRENTLY {table}_id_created_at_key ON {table} (id, created_at)')
+    op.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+
+
+def _swap(table: str, indexes: dict, foreign_keys: dict, cutover: datetime, generated: bool) -> None:
+    """
+    Переименовывает таблицу в <table>_legacy, создаёт на её месте
+    секционированную и прикрепляет старую секцией. Индексы и внешние ключи
+    legacy-секции совпадают с родительскими и прикрепляются без перестройки
+    """
+    legacy = f'{table}_legacy'
+    op.execute(f'ALTER TABLE {table} DROP CONSTRAINT {table}_pkey')
+    op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {legacy}_pkey PRIMARY KEY USING INDEX {table}_id_created_at_key')
+    # Поиск по id обслуживает первичный ключ (id, created_at)
+    op.execute(f'DROP INDEX ix_{table}_id')
+    op.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    for name in indexes:
+        op.execute(f'ALTER INDEX {name} RENAME TO {legacy}{name[len("ix_" + table):]}_idx')
+
+    including = 'INCLUDING DEFAULTS INCLUDING GENERATED' if generated else 'INCLUDING DEFAULTS'
+    op.execute(f'CREATE TABLE {table} (LIKE {legacy} {including}) PARTITION BY RANGE (created_at)')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)')
+    for name, definition in foreign_keys.items():
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+    for name, columns in indexes.items():
+        op.execute(f'CREATE INDEX {name} ON {table} {columns}')
+
+    op.execute(f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ('{cutover.isoformat()}')")
+    op.execute(f'ALTER TABLE {legacy} DROP CONSTRAINT {table}_legacy_range')
+
+    month = cutover
+    for _ in range(MONTHS_AHEAD + 1):
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+
+
+def _require_online() -> None:
+    # Ход миграции зависит от каталога и данных базы, поэтому SQL-скрипт
+    # заранее (alembic upgrade --sql) для неё не получить
+    if context.is_offline_mode():
+        raise RuntimeError("Migration c5d2a8e1f4b6 inspects the database and cannot run in offline (--sql) mode")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _require_online()
+    posts_done, comments_done = _is_partitioned('posts'), _is_partitioned('comments')
+    cutover = _cutover()
+
+    # 1. Дата поста в комментариях — вторая половина внешнего ключа на posts.
+    # Новые строки заполняет триггер, старые — дозаполнение ниже
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    op.execute('ALTER TABLE comments ADD COLUMN IF NOT EXISTS post_created_at timestamp with time zone')
+    op.execute(SET_PATH_FUNCTION)
+    op.execute(RESTRICT_PARENT_FUNCTION)
+
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        op.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        if not posts_done:
+            op.execute('UPDATE posts SET created_at = updated_at WHERE created_at IS NULL')
+        if not comments_done:
+            op.execute('UPDATE comments SET created_at = updated_at WHERE created_at IS NULL')
+            # Пачками по id: каждая пачка — своя короткая транзакция
+            max_id = bind.execute(sa.text('SELECT coalesce(max(id), 0) FROM comments')).scalar()
+            for low in range(0, max_id + 1, BATCH_SIZE):
+                bind.execute(sa.text(
+                    'UPDATE comments c SET post_created_at = p.created_at FROM posts p '
+                    'WHERE p.id = c.post_id AND c.id > :low AND c.id <= :high AND c.post_created_at IS NULL'
+                ), {'low': low, 'high': low + BATCH_SIZE})
+            _set_not_null('comments', 'post_created_at')
+        # В ленте created_at — дата поста; расхождения помешали бы новому ключу
+        op.execute(
+            'UPDATE timeline t SET created_at = p.created_at FROM posts p '
+            'WHERE p.id = t.post_id AND t.created_at <> p.created_at'
+        )
+        if not posts_done:
+            _prepare('posts', cutover)
+        if not comments_done:
+            _prepare('comments', cutover)
+        op.execute('RESET lock_timeout')
+
+    # 2. Переключение posts. Внешние ключи на неё создаются NOT VALID и
+    # проверяются следующим шагом без блокировки записи
+    if not posts_done:
+        op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        op.execute('ALTER TABLE timeline DROP CONSTRAINT timeline_post_id_fkey')
+        op.execute('ALTER TABLE comments DROP CONSTRAINT comments_post_id_fkey')
+        _swap('posts', POSTS_INDEXES, {
+            'posts_author_id_fkey': 'FOREIGN KEY (author_id) REFERENCES users (id)',
+        }, cutover, generated=True)
+        op.execute(
+            'ALTER TABLE timeline ADD CONSTRAINT timeline_post_id_fkey FOREIGN KEY (post_id, created_at) '
+            'REFERENCES posts (id, created_at) ON DELETE CASCADE NOT VALID'
+        )
+        op.execute(
+            'ALTER TABLE comments ADD CONSTRAINT comments_post_id_fkey FOREIGN KEY (post_id, post_created_at) '
+            'REFERENCES posts (id, created_at) NOT VALID'
+        )
+
+    with op.get_context().autocommit_block():
+        op.execute('ALTER TABLE timeline VALIDATE CONSTRAINT timeline_post_id_fkey')
+        if not comments_done:
+            op.execute('ALTER TABLE comments VALIDATE CONSTRAINT comments_post_id_fkey')
+
+    # 3. Переключение comments: проверенный ключ на users legacy-секции
+    # прикрепляется к родительскому без повторной проверки. Ключ на posts
+    # остаётся пока ключом самой legacy-секции — см. шаг 4
+    if not comments_done:
+        op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        op.execute('ALTER TABLE comments DROP CONSTRAINT comments_parent_id_fkey')
+        op.execute('DROP TRIGGER comments_set_path ON comments')
+        _swap('comments', COMMENTS_INDEXES, {
+            'comments_author_id_fkey': 'FOREIGN KEY (author_id) REFERENCES users (id)',
+        }, cutover, generated=False)
+        op.execute(
+            'CREATE TRIGGER comments_set_path BEFORE INSERT ON comments '
+            'FOR EACH ROW EXECUTE FUNCTION comments_set_path()'
+        )
+        op.execute(
+            'CREATE TRIGGER comments_restrict_parent AFTER DELETE ON comments '
+            'FOR EACH ROW EXECUTE FUNCTION comments_restrict_parent()'
+        )
+
+    # 4. Ключ comments на posts ставится сразу на родителя, с проверкой всех
+    # строк: запись в comments и posts на это время ждёт, чтение идёт.
+    # Прикреплять ключ секции нельзя, когда posts тоже секционирована: его
+    # триггеры на секциях posts остаются, а PostgreSQL кэширует план
+    # проверки и каскада по корневому ключу — и ходит не в ту секцию comments.
+    # Месячные секции до границы пусты, а legacy до замены держит свой ключ.
+    # Замена — одним DO, то есть одной транзакцией, уже после фиксации
+    # переключения и без его эксклюзивной блокировки
+    with op.get_context().autocommit_block():
+        op.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        op.execute("""
+            DO $$
+            BEGIN
+                ALTER TABLE comments DROP CONSTRAINT IF EXISTS comments_post_id_fkey;
+                ALTER TABLE comments_legacy DROP CONSTRAINT IF EXISTS comments_post_id_fkey;
+                ALTER TABLE comments ADD CONSTRAINT comments_post_id_fkey
+                    FOREIGN KEY (post_id, post_created_at) REFERENCES posts (id, created_at);
+            END
+            $$
+        """)
+        op.execute('RESET lock_timeout')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Обратно в обычные таблицы копированием всех строк под эксклюзивной
+    # блокировкой — для больших таблиц это простой. Уже отцеплённые архивные
+    # секции не возвращаются
+    op.execute('DROP TRIGGER comments_restrict_parent ON comments')
+    op.execute('DROP TRIGGER comments_set_path ON comments')
+    op.execute('DROP FUNCTION comments_restrict_parent()')
+    op.execute('ALTER TABLE timeline DROP CONSTRAINT timeline_post_id_fkey')
+
+    for table, indexes, generated in (('posts', POSTS_INDEXES, True), ('comments', COMMENTS_INDEXES, False)):
+        op.execute(f'ALTER TABLE {table} RENAME TO {table}_partitioned')
+        for name in indexes:
+            op.execute(f'ALTER INDEX {name} RENAME TO {name}_partitioned')
+        op.execute(f'ALTER INDEX {table}_pkey RENAME TO {table}_partitioned_pkey')
+        including = 'INCLUDING DEFAULTS INCLUDING GENERATED' if generated else 'INCLUDING DEFAULTS'
+        op.execute(f'CREATE TABLE {table} (LIKE {table}_partitioned {including})')
+
+    op.drop_column('comments', 'post_created_at')
+    op.execute(
+        'INSERT INTO posts (id, title, content, author_id, created_at, updated_at, comment_count) '
+        'SELECT id, title, content, author_id, created_at, updated_at, comment_count FROM posts_partitioned'
+    )
+    op.execute(
+        'INSERT INTO comments (id, content, author_id, post_id, parent_id, depth, path, created_at, updated_at) '
+        'SELECT id, content, author_id, post_id, parent_id, depth, path, created_at, updated_at FROM comments_partitioned'
+    )
+    for table in ('posts', 'comments'):
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.execute('DROP TABLE comments_partitioned')
+    op.execute('DROP TABLE posts_partitioned')
+
+    for table, indexes in (('posts', POSTS_INDEXES), ('comments', COMMENTS_INDEXES)):
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN created_at DROP NOT NULL')
+        op.execute(f'CREATE INDEX ix_{table}_id ON {table} (id)')
+        for name, columns in indexes.items():
+            op.execute(f'CREATE INDEX {name} ON {table} {columns}')
+
+    op.create_foreign_key('posts_author_id_fkey', 'posts', 'users', ['author_id'], ['id'])
+    op.create_foreign_key('comments_author_id_fkey', 'comments', 'users', ['author_id'], ['id'])
+    op.create_foreign_key('comments_post_id_fkey', 'comments', 'posts', ['post_id'], ['id'])
+    op.create_foreign_key('comments_parent_id_fkey', 'comments', 'comments', ['parent_id'], ['id'])
+    op.create_foreign_key('timeline_post_id_fkey', 'timeline', 'posts', ['post_id'], ['id'], ondelete='CASCADE')
+
+    op.execute(PREVIOUS_SET_PATH_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER comments_set_path BEFORE INSERT ON comments "
+        "FOR EACH ROW EXECUTE FUNCTION comments_set_path()"
+    )
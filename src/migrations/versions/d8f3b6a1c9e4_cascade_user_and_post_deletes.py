@@ -0,0 +1,127 @@
+"""cascade user and post deletes
+
+Revision ID: d8f3b6a1c9e4
+Revises: c5d2a8e1f4b6
+Create Date: 2026-10-18 23:12:40.207315
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3b6a1c9e4'
+down_revision: Union[str, Sequence[str], None] = 'c5d2a8e1f4b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LOCK_TIMEOUT = '5s'
+
+# Внешние ключи, которые получают ON DELETE CASCADE: (таблица, определение)
+FOREIGN_KEYS = {
+    'posts_author_id_fkey': ('posts', 'FOREIGN KEY (author_id) REFERENCES users (id)'),
+    'comments_author_id_fkey': ('comments', 'FOREIGN KEY (author_id) REFERENCES users (id)'),
+    'comments_post_id_fkey': (
+        'comments', 'FOREIGN KEY (post_id, post_created_at) REFERENCES posts (id, created_at)'
+    ),
+    'follows_follower_id_fkey': ('follows', 'FOREIGN KEY (follower_id) REFERENCES users (id)'),
+    'follows_followed_id_fkey': ('follows', 'FOREIGN KEY (followed_id) REFERENCES users (id)'),
+}
+
+# Ключи на секционированную posts ставятся сразу на родителя, с проверкой
+# всех строк под блокировкой записи. Ключ секции, прикреплённый к ключу
+# родителя, оставляет свои триггеры на секциях posts, а PostgreSQL кэширует
+# план каскада по корневому ключу — и удаление поста чистит комментарии
+# только одной секции comments
+ON_PARENT = {'comments_post_id_fkey'}
+
+# Индексы под каскады: без них каждое удаление поста или пользователя
+# сканирует ссылающуюся таблицу целиком
+INDEXES = {
+    'ix_timeline_post_id_created_at': ('timeline', '(post_id, created_at)'),
+    'ix_suggestions_suggested_id': ('suggestions', '(suggested_id)'),
+}
+
+
+def _partitions(table: str) -> list:
+    return op.get_bind().execute(sa.text(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname'
+    ), {'table': table}).scalars().all()
+
+
+def _leaves(table: str) -> list:
+    """Таблицы, где живут строки: секции секционированной или она сама"""
+    return _partitions(table) or [table]
+
+
+def _require_online() -> None:
+    # Ход миграции зависит от каталога и данных базы, поэтому SQL-скрипт
+    # заранее (alembic upgrade --sql) для неё не получить
+    if context.is_offline_mode():
+        raise RuntimeError("Migration d8f3b6a1c9e4 inspects the database and cannot run in offline (--sql) mode")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _require_online()
+    # 1. Индексы строятся без блокировки записи. У секционированной comments
+    # индекс родителя создаётся ON ONLY (пустым и невалидным), индексы секций —
+    # CONCURRENTLY и прикрепляются к нему; с последней секцией он становится валидным
+    with op.get_context().autocommit_block():
+        for name, (table, columns) in INDEXES.items():
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {columns}')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_comments_author_id ON ONLY comments (author_id)')
+        for partition in _partitions('comments'):
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_author_id_idx ON {partition} (author_id)')
+            op.execute(f'ALTER INDEX ix_comments_author_id ATTACH PARTITION {partition}_author_id_idx')
+
+    # 2. Ключи пересоздаются с каскадом: на секциях (и обычных таблицах) —
+    # NOT VALID, это только каталог. Новые строки они проверяют сразу
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    op.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS deleted_at timestamp with time zone')
+    for name, (table, definition) in FOREIGN_KEYS.items():
+        if name in ON_PARENT:
+            continue
+        leaves = _leaves(table)
+        if leaves != [table]:
+            op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}')
+        for leaf in leaves:
+            # У секций ключи могли остаться от прерванного запуска
+            op.execute(f'ALTER TABLE {leaf} DROP CONSTRAINT IF EXISTS {name}')
+            op.execute(f'ALTER TABLE {leaf} ADD CONSTRAINT {name} {definition} ON DELETE CASCADE NOT VALID')
+
+    # 3. Проверка существующих строк — без блокировки записи
+    with op.get_context().autocommit_block():
+        for name, (table, _) in FOREIGN_KEYS.items():
+            if name in ON_PARENT:
+                continue
+            for leaf in _leaves(table):
+                op.execute(f'ALTER TABLE {leaf} VALIDATE CONSTRAINT {name}')
+
+    # 4. Ключ родителя: проверенные ключи секций с тем же определением
+    # прикрепляются к нему без повторной проверки. Ключи из ON_PARENT
+    # заменяются целиком; ключи секций от прерванного запуска снимаются
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    for name, (table, definition) in FOREIGN_KEYS.items():
+        if name in ON_PARENT:
+            op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}')
+            for leaf in _partitions(table):
+                op.execute(f'ALTER TABLE {leaf} DROP CONSTRAINT IF EXISTS {name}')
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition} ON DELETE CASCADE')
+        elif _partitions(table):
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition} ON DELETE CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, (table, definition) in FOREIGN_KEYS.items():
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+    op.drop_index('ix_comments_author_id', table_name='comments')
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+    op.drop_column('users', 'deleted_at')
@@ -0,0 +1,47 @@
+"""add posts search vector
+
+Revision ID: e2d46a9c8f13
+Revises: 5b8e13f0a6c2
+Create Date: 2026-10-18 14:02:19.774530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2d46a9c8f13'
+down_revision: Union[str, Sequence[str], None] = '5b8e13f0a6c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Копия выражения из src/models/posts.py: миграция не должна меняться вместе с моделью
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(content, '')), 'B')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Добавление STORED-колонки переписывает таблицу posts под эксклюзивной блокировкой
+    op.add_column('posts', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True), nullable=True
+    ))
+    # Индекс строим без блокировки записи
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_posts_search_vector', 'posts', ['search_vector'], unique=False,
+            postgresql_using='gin', postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_search_vector', table_name='posts')
+    op.drop_column('posts', 'search_vector')
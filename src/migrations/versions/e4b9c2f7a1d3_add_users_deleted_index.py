@@ -0,0 +1,34 @@
+"""add users deleted index
+
+Revision ID: e4b9c2f7a1d3
+Revises: d8f3b6a1c9e4
+Create Date: 2026-10-19 10:42:18.630174
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9c2f7a1d3'
+down_revision: Union[str, Sequence[str], None] = 'd8f3b6a1c9e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Списки исключают записи помеченных на удаление через NOT IN по этому
+    # индексу; в нём только пользователи, чья очистка ещё идёт
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_deleted_id', 'users', ['id'], unique=False,
+            postgresql_where=sa.text('deleted_at IS NOT NULL'), postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_deleted_id', table_name='users')
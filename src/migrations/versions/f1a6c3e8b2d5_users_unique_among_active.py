@@ -0,0 +1,51 @@
+"""users unique among active
+
+Revision ID: f1a6c3e8b2d5
+Revises: e4b9c2f7a1d3
+Create Date: 2026-10-19 15:07:44.218903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a6c3e8b2d5'
+down_revision: Union[str, Sequence[str], None] = 'e4b9c2f7a1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COLUMNS = ('username', 'email')
+
+
+def _swap(column: str, where) -> None:
+    # Новый индекс строится рядом без блокировки записи, затем заменяет
+    # старый под тем же именем — на него ссылается разбор ошибок уникальности
+    name = f'ix_users_{column}'
+    op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}_new')
+    op.create_index(
+        f'{name}_new', 'users', [column], unique=True,
+        postgresql_where=where, postgresql_concurrently=True
+    )
+    op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    op.execute(f'ALTER INDEX {name}_new RENAME TO {name}')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Имя и почта пользователя, помеченного на удаление, свободны сразу,
+    # а не после окончания очистки его данных
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            _swap(column, sa.text('deleted_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Не пройдёт, если имя или почта помеченного пользователя уже заняты заново
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            _swap(column, None)
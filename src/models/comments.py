@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, Integer, String, ForeignKey, func
+from sqlalchemy import Column, DateTime, FetchedValue, Integer, String, ForeignKey, ForeignKeyConstraint, Index, func
 from sqlalchemy.orm import relationship
 from src.database import Base
 
@@ -6,12 +6,39 @@ from src.database import Base
 
 class Comment(Base):
     __tablename__ = "comments"
-
-    id = Column(Integer, primary_key=True, index=True)
+    __table_args__ = (
+        # Индекс под keyset-пагинацию комментариев поста по (created_at, id)
+        Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+        # Дерево комментариев поста в порядке обхода и ответы на комментарий
+        Index("ix_comments_post_id_path", "post_id", "path"),
+        Index("ix_comments_parent_id_id", "parent_id", "id"),
+        # Комментарии автора — для очистки при удалении пользователя
+        Index("ix_comments_author_id", "author_id"),
+        # Посты секционированы, и внешний ключ ссылается на их (id, created_at)
+        ForeignKeyConstraint(
+            ["post_id", "post_created_at"], ["posts.id", "posts.created_at"],
+            ondelete="CASCADE", name="comments_post_id_fkey",
+        ),
+        # Месячные секции по created_at, как у posts
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
     content = Column(String, nullable=False)
-    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    post_id = Column(Integer, nullable=False)
+    # Дата создания поста; заполняет триггер comments_set_path
+    post_created_at = Column(DateTime(timezone=True), nullable=False, server_default=FetchedValue())
+    # Внешнего ключа на родителя нет: он потребовал бы и дату родителя. Ссылку
+    # проверяют триггеры comments_set_path (вставка) и comments_restrict_parent
+    # (удаление), ошибки — под прежним именем comments_parent_id_fkey
+    parent_id = Column(Integer, nullable=True)
+    # path и depth заполняет триггер comments_set_path при вставке: path —
+    # id предков и свой через точку, по 8 hex-символов на уровень
+    depth = Column(Integer, nullable=False, server_default="0")
+    path = Column(String(collation="C"), nullable=False, server_default=FetchedValue())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
     post = relationship("Post", back_populates="comments")
     author = relationship("User", back_populates="comments")  
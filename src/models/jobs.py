@@ -0,0 +1,33 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Table, Text, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from src.database import Base
+
+
+# Условия частичных индексов; запросы используют их же текстом, с параметрами
+# вместо литералов планировщик индекс не выберет
+PENDING = "status IN ('queued', 'running')"
+DONE = "status = 'done'"
+
+# Очередь фоновых задач. status: queued — ждёт run_at; running — взята
+# воркером, run_at тогда означает конец аренды: если воркер упал, по её
+# истечении задачу заберёт другой; done — выполнена; dead — исчерпала попытки
+jobs = Table(
+    'jobs',
+    Base.metadata,
+    Column('id', BigInteger, primary_key=True),
+    Column('kind', String(100), nullable=False),
+    Column('payload', JSONB, nullable=False, server_default=text("'{}'::jsonb")),
+    Column('status', String(16), nullable=False, server_default='queued'),
+    Column('run_at', DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Column('attempts', Integer, nullable=False, server_default='0'),
+    Column('max_attempts', Integer, nullable=False),
+    Column('last_error', Text),
+    Column('locked_by', String(100)),
+    # Повторный enqueue с тем же ключом ничего не добавляет
+    Column('idempotency_key', String(200), unique=True),
+    Column('created_at', DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Column('finished_at', DateTime(timezone=True)),
+    # Выборка готовых задач читает только незавершённые строки
+    Index('ix_jobs_run_at_pending', 'run_at', postgresql_where=text(PENDING)),
+    Index('ix_jobs_finished_at_done', 'finished_at', postgresql_where=text(DONE)),
+)
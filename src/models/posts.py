@@ -1,20 +1,45 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Computed, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from src.database import Base
 
 
+# Конфигурация полнотекстового поиска: 'simple' не привязана к языку,
+# поэтому одинаково работает для русских и английских постов
+SEARCH_CONFIG = "simple"
+SEARCH_VECTOR_EXPRESSION = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'B')"
+)
+
+
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        # Индексы под keyset-пагинацию по (created_at, id)
+        Index("ix_posts_author_id_created_at_id", "author_id", "created_at", "id"),
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+        # Месячные секции по created_at (src.partitions); ключ секционирования
+        # обязан входить в первичный ключ, поэтому он составной
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String, nullable=False)
     content = Column(String, nullable=False)
-    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Генерируемая колонка для поиска; не нужна в ответах, поэтому deferred
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
 
     author = relationship("User", back_populates="posts")
-    comments = relationship("Comment", back_populates="post", lazy="select")
+    comments = relationship(
+        "Comment", back_populates="post", lazy="select", cascade="all, delete", passive_deletes=True
+    )
 
     def __repr__(self):
         return f"<Post(id={self.id}, title='{self.title}')>"
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, Table, func
+from src.database import Base
+
+
+# Предрасчитанные рекомендации «на кого подписаться»: кандидаты, на которых
+# подписаны те, на кого подписан пользователь
+suggestions = Table(
+    'suggestions',
+    Base.metadata,
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('suggested_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('mutual_count', Integer, nullable=False),
+    Column('computed_at', DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Index('ix_suggestions_user_id_mutual_count', 'user_id', 'mutual_count', 'suggested_id'),
+    # Кому рекомендован пользователь — для каскада при его удалении
+    Index('ix_suggestions_suggested_id', 'suggested_id'),
+)
+
+# Пользователи, чьи подписки изменились после последнего пересчёта
+suggestions_stale = Table(
+    'suggestions_stale',
+    Base.metadata,
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('marked_at', DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
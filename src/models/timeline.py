@@ -0,0 +1,22 @@
+from sqlalchemy import Column, DateTime, ForeignKey, ForeignKeyConstraint, Index, Integer, Table
+from src.database import Base
+
+
+# Материализованная лента: по строке на каждый пост, разосланный подписчику
+timeline = Table(
+    'timeline',
+    Base.metadata,
+    Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('post_id', Integer, primary_key=True),
+    Column('author_id', Integer, nullable=False),
+    # Дата поста: вместе с post_id — ключ секционированной posts
+    Column('created_at', DateTime(timezone=True), nullable=False),
+    ForeignKeyConstraint(
+        ['post_id', 'created_at'], ['posts.id', 'posts.created_at'],
+        ondelete='CASCADE', name='timeline_post_id_fkey',
+    ),
+    Index('ix_timeline_user_id_created_at_post_id', 'user_id', 'created_at', 'post_id'),
+    Index('ix_timeline_user_id_author_id', 'user_id', 'author_id'),
+    # Записи поста во всех лентах — для каскада при удалении поста
+    Index('ix_timeline_post_id_created_at', 'post_id', 'created_at'),
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Table
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, DateTime, Table, select, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from src.database import Base 
@@ -8,22 +8,47 @@ from src.database import Base
 follows = Table(
     'follows',
     Base.metadata,
-    Column('follower_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('followed_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('follower_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    Column('followed_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    # Обратный индекс: подписчики пользователя по порядку follower_id
+    Index('ix_follows_followed_id_follower_id', 'followed_id', 'follower_id'),
 )
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # Помеченные на удаление — для not_deleted()
+        Index("ix_users_deleted_id", "id", postgresql_where=text("deleted_at IS NOT NULL")),
+        # Уникальны среди активных: имя и почта освобождаются сразу при
+        # пометке на удаление, не дожидаясь очистки
+        Index("ix_users_username", "username", unique=True, postgresql_where=text("deleted_at IS NULL")),
+        Index("ix_users_email", "email", unique=True, postgresql_where=text("deleted_at IS NULL")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True, nullable=False)
-    email = Column(String, unique=True, index=True, nullable=False)
+    username = Column(String, nullable=False)
+    email = Column(String, nullable=False)
     hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    # Помечен на удаление: его данные дочищает фоновая задача (src.purge),
+    # а в API не видны ни он сам (ACTIVE), ни его записи (not_deleted)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Денормализованные счётчики, обновляются в транзакциях роутеров
+    follower_count = Column(Integer, nullable=False, default=0, server_default="0")
+    following_count = Column(Integer, nullable=False, default=0, server_default="0")
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
 
-    posts = relationship("Post", back_populates="author", lazy="select")
-    comments = relationship("Comment", back_populates="author", lazy="select")
+    # Удаление идёт каскадами внешних ключей и src.purge, а не загрузкой
+    # связанных строк в сессию: passive_deletes не даёт ORM их подгружать
+    posts = relationship("Post", back_populates="author", lazy="select", cascade="all, delete", passive_deletes=True)
+    comments = relationship(
+        "Comment", back_populates="author", lazy="select", cascade="all, delete", passive_deletes=True
+    )
     following = relationship(
         "User",
         secondary="follows",
@@ -31,6 +56,7 @@ class User(Base):
         secondaryjoin="User.id == follows.c.followed_id",
         back_populates="followers",
         lazy="select",
+        passive_deletes=True,
     )
     followers = relationship(
         "User",
@@ -39,7 +65,22 @@ class User(Base):
         secondaryjoin="User.id == follows.c.follower_id",
         back_populates="following",
         lazy="select",
+        passive_deletes=True,
     )
 
     def __repr__(self):
-        return f"<User(id={self.id}, username='{self.username}', email='{self.email}')>"
\ No newline at end of file
+        return f"<User(id={self.id}, username='{self.username}', email='{self.email}')>"
+
+
+# Пользователь не помечен на удаление: условие для всех выборок из users
+ACTIVE = User.__table__.c.deleted_at.is_(None)
+
+
+def not_deleted(user_id):
+    """
+    То же для ссылок на пользователя (author_id, follower_id, ...). Помечены
+    на удаление только те, чья очистка ещё идёт, поэтому NOT IN по частичному
+    индексу дешевле соединения с users в каждом списке
+    """
+    users = User.__table__
+    return user_id.not_in(select(users.c.id).where(users.c.deleted_at.is_not(None)))
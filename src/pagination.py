@@ -0,0 +1,107 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+
+# Заголовок, в котором отдаётся курсор следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Общее число элементов списка, если клиент его запросил
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def _pack(key, row_id: int) -> str:
+    payload = json.dumps([key, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _unpack(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    key, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    return key, int(row_id)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Упаковывает позицию (created_at, id) в непрозрачную строку"""
+    return _pack(created_at.isoformat(), row_id)
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Распаковывает курсор, полученный от encode_cursor"""
+    try:
+        created_at, row_id = _unpack(cursor)
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    """Курсор для выдачи, отсортированной по (релевантность, id)"""
+    return _pack(rank, row_id)
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, row_id = _unpack(cursor)
+        return float(rank), row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_id_cursor(row_id: int) -> str:
+    """Курсор для выдачи, отсортированной только по id"""
+    return _pack(None, row_id)
+
+
+def decode_id_cursor(cursor: str) -> int:
+    try:
+        _, row_id = _unpack(cursor)
+        return row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_path_cursor(path: str, row_id: int) -> str:
+    """Курсор для дерева комментариев, отсортированного по материализованному пути"""
+    return _pack(path, row_id)
+
+
+def decode_path_cursor(cursor: str) -> str:
+    try:
+        path, _ = _unpack(cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(path, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return path
+
+
+def keyset_paginate(query, model, cursor: Optional[str], skip: int, limit: int, descending: bool = False):
+    """
+    Добавляет к запросу стабильную сортировку по (created_at, id) и
+    пагинацию: по курсору, если он передан, иначе — старым offset
+    """
+    key = tuple_(model.created_at, model.id)
+    if descending:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at, model.id)
+    query = query.limit(limit)
+    if cursor:
+        position = decode_cursor(cursor)
+        # Сравнение кортежей планировщик не использует для отсечения секций по
+        # created_at, поэтому дублируем границу отдельным условием
+        if descending:
+            return query.filter(key < position, model.created_at <= position[0])
+        return query.filter(key > position, model.created_at >= position[0])
+    return query.offset(skip)
+
+
+def set_next_cursor(response: Response, items: Sequence, limit: int) -> None:
+    """Выставляет курсор следующей страницы, если текущая заполнена целиком"""
+    if items and len(items) == limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
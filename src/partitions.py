@@ -0,0 +1,214 @@
+import logging
+import re
+import time
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from settings import settings
+from src.database import AsyncSessionLocal
+from src.jobs import enqueue, job
+
+
+logger = logging.getLogger(__name__)
+
+# Таблицы с месячными секциями по created_at. Порядок важен при архивации:
+# комментарии ссылаются на посты, поэтому отцепляются первыми
+PARTITIONED_TABLES = ("comments", "posts")
+
+# Имена секций: месячные posts_2026_11, legacy — бывшая таблица целиком и
+# default — строки, для которых месячной секции не нашлось
+PARTITION_NAME = re.compile(r"^(posts|comments)_(legacy|default|\d{4}_\d{2})$")
+
+MAINTAIN_JOB = "partitions.maintain"
+
+# Создание секции ненадолго берёт эксклюзивную блокировку родителя: не ждём
+# в очереди за долгими запросами, а пробуем позже
+LOCK_TIMEOUT = "5s"
+
+# Границы секции из pg_get_expr(relpartbound) приводим к timestamptz в самом
+# Postgres: текст зависит от часового пояса сессии. MINVALUE/MAXVALUE и
+# DEFAULT дают NULL
+PARTITIONS_QUERY = text(r"""
+    SELECT c.relname AS name,
+           (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''([^'']+)''\)'))[1]::timestamptz AS lower,
+           (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamptz AS upper,
+           pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT' AS is_default
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST(:table AS regclass)
+    ORDER BY lower NULLS FIRST
+""")
+
+
+class Partition(NamedTuple):
+    name: str
+    lower: Optional[datetime]
+    upper: Optional[datetime]
+    is_default: bool = False
+
+
+class DefaultPartitionNotEmpty(RuntimeError):
+    """В DEFAULT-секции есть строки: месячную секцию на их месяц не создать"""
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+async def list_partitions(db, table: str) -> List[Partition]:
+    result = await db.execute(PARTITIONS_QUERY, {"table": table})
+    return [Partition(*row) for row in result]
+
+
+async def ensure_partitions(db: AsyncSession, months_ahead: int) -> List[str]:
+    """
+    Создаёт недостающие месячные секции от конца последней существующей до
+    месяца now + months_ahead включительно. Возвращает имена созданных.
+    Если создание отстало и строки уже легли в DEFAULT-секцию, Postgres не
+    даст создать секцию на их месяц — падаем с DefaultPartitionNotEmpty,
+    строки нужно перенести вручную
+    """
+    await db.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+    now = datetime.now(timezone.utc)
+    last = add_months(month_start(now), months_ahead)
+    created = []
+    for table in PARTITIONED_TABLES:
+        partitions = await list_partitions(db, table)
+        for partition in partitions:
+            if partition.is_default:
+                await _check_default(db, partition.name)
+        # Продолжаем с верхней границы последней секции, так что первая
+        # месячная начинается ровно там, где кончается legacy
+        month = max((p.upper for p in partitions if p.upper), default=None) or month_start(now)
+        while month <= last:
+            upper = add_months(month_start(month), 1)
+            name = partition_name(table, month)
+            await db.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+            ))
+            created.append(name)
+            month = upper
+    return created
+
+
+async def _check_default(db: AsyncSession, name: str) -> None:
+    oldest = await db.scalar(text(f"SELECT min(created_at) FROM {name}"))
+    if oldest is not None:
+        raise DefaultPartitionNotEmpty(
+            f"{name} has rows since {oldest.isoformat()}: "
+            "move them to a monthly partition before new partitions can be created"
+        )
+
+
+async def _delete_timeline(connection: AsyncConnection, partition: Partition, batch_size: int) -> int:
+    """
+    Убирает из лент записи постов секции пачками: внешний ключ timeline не
+    даст отцепить секцию, на которую ссылаются. created_at в ленте — дата поста
+    """
+    bounds = "created_at < :upper" + (" AND created_at >= :lower" if partition.lower else "")
+    statement = text(
+        "DELETE FROM timeline WHERE (user_id, post_id) IN "
+        f"(SELECT user_id, post_id FROM timeline WHERE {bounds} LIMIT :batch_size)"
+    )
+    deleted = 0
+    while True:
+        result = await connection.execute(statement, {
+            "lower": partition.lower, "upper": partition.upper, "batch_size": batch_size,
+        })
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+async def archive_partitions(connection: AsyncConnection, before: datetime, drop: bool, batch_size: int) -> List[str]:
+    """
+    Отцепляет секции, целиком лежащие до before. Отцеплённая секция остаётся
+    обычной таблицей (для pg_dump), с drop — удаляется. DETACH CONCURRENTLY
+    при DEFAULT-секции Postgres не разрешает, поэтому отцепление ненадолго
+    берёт эксклюзивную блокировку родителя — с lock_timeout, как создание
+    секций. connection должен быть в autocommit: каждая пачка лент и каждое
+    отцепление — своя короткая транзакция. Возвращает строки отчёта по
+    каждой секции
+    """
+    report = []
+    await connection.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+    try:
+        for table in PARTITIONED_TABLES:
+            for partition in await list_partitions(connection, table):
+                if partition.upper is None or partition.upper > before:
+                    continue
+                try:
+                    if table == "posts":
+                        deleted = await _delete_timeline(connection, partition, batch_size)
+                        if deleted:
+                            report.append(f"{partition.name}: removed {deleted} timeline rows")
+                    await connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition.name}"))
+                    if drop:
+                        await connection.execute(text(f"DROP TABLE {partition.name}"))
+                except DBAPIError as e:
+                    # Чаще всего — более свежие комментарии к постам этой секции:
+                    # их внешний ключ не даёт отцепить посты. Или не дождались
+                    # блокировки — секция отцепится при следующем запуске
+                    report.append(f"{partition.name}: skipped, {e.orig}")
+                    continue
+                report.append(f"{partition.name}: {'dropped' if drop else 'detached'}")
+    finally:
+        await connection.execute(text("RESET lock_timeout"))
+    return report
+
+
+async def schedule_maintenance(db: AsyncSession, later: bool = False) -> None:
+    """
+    Ставит проверку секций на текущий интервал (later — на начало следующего).
+    Ключ идемпотентности — номер интервала: сколько бы процессов ни стартовало,
+    задача на интервал одна
+    """
+    interval = settings.PARTITIONS_MAINTENANCE_INTERVAL_SECONDS
+    bucket = int(time.time() // interval) + (1 if later else 0)
+    await enqueue(
+        db, MAINTAIN_JOB,
+        run_at=datetime.fromtimestamp(bucket * interval, timezone.utc) if later else None,
+        idempotency_key=f"{MAINTAIN_JOB}:{bucket}",
+    )
+
+
+async def start_maintenance() -> None:
+    """Вызывается при старте приложения; без интервала секции создаёт только команда"""
+    if not settings.PARTITIONS_MAINTENANCE_INTERVAL_SECONDS:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            await schedule_maintenance(db)
+            await db.commit()
+    except Exception:
+        # Приложение поднимается и без БД, задачу поставит следующий запуск
+        logger.warning("Partition maintenance scheduling failed", exc_info=True)
+
+
+@job(MAINTAIN_JOB)
+async def maintain_job(db: AsyncSession, payload: dict) -> None:
+    try:
+        created = await ensure_partitions(db, payload.get("months_ahead", settings.PARTITIONS_MONTHS_AHEAD))
+    except DefaultPartitionNotEmpty:
+        # Повторы не помогут, пока строки не перенесены; задача уйдёт в dead
+        logger.error("partition maintenance is blocked", exc_info=True)
+        raise
+    if created:
+        logger.info("created partitions %s", ", ".join(created))
+    # Следующая проверка ставится в той же транзакции: цепочка не рвётся,
+    # пока задача в итоге выполняется
+    await schedule_maintenance(db, later=True)
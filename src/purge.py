@@ -0,0 +1,203 @@
+from typing import Awaitable, Callable, List, Set
+
+from sqlalchemy import and_, case, delete, func, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from src.cache import cache, comment_key, post_key, user_key
+from src.counters import subtract_counts_cte
+from src.jobs import after_commit, enqueue, job
+from src.models.comments import Comment
+from src.models.posts import Post
+from src.models.suggestions import suggestions
+from src.models.timeline import timeline
+from src.models.users import follows, User
+from src.suggestions import mark_stale_cte
+
+
+users_table = User.__table__
+posts_table = Post.__table__
+comments_table = Comment.__table__
+
+PURGE_USER_JOB = "users.purge"
+
+# Шаг получает id пользователя, размер пачки и множество, куда добавляет
+# ключи кэша затронутых строк; возвращает число удалённых строк
+Step = Callable[[AsyncSession, int, int, Set[str]], Awaitable[int]]
+
+
+async def _delete(db: AsyncSession, deleted, *ctes) -> list:
+    """Выполняет удаление-CTE вместе с сопутствующими и возвращает его RETURNING"""
+    return (await db.execute(select(deleted).add_cte(*ctes))).all()
+
+
+async def purge_follows(db: AsyncSession, user_id: int, limit: int, keys: Set[str]) -> int:
+    """Подписки в обе стороны; счётчики второй стороны сдвигаются тем же оператором"""
+    batch = select(follows.c.follower_id, follows.c.followed_id).where(
+        (follows.c.follower_id == user_id) | (follows.c.followed_id == user_id)
+    ).limit(limit)
+    edges = delete(follows).where(
+        tuple_(follows.c.follower_id, follows.c.followed_id).in_(batch)
+    ).returning(follows.c.follower_id, follows.c.followed_id).cte("deleted_follows")
+
+    # Взаимная подписка даёт две строки на одного пользователя — сводим их
+    # в одну, иначе два UPDATE одной строки в одном операторе конфликтуют
+    sides = select(
+        case((edges.c.followed_id == user_id, edges.c.follower_id), else_=edges.c.followed_id).label("id"),
+        case((edges.c.followed_id == user_id, 1), else_=0).label("following"),
+        case((edges.c.follower_id == user_id, 1), else_=0).label("followers"),
+    ).subquery()
+    deltas = select(
+        sides.c.id,
+        func.sum(sides.c.following).label("following"),
+        func.sum(sides.c.followers).label("followers"),
+    ).group_by(sides.c.id).subquery()
+    bump_others = update(users_table).where(
+        users_table.c.id == deltas.c.id, users_table.c.id != user_id
+    ).values(
+        following_count=users_table.c.following_count - deltas.c.following,
+        follower_count=users_table.c.follower_count - deltas.c.followers,
+    ).cte("bump_others")
+    # У подписчиков пропало ребро графа — их рекомендации устарели
+    stale = mark_stale_cte(select(edges.c.follower_id).where(edges.c.follower_id != user_id))
+    rows = await _delete(db, edges, bump_others, stale)
+    keys.update(user_key(user) for row in rows for user in row)
+    return len(rows)
+
+
+async def purge_timeline(db: AsyncSession, user_id: int, limit: int, keys: Set[str]) -> int:
+    """Собственная лента пользователя"""
+    batch = select(timeline.c.user_id, timeline.c.post_id).where(timeline.c.user_id == user_id).limit(limit)
+    deleted = delete(timeline).where(
+        tuple_(timeline.c.user_id, timeline.c.post_id).in_(batch)
+    ).returning(timeline.c.post_id).cte("deleted_timeline")
+    return len(await _delete(db, deleted))
+
+
+async def purge_suggested(db: AsyncSession, user_id: int, limit: int, keys: Set[str]) -> int:
+    """Рекомендации пользователя другим"""
+    batch = select(suggestions.c.user_id, suggestions.c.suggested_id).where(
+        suggestions.c.suggested_id == user_id
+    ).limit(limit)
+    deleted = delete(suggestions).where(
+        tuple_(suggestions.c.user_id, suggestions.c.suggested_id).in_(batch)
+    ).returning(suggestions.c.user_id).cte("deleted_suggestions")
+    return len(await _delete(db, deleted))
+
+
+async def _purge_subtrees(db: AsyncSession, roots, keys: Set[str]) -> int:
+    """
+    Удаляет комментарии roots вместе со всеми ответами: поддерево — это
+    диапазон path от корня до path || '/' ('/' следует за '.' в collation C).
+    Поддерево целиком — иначе триггер comments_restrict_parent отклонит
+    удаление родителя. Счётчики авторов и постов сдвигаются тем же оператором
+    """
+    roots = roots.cte("roots")
+    deleted = delete(comments_table).where(
+        comments_table.c.post_id == roots.c.post_id,
+        comments_table.c.path >= roots.c.path,
+        comments_table.c.path < roots.c.path.concat("/"),
+    ).returning(
+        comments_table.c.id, comments_table.c.author_id, comments_table.c.post_id
+    ).cte("deleted_comments")
+    rows = await _delete(
+        db, deleted,
+        subtract_counts_cte(User, deleted.c.author_id, "comment_count", "bump_authors"),
+        subtract_counts_cte(Post, deleted.c.post_id, "comment_count", "bump_posts"),
+    )
+    for row in rows:
+        keys.update((comment_key(row.id), user_key(row.author_id), post_key(row.post_id)))
+    return len(rows)
+
+
+async def purge_comments(db: AsyncSession, user_id: int, limit: int, keys: Set[str]) -> int:
+    """Комментарии пользователя с ответами на них"""
+    return await _purge_subtrees(db, select(comments_table.c.post_id, comments_table.c.path).where(
+        comments_table.c.author_id == user_id
+    ).limit(limit), keys)
+
+
+async def purge_post_comments(db: AsyncSession, user_id: int, limit: int, keys: Set[str]) -> int:
+    """Чужие комментарии к постам пользователя — деревьями от корневых"""
+    own_posts = select(posts_table.c.id).where(posts_table.c.author_id == user_id)
+    return await _purge_subtrees(db, select(comments_table.c.post_id, comments_table.c.path).where(
+        comments_table.c.post_id.in_(own_posts), comments_table.c.parent_id.is_(None)
+    ).limit(limit), keys)
+
+
+async def purge_post_timeline(db: AsyncSession, user_id: int, limit: int, keys: Set[str]) -> int:
+    """Посты пользователя в лентах подписчиков"""
+    batch = select(timeline.c.user_id, timeline.c.post_id).join(
+        posts_table, and_(posts_table.c.id == timeline.c.post_id, posts_table.c.created_at == timeline.c.created_at)
+    ).where(posts_table.c.author_id == user_id).limit(limit)
+    deleted = delete(timeline).where(
+        tuple_(timeline.c.user_id, timeline.c.post_id).in_(batch)
+    ).returning(timeline.c.post_id).cte("deleted_post_timeline")
+    return len(await _delete(db, deleted))
+
+
+async def purge_posts(db: AsyncSession, user_id: int, limit: int, keys: Set[str]) -> int:
+    """Сами посты: комментарии и записи лент к этому шагу уже удалены"""
+    batch = select(posts_table.c.id, posts_table.c.created_at).where(posts_table.c.author_id == user_id).limit(limit)
+    deleted = delete(posts_table).where(
+        tuple_(posts_table.c.id, posts_table.c.created_at).in_(batch)
+    ).returning(posts_table.c.id).cte("deleted_posts")
+    rows = await _delete(db, deleted)
+    keys.update(post_key(row.id) for row in rows)
+    return len(rows)
+
+
+# Порядок важен: комментарии до постов, записи лент до постов — тогда
+# каскадам внешних ключей к моменту удаления поста уже нечего делать
+PURGE_STEPS: List[Step] = [
+    purge_follows,
+    purge_timeline,
+    purge_suggested,
+    purge_comments,
+    purge_post_comments,
+    purge_post_timeline,
+    purge_posts,
+]
+
+
+async def purge_user(db: AsyncSession, user_id: int, batch_size: int, keys: Set[str]) -> bool:
+    """
+    Один проход удаления: каждый шаг удаляет не больше batch_size строк.
+    Если все шаги закончились, удаляет самого пользователя и возвращает True;
+    иначе False — нужен следующий проход. В keys добавляются ключи кэша
+    удалённых и изменённых строк — сбросить их вызывающий должен после commit
+    """
+    keys.add(user_key(user_id))
+    for step in PURGE_STEPS:
+        if await step(db, user_id, batch_size, keys) >= batch_size:
+            return False
+
+    # Пользователь удаляется, только когда каскадам нечего делать: они не
+    # сдвигают счётчики, а комментарий с чужими ответами не даст удалить
+    # триггер comments_restrict_parent. Строки, появившиеся между шагами
+    # (например, ответ на комментарий посреди очистки), — повод для ещё
+    # одного прохода. Записи, закоммиченные уже во время этого оператора,
+    # удалит каскад без сдвига счётчиков — их поправит reconcile_counters
+    leftovers = or_(
+        select(comments_table.c.id).where(comments_table.c.author_id == user_id).exists(),
+        select(posts_table.c.id).where(posts_table.c.author_id == user_id).exists(),
+        select(follows.c.follower_id).where(
+            (follows.c.follower_id == user_id) | (follows.c.followed_id == user_id)
+        ).exists(),
+    )
+    deleted = await db.scalar(
+        delete(users_table).where(users_table.c.id == user_id, ~leftovers).returning(users_table.c.id)
+    )
+    if deleted is None:
+        # Пользователя уже нет (повтор задачи после удаления) — проход последний
+        return await db.scalar(select(users_table.c.id).where(users_table.c.id == user_id)) is None
+    return True
+
+
+@job(PURGE_USER_JOB)
+async def purge_user_job(db: AsyncSession, payload: dict) -> None:
+    # Один проход на задачу; следующий ставится в той же транзакции
+    keys: Set[str] = set()
+    if not await purge_user(db, payload["user_id"], settings.USERS_PURGE_BATCH_SIZE, keys):
+        await enqueue(db, PURGE_USER_JOB, payload)
+    after_commit(db, lambda: cache.invalidate(*keys))
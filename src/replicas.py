@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from settings import settings
+from src.cache import cache
+from src.database import AsyncSessionLocal, engine, make_engine, pool_stats
+
+
+logger = logging.getLogger(__name__)
+
+# Клиент, который недавно писал, читает с primary до указанного момента (unix time).
+# Браузеры возвращают cookie сами, остальные клиенты могут прислать заголовок
+PIN_COOKIE = "read_primary_until"
+PIN_HEADER = "X-Read-Primary-Until"
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Отставание реплики в секундах. Если всё полученное WAL уже применено,
+# реплика догнала primary, даже если на нём давно не было транзакций
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.engine = make_engine(url)
+        self.sessionmaker = async_sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            bind=self.engine,
+            class_=AsyncSession
+        )
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    async def check(self) -> None:
+        try:
+            async with self.engine.connect() as connection:
+                self.lag_seconds = float(await connection.scalar(LAG_QUERY))
+        except Exception as e:
+            if self.healthy:
+                logger.warning("Replica %s is unavailable: %r", self.engine.url.host, e)
+            self.healthy = False
+            self.last_error = repr(e)
+            return
+        self.healthy = self.lag_seconds <= settings.REPLICA_MAX_LAG_SECONDS
+        self.last_error = None
+
+    def stats(self) -> dict:
+        return {
+            "host": self.engine.url.host,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "last_error": self.last_error,
+            "pool": pool_stats(self.engine),
+        }
+
+
+replicas: List[Replica] = [Replica(url) for url in settings.REPLICA_URLS]
+_round_robin = itertools.count()
+
+
+async def check_replicas() -> None:
+    await asyncio.gather(*(replica.check() for replica in replicas))
+
+
+async def monitor_replicas() -> None:
+    """Фоновая проверка здоровья и отставания реплик"""
+    while True:
+        await asyncio.sleep(settings.REPLICA_HEALTH_INTERVAL_SECONDS)
+        await check_replicas()
+
+
+async def dispose_replicas() -> None:
+    for replica in replicas:
+        await replica.engine.dispose()
+
+
+def read_sessionmaker(pinned: bool = False) -> async_sessionmaker:
+    """Здоровая реплика по кругу; primary, если клиент закреплён или реплик нет"""
+    healthy = [replica for replica in replicas if replica.healthy]
+    if pinned or not healthy:
+        return AsyncSessionLocal
+    return healthy[next(_round_robin) % len(healthy)].sessionmaker
+
+
+def is_pinned(request: Request) -> bool:
+    value = request.cookies.get(PIN_COOKIE) or request.headers.get(PIN_HEADER)
+    try:
+        return value is not None and float(value) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_read_db(request: Request):
+    async with read_sessionmaker(is_pinned(request))() as db:
+        yield db
+
+
+async def cached_read(
+    request: Request, db: AsyncSession, key: str, load: Callable[[AsyncSession], Awaitable[Optional[Any]]]
+) -> Optional[Any]:
+    """
+    Одиночный объект через кэш. Кэш заполняется только с primary: промах,
+    прочитанный с отстающей реплики сразу после инвалидации, вернул бы в кэш
+    данные до записи. Закреплённый клиент читает с primary (db уже оттуда)
+    мимо кэша и не присоединяется к чужой загрузке
+    """
+    if is_pinned(request):
+        return await load(db)
+
+    async def from_primary():
+        if db.bind is engine:
+            return await load(db)
+        async with AsyncSessionLocal() as primary:
+            return await load(primary)
+
+    return await cache.get_or_load(key, from_primary)
+
+
+async def pin_primary_after_write(request: Request, call_next):
+    """После успешной записи закрепляет клиента за primary на READ_YOUR_WRITES_SECONDS"""
+    response = await call_next(request)
+    window = settings.READ_YOUR_WRITES_SECONDS
+    if replicas and window > 0 and request.method not in SAFE_METHODS and response.status_code < 400:
+        until = f"{time.time() + window:.3f}"
+        response.set_cookie(PIN_COOKIE, until, max_age=math.ceil(window), httponly=True, samesite="lax")
+        response.headers[PIN_HEADER] = until
+    return response
+
+
+def replica_stats() -> list:
+    return [replica.stats() for replica in replicas]
@@ -1,107 +1,250 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy import select, and_
+from fastapi import APIRouter, Body, HTTPException, Query, status, Depends, Request, Response
+from sqlalchemy import Integer, select, and_, delete, insert, literal, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import Any, List, Optional
+from datetime import datetime
 
 # Явно импортируем модели, чтобы SQLAlchemy знал о них
-from src.models.users import User as UserORM  # noqa
+from src.models.users import ACTIVE, User as UserORM, not_deleted  # noqa
 from src.models.posts import Post as PostORM  # noqa
 from src.models.comments import Comment as CommentORM  # noqa
 
 from src.schemas.comments import CommentCreate, CommentResponse, CommentUpdate
+from src.schemas.includes import CommentWithRelations
+from src.schemas.bulk import BulkResponse
 from src.database import get_db
+from src.replicas import cached_read, get_read_db
+from src.pagination import NEXT_CURSOR_HEADER, encode_id_cursor, keyset_paginate, set_next_cursor
+from src.threads import MAX_THREAD_PAGE, not_older_than_post, replies_query
+from src.counters import adjust_cte
+from src.db_errors import integrity_errors
+from src.bulk import bulk_create, import_ndjson, load_comments
+from src.export import export_response
+from src.cache import cache, comment_key, post_key, user_key
+from src.conditional import check_not_modified, set_validators
+from src.serialization import rows_response
+from src.events import POST_TOPIC, notified, notify_cte
+from src.includes import COMMENT_INCLUDES, embed_comments, parse_include
 
 router = APIRouter(
     prefix="/comments",
     tags=["comments"]
 )
 
+comments_table = CommentORM.__table__
+users_table = UserORM.__table__
+# Колонки, которые нужны CommentResponse — их и возвращаем из RETURNING
+comment_columns = [comments_table.c[name] for name in CommentResponse.model_fields]
+
 
 @router.post("/", response_model=CommentResponse, status_code=status.HTTP_201_CREATED)
 async def create_comment(comment_info: CommentCreate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserORM).filter(UserORM.id == comment_info.author_id))
-    user = result.scalar_one_or_none()
-    if not user:
-        raise HTTPException(status_code=404, detail="Author not found")
-
-    result = await db.execute(select(PostORM).filter(PostORM.id == comment_info.post_id))
-    post = result.scalar_one_or_none()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    new_comment = CommentORM(
-        content=comment_info.content,
-        author_id=comment_info.author_id,
-        post_id=comment_info.post_id
+    # Один оператор: вставка, счётчики автора и поста и NOTIFY подписчикам
+    # поста в CTE. Автора, помеченного на удаление, отсекает условие вставки,
+    # несуществующие автор и пост ловим по нарушению внешних ключей
+    author = select(
+        literal(comment_info.content), users_table.c.id,
+        literal(comment_info.post_id, Integer), literal(comment_info.parent_id, Integer),
+    ).where(users_table.c.id == comment_info.author_id, ACTIVE)
+    new_comment = insert(comments_table).from_select(
+        ["content", "author_id", "post_id", "parent_id"], author
+    ).returning(*comment_columns).cte("new_comment")
+    notify = notify_cte(
+        new_comment, POST_TOPIC, new_comment.c.post_id, "comment.created",
+        id=new_comment.c.id, post_id=new_comment.c.post_id,
+        author_id=new_comment.c.author_id, parent_id=new_comment.c.parent_id,
+    )
+    statement = select(new_comment, notified(notify).label("notified")).add_cte(
+        adjust_cte(UserORM, new_comment.c.author_id, "bump_author", comment_count=1),
+        adjust_cte(PostORM, new_comment.c.post_id, "bump_post", comment_count=1),
     )
-    db.add(new_comment)
-    await db.commit()
-    await db.refresh(new_comment)
 
-    return new_comment
+    async with integrity_errors(db, {
+        "comments_author_id_fkey": (404, "Author not found"),
+        "comments_post_id_fkey": (404, "Post not found"),
+        "comments_parent_id_fkey": (404, "Parent comment not found"),
+        "comments_parent_same_post": (400, "Parent comment belongs to another post"),
+    }):
+        result = await db.execute(statement)
+        comment = result.first()
+        if comment is None:
+            raise HTTPException(status_code=404, detail="Author not found")
+        await db.commit()
+
+    await cache.invalidate(user_key(comment_info.author_id), post_key(comment_info.post_id))
+    return comment
 
 
-@router.get("/{comment_id}", response_model=CommentResponse)
-async def get_comment(comment_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(CommentORM).options(
-            selectinload(CommentORM.author),
-            selectinload(CommentORM.post)
-        ).filter(CommentORM.id == comment_id)
-    )
-    comment = result.scalar_one_or_none()
+@router.post("/bulk", response_model=BulkResponse)
+async def create_comments_bulk(items: List[Any] = Body(...), db: AsyncSession = Depends(get_db)):
+    return await bulk_create(db, items, CommentCreate, load_comments)
+
+
+@router.post("/import", response_model=BulkResponse)
+async def import_comments(request: Request, db: AsyncSession = Depends(get_db)):
+    return await import_ndjson(db, request, CommentCreate, load_comments)
+
+
+@router.get("/export")
+async def export_comments(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    post_id: Optional[int] = None,
+    author_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    query = select(
+        CommentORM.id, CommentORM.content, CommentORM.author_id,
+        CommentORM.post_id, CommentORM.parent_id, CommentORM.created_at
+    ).order_by(CommentORM.id)
+
+    filters = [not_deleted(CommentORM.author_id)]
+    if post_id:
+        filters += [CommentORM.post_id == post_id, not_older_than_post(post_id)]
+    if author_id:
+        filters.append(CommentORM.author_id == author_id)
+    if start_date:
+        filters.append(CommentORM.created_at >= start_date)
+    if end_date:
+        filters.append(CommentORM.created_at <= end_date)
+
+    query = query.filter(and_(*filters))
+
+    return export_response(query, fmt, "comments")
+
+
+@router.get("/{comment_id}", response_model=CommentWithRelations, response_model_exclude_unset=True)
+async def get_comment(
+    comment_id: int,
+    request: Request,
+    response: Response,
+    include: Optional[str] = Query(None, description="author,post"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    included = parse_include(include, COMMENT_INCLUDES)
+    if not included:
+        not_modified = await check_not_modified(
+            request, db, select(CommentORM.id, CommentORM.updated_at).filter(
+                CommentORM.id == comment_id, not_deleted(CommentORM.author_id)
+            )
+        )
+        if not_modified:
+            return not_modified
+
+    async def load(session: AsyncSession):
+        result = await session.execute(
+            select(*comment_columns).where(comments_table.c.id == comment_id, not_deleted(comments_table.c.author_id))
+        )
+        comment = result.first()
+        return CommentResponse.model_validate(comment).model_dump(mode="json") if comment else None
+
+    comment = await cached_read(request, db, comment_key(comment_id), load)
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
+    if included:
+        [comment] = await embed_comments(db, [dict(comment)], included)
+    else:
+        set_validators(response, [(comment["id"], comment["updated_at"])])
     return comment
 
 
-@router.get("/", response_model=List[CommentResponse])
+@router.get("/{comment_id}/replies", response_model=List[CommentResponse])
+async def get_replies(
+    comment_id: int,
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_THREAD_PAGE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    result = await db.execute(replies_query(comment_id, cursor, limit))
+    replies = result.all()
+    if not replies and not await db.scalar(
+        select(CommentORM.id).filter(CommentORM.id == comment_id, not_deleted(CommentORM.author_id))
+    ):
+        raise HTTPException(status_code=404, detail="Comment not found")
+
+    if len(replies) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_id_cursor(replies[-1].id)
+    return rows_response(CommentResponse, replies, response)
+
+
+@router.get("/", response_model=List[CommentWithRelations], response_model_exclude_unset=True)
 async def get_comments(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
     post_id: Optional[int] = None,
     author_id: Optional[int] = None,
-    db: AsyncSession = Depends(get_db)
+    include: Optional[str] = Query(None, description="author,post"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = select(CommentORM).offset(skip).limit(limit)
+    included = parse_include(include, COMMENT_INCLUDES)
+    query = keyset_paginate(select(*comment_columns), CommentORM, cursor, skip, limit)
 
-    filters = []
+    # Комментарии пользователей, помеченных на удаление, скрыты до конца очистки
+    filters = [not_deleted(CommentORM.author_id)]
     if post_id:
-        filters.append(CommentORM.post_id == post_id)
+        filters += [CommentORM.post_id == post_id, not_older_than_post(post_id)]
     if author_id:
         filters.append(CommentORM.author_id == author_id)
 
-    if filters:
-        query = query.filter(and_(*filters))
+    query = query.filter(and_(*filters))
+
+    if not included:
+        not_modified = await check_not_modified(
+            request, db, query.with_only_columns(CommentORM.id, CommentORM.updated_at, CommentORM.created_at), limit
+        )
+        if not_modified:
+            return not_modified
 
     result = await db.execute(query)
-    comments = result.scalars().all()
-    return comments
+    comments = result.all()
+    set_next_cursor(response, comments, limit)
+    if included:
+        return await embed_comments(db, [comment._asdict() for comment in comments], included)
+    set_validators(response, [(comment.id, comment.updated_at) for comment in comments])
+    return rows_response(CommentResponse, comments, response)
 
 
 @router.put("/{comment_id}", response_model=CommentResponse)
 async def update_comment(comment_id: int, comment_update: CommentUpdate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(CommentORM).filter(CommentORM.id == comment_id))
-    comment = result.scalar_one_or_none()
+    visible = (comments_table.c.id == comment_id, not_deleted(comments_table.c.author_id))
+    if comment_update.content:
+        statement = update(comments_table).where(*visible).values(
+            content=comment_update.content
+        ).returning(*comment_columns)
+    else:
+        statement = select(*comment_columns).where(*visible)
+
+    result = await db.execute(statement)
+    comment = result.first()
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
 
-    if comment_update.content:
-        comment.content = comment_update.content
-
     await db.commit()
-    await db.refresh(comment)
+    await cache.invalidate(comment_key(comment_id))
     return comment
 
 
 @router.delete("/{comment_id}")
 async def delete_comment(comment_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(CommentORM).filter(CommentORM.id == comment_id))
-    comment = result.scalar_one_or_none()
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
+    deleted = delete(comments_table).where(comments_table.c.id == comment_id).returning(
+        comments_table.c.author_id, comments_table.c.post_id
+    ).cte("deleted_comment")
+    statement = select(deleted.c.author_id, deleted.c.post_id).add_cte(
+        adjust_cte(UserORM, deleted.c.author_id, "bump_author", comment_count=-1),
+        adjust_cte(PostORM, deleted.c.post_id, "bump_post", comment_count=-1),
+    )
 
-    await db.delete(comment)
-    await db.commit()
+    async with integrity_errors(db, {"comments_parent_id_fkey": (400, "Comment has replies")}):
+        result = await db.execute(statement)
+        comment = result.first()
+        if not comment:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        author_id, post_id = comment
+        await db.commit()
+
+    await cache.invalidate(comment_key(comment_id), user_key(author_id), post_key(post_id))
     return {"detail": "Comment deleted"}
\ No newline at end of file
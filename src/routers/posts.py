@@ -1,108 +1,334 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy import select, and_
+from fastapi import APIRouter, Body, HTTPException, Query, status, Depends, Request, Response
+from sqlalchemy import select, and_, delete, func, insert, literal, null, tuple_, union_all, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import Any, List, Optional
 from datetime import datetime
 
 # Явно импортируем модели, чтобы SQLAlchemy знал о них
-from src.models.users import User as UserORM  # noqa
-from src.models.posts import Post as PostORM  # noqa
+from src.models.users import ACTIVE, User as UserORM, not_deleted  # noqa
+from src.models.posts import Post as PostORM, SEARCH_CONFIG  # noqa
 from src.models.comments import Comment  # noqa
 
-from src.schemas.posts import PostCreate, PostResponse, PostUpdate
+from src.schemas.posts import PostCreate, PostResponse, PostSearchResult, PostUpdate
+from src.schemas.comments import CommentResponse
+from src.schemas.includes import PostWithRelations
+from src.schemas.bulk import BulkResponse
 from src.database import get_db
+from src.replicas import cached_read, get_read_db, is_pinned, read_sessionmaker
+from src.pagination import (
+    NEXT_CURSOR_HEADER, decode_rank_cursor, encode_path_cursor, encode_rank_cursor, keyset_paginate, set_next_cursor
+)
+from src.threads import MAX_THREAD_PAGE, not_older_than_post, tree_query
+from src.feed import fan_out_cte
+from src.counters import adjust_cte
+from src.db_errors import integrity_errors
+from src.bulk import bulk_create, import_ndjson, load_posts
+from src.export import export_response
+from src.cache import cache, comment_key, post_key, user_key
+from src.conditional import check_not_modified, set_validators
+from src.serialization import rows_response
+from src.events import USER_TOPIC, event_response, notified, notify_cte, post_topic
+from src.includes import POST_INCLUDES, embed_posts, parse_include
 
 router = APIRouter(
     prefix="/posts",
     tags=["posts"]
 )
 
+posts_table = PostORM.__table__
+comments_table = Comment.__table__
+users_table = UserORM.__table__
+# Колонки, которые нужны PostResponse — их и возвращаем из RETURNING
+post_columns = [posts_table.c[name] for name in PostResponse.model_fields]
+
+
+def post_filters(author_id: Optional[int], start_date: Optional[datetime], end_date: Optional[datetime]):
+    # Посты пользователей, помеченных на удаление, скрыты до конца очистки
+    filters = [not_deleted(PostORM.author_id)]
+    if author_id:
+        filters.append(PostORM.author_id == author_id)
+    if start_date:
+        filters.append(PostORM.created_at >= start_date)
+    if end_date:
+        filters.append(PostORM.created_at <= end_date)
+    return filters
+
 
 @router.post("/", response_model=PostResponse, status_code=status.HTTP_201_CREATED)
 async def create_post(post_info: PostCreate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserORM).filter(UserORM.id == post_info.author_id))
-    user = result.scalar_one_or_none()
-    if not user:
-        raise HTTPException(status_code=404, detail="Author not found")
-
-    new_post = PostORM(
-        title=post_info.title,
-        content=post_info.content,
-        author_id=post_info.author_id
+    # Один оператор: вставка, счётчик автора, рассылка по лентам и NOTIFY в CTE.
+    # Строка вставляется, только если автор есть и не помечен на удаление;
+    # внешний ключ страхует от удаления автора в этот же момент. Питоновские
+    # default у вставки внутри CTE не вычисляются, поэтому счётчик задан явно
+    author = select(
+        literal(post_info.title), literal(post_info.content), users_table.c.id, literal(0),
+    ).where(users_table.c.id == post_info.author_id, ACTIVE)
+    new_post = insert(posts_table).from_select(
+        ["title", "content", "author_id", "comment_count"], author
+    ).returning(*post_columns).cte("new_post")
+    notify = notify_cte(
+        new_post, USER_TOPIC, new_post.c.author_id, "post.created",
+        id=new_post.c.id, author_id=new_post.c.author_id,
     )
-    db.add(new_post)
-    await db.commit()
-    await db.refresh(new_post)
+    statement = select(new_post, notified(notify).label("notified")).add_cte(
+        adjust_cte(UserORM, new_post.c.author_id, "bump_author", post_count=1),
+        fan_out_cte(new_post),
+    )
+
+    async with integrity_errors(db, {"posts_author_id_fkey": (404, "Author not found")}):
+        result = await db.execute(statement)
+        post = result.first()
+        if post is None:
+            raise HTTPException(status_code=404, detail="Author not found")
+        await db.commit()
+
+    await cache.invalidate(user_key(post_info.author_id))
+    return post
+
+
+@router.post("/bulk", response_model=BulkResponse)
+async def create_posts_bulk(items: List[Any] = Body(...), db: AsyncSession = Depends(get_db)):
+    return await bulk_create(db, items, PostCreate, load_posts)
+
+
+@router.post("/import", response_model=BulkResponse)
+async def import_posts(request: Request, db: AsyncSession = Depends(get_db)):
+    return await import_ndjson(db, request, PostCreate, load_posts)
+
+
+@router.get("/export")
+async def export_posts(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    author_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    query = select(
+        PostORM.id, PostORM.title, PostORM.content, PostORM.author_id,
+        PostORM.created_at, PostORM.comment_count
+    ).order_by(PostORM.id)
+
+    query = query.filter(and_(*post_filters(author_id, start_date, end_date)))
+
+    return export_response(query, fmt, "posts")
+
+
+@router.get("/search", response_model=List[PostSearchResult])
+async def search_posts(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    highlight: bool = True,
+    author_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank(PostORM.search_vector, ts_query)
 
-    return new_post
+    # Сначала отбираем страницу id по GIN-индексу, потом догружаем строки
+    page = select(PostORM.id, rank.label("rank")).filter(
+        PostORM.search_vector.bool_op("@@")(ts_query),
+        *post_filters(author_id, start_date, end_date),
+    )
+    if cursor:
+        page = page.filter(tuple_(rank, PostORM.id) < decode_rank_cursor(cursor))
+    page = page.order_by(rank.desc(), PostORM.id.desc()).limit(limit).subquery()
 
+    headline = null()
+    if highlight:
+        # ts_headline дорогой, поэтому считается только для строк страницы
+        headline = func.ts_headline(
+            SEARCH_CONFIG, PostORM.content, ts_query,
+            "StartSel=<b>, StopSel=</b>, MaxFragments=2"
+        )
 
-@router.get("/{post_id}", response_model=PostResponse)
-async def get_post(post_id: int, db: AsyncSession = Depends(get_db)):
     result = await db.execute(
-        select(PostORM).options(
-            selectinload(PostORM.author),
-            selectinload(PostORM.comments)
-        ).filter(PostORM.id == post_id)
+        select(*post_columns, page.c.rank, headline.label("headline"))
+        .join(page, posts_table.c.id == page.c.id)
+        .order_by(page.c.rank.desc(), posts_table.c.id.desc())
     )
-    post = result.scalar_one_or_none()
+    rows = result.all()
+
+    if rows and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_rank_cursor(rows[-1].rank, rows[-1].id)
+    return rows_response(PostSearchResult, rows, response)
+
+
+@router.get("/{post_id}", response_model=PostWithRelations, response_model_exclude_unset=True)
+async def get_post(
+    post_id: int,
+    request: Request,
+    response: Response,
+    include: Optional[str] = Query(None, description="author,comments"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    included = parse_include(include, POST_INCLUDES)
+    # Со связанными объектами тело зависит не только от версии поста —
+    # условные запросы обслуживаем только без include
+    if not included:
+        not_modified = await check_not_modified(
+            request, db, select(PostORM.id, PostORM.updated_at).filter(PostORM.id == post_id, not_deleted(PostORM.author_id))
+        )
+        if not_modified:
+            return not_modified
+
+    async def load(session: AsyncSession):
+        result = await session.execute(
+            select(*post_columns).where(posts_table.c.id == post_id, not_deleted(posts_table.c.author_id))
+        )
+        post = result.first()
+        return PostResponse.model_validate(post).model_dump(mode="json") if post else None
+
+    post = await cached_read(request, db, post_key(post_id), load)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
+    if included:
+        # Копия: словарь из кэша общий для всех запросов
+        [post] = await embed_posts(db, [dict(post)], included)
+    else:
+        set_validators(response, [(post["id"], post["updated_at"])])
     return post
 
 
-@router.get("/", response_model=List[PostResponse])
+@router.get("/{post_id}/comments/tree", response_model=List[CommentResponse])
+async def get_comment_tree(
+    post_id: int,
+    response: Response,
+    max_depth: int = Query(5, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_THREAD_PAGE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Комментарии поста плоским списком в порядке дерева: у каждого есть
+    parent_id и depth, вложенность клиент восстанавливает сам
+    """
+    result = await db.execute(tree_query(post_id, max_depth, cursor, limit))
+    comments = result.all()
+    if not comments and not await db.scalar(select(PostORM.id).filter(PostORM.id == post_id)):
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    if len(comments) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_path_cursor(comments[-1].path, comments[-1].id)
+    return rows_response(CommentResponse, comments, response)
+
+
+@router.get("/{post_id}/events")
+async def post_events(post_id: int, request: Request):
+    """
+    Server-Sent Events поста: comment.created с id нового комментария —
+    вместо периодического опроса GET /comments/?post_id=
+    """
+    # Сессия только на проверку: поток держит соединение клиента, но не базы
+    async with read_sessionmaker(is_pinned(request))() as db:
+        found = await db.scalar(select(PostORM.id).filter(PostORM.id == post_id))
+    if not found:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return event_response(request, post_topic(post_id))
+
+
+@router.get("/", response_model=List[PostWithRelations], response_model_exclude_unset=True)
 async def get_posts(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
     author_id: Optional[int] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: AsyncSession = Depends(get_db)
+    include: Optional[str] = Query(None, description="author,comments"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = select(PostORM).offset(skip).limit(limit)
+    included = parse_include(include, POST_INCLUDES)
+    query = keyset_paginate(select(*post_columns), PostORM, cursor, skip, limit)
 
-    filters = []
-    if author_id:
-        filters.append(PostORM.author_id == author_id)
-    if start_date:
-        filters.append(PostORM.created_at >= start_date)
-    if end_date:
-        filters.append(PostORM.created_at <= end_date)
+    query = query.filter(and_(*post_filters(author_id, start_date, end_date)))
 
-    if filters:
-        query = query.filter(and_(*filters))
+    if not included:
+        not_modified = await check_not_modified(
+            request, db, query.with_only_columns(PostORM.id, PostORM.updated_at, PostORM.created_at), limit
+        )
+        if not_modified:
+            return not_modified
 
     result = await db.execute(query)
-    posts = result.scalars().all()
-    return posts
+    posts = result.all()
+    set_next_cursor(response, posts, limit)
+    if included:
+        return await embed_posts(db, [post._asdict() for post in posts], included)
+    set_validators(response, [(post.id, post.updated_at) for post in posts])
+    return rows_response(PostResponse, posts, response)
 
 
 @router.put("/{post_id}", response_model=PostResponse)
 async def update_post(post_id: int, post_update: PostUpdate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(PostORM).filter(PostORM.id == post_id))
-    post = result.scalar_one_or_none()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
+    values = {}
     if post_update.title:
-        post.title = post_update.title
+        values["title"] = post_update.title
     if post_update.content:
-        post.content = post_update.content
+        values["content"] = post_update.content
+
+    # Посты автора, удаляемого в фоне, уже не видны и правке не подлежат
+    visible = (posts_table.c.id == post_id, not_deleted(posts_table.c.author_id))
+    if values:
+        statement = update(posts_table).where(*visible).values(**values).returning(*post_columns)
+    else:
+        statement = select(*post_columns).where(*visible)
+
+    result = await db.execute(statement)
+    post = result.first()
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
 
     await db.commit()
-    await db.refresh(post)
+    await cache.invalidate(post_key(post_id))
     return post
 
 
 @router.delete("/{post_id}")
 async def delete_post(post_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(PostORM).filter(PostORM.id == post_id))
-    post = result.scalar_one_or_none()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    # Комментарии поста удаляет каскад внешнего ключа; счётчики их авторов и
+    # автора поста сдвигаются тем же оператором. Автор может комментировать
+    # свой пост, поэтому сдвиги сводятся в одну строку на пользователя.
+    # Каскад ничего не возвращает, поэтому id его комментариев (для сброса
+    # кэша) берутся из того же снимка, что и сдвиги счётчиков
+    deleted = delete(posts_table).where(posts_table.c.id == post_id).returning(posts_table.c.author_id).cte("deleted_post")
+    post_comments = select(comments_table.c.id, comments_table.c.author_id).where(
+        comments_table.c.post_id == post_id, not_older_than_post(post_id), select(deleted).exists()
+    ).cte("post_comments")
+    changes = union_all(
+        select(deleted.c.author_id.label("id"), literal(1).label("posts"), literal(0).label("comments")),
+        select(post_comments.c.author_id, literal(0), literal(1)),
+    ).subquery()
+    deltas = select(
+        changes.c.id,
+        func.sum(changes.c.posts).label("posts"),
+        func.sum(changes.c.comments).label("comments"),
+    ).group_by(changes.c.id).subquery()
+    bump_users = update(users_table).where(users_table.c.id == deltas.c.id).values(
+        post_count=users_table.c.post_count - deltas.c.posts,
+        comment_count=users_table.c.comment_count - deltas.c.comments,
+    ).returning(users_table.c.id).cte("bump_users")
+    statement = select(
+        deleted.c.author_id,
+        select(func.array_agg(bump_users.c.id)).scalar_subquery(),
+        select(func.array_agg(post_comments.c.id)).scalar_subquery(),
+    )
 
-    await db.delete(post)
+    result = await db.execute(statement)
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Post not found")
     await db.commit()
+
+    author_id, user_ids, comment_ids = row
+    await cache.invalidate(
+        post_key(post_id),
+        *(user_key(user_id) for user_id in user_ids or [author_id]),
+        *(comment_key(comment_id) for comment_id in comment_ids or []),
+    )
     return {"detail": "Post deleted"}
\ No newline at end of file
@@ -1,15 +1,35 @@
-from typing import List
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from src.schemas.users import UserCreate, UserResponse, UserUpdate
+from typing import Any, List, Optional
+from fastapi import APIRouter, Body, HTTPException, Query, status, Depends, Request, Response
+from sqlalchemy import and_, func, insert, select, update
+from settings import settings
+from src.schemas.users import (
+    FollowBulkResponse, FollowCreate, UserCreate, UserLogin, UserResponse, UserSuggestion, UserUpdate
+)
+from src.schemas.bulk import BulkResponse
+from src.schemas.posts import PostResponse
 
-from src.models.users import follows, User as UserORM  # noqa
+from src.models.users import ACTIVE, follows, User as UserORM  # noqa
 from src.models.posts import Post  # noqa
 from src.models.comments import Comment  # noqa
+from src.models.suggestions import suggestions
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database import get_db
+from src.replicas import cached_read, get_read_db, is_pinned, read_sessionmaker
+from src.pagination import (
+    NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, decode_id_cursor, encode_id_cursor, keyset_paginate, set_next_cursor
+)
+from src.feed import feed_query
+from src.follows import follow_many, unfollow
+from src.jobs import enqueue
+from src.purge import PURGE_USER_JOB, purge_user
+from src.db_errors import integrity_errors
+from src.security import password_hasher
+from src.bulk import bulk_create, import_ndjson, load_follows
+from src.cache import cache, user_key
+from src.conditional import check_not_modified, set_validators
+from src.serialization import rows_response
+from src.events import event_response, user_topic
 
 
 router = APIRouter(
@@ -17,148 +37,359 @@ router = APIRouter(
     tags=["users"]
 )
 
-@router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register_user(user_info: UserCreate, db: AsyncSession = Depends(get_db)):
-    result_username = await db.execute(
-        select(UserORM).where(UserORM.username == user_info.username)
-    )
-    existing_user = result_username.scalar_one_or_none()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
+users_table = UserORM.__table__
+# Колонки, которые нужны UserResponse — их и возвращаем из RETURNING
+user_columns = [users_table.c[name] for name in UserResponse.model_fields]
+post_columns = [Post.__table__.c[name] for name in PostResponse.model_fields]
 
-    result_email = await db.execute(
-        select(UserORM).where(UserORM.email == user_info.email)
-    )
-    existing_email = result_email.scalar_one_or_none()
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email already registered")
+# Наибольшая страница подписчиков и подписок
+MAX_FOLLOW_PAGE = 1000
 
-    hashed_password = user_info.password
+# Уникальность проверяет сама БД, без предварительных SELECT
+UNIQUE_ERRORS = {
+    "ix_users_username": (400, "Username already registered"),
+    "ix_users_email": (400, "Email already registered"),
+}
 
-    new_user = UserORM(
+@router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register_user(user_info: UserCreate, db: AsyncSession = Depends(get_db)):
+    hashed_password = await password_hasher.hash(user_info.password)
+
+    statement = insert(users_table).values(
         username=user_info.username,
         email=user_info.email,
         hashed_password=hashed_password
-    )
-    db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)
+    ).returning(*user_columns)
+
+    async with integrity_errors(db, UNIQUE_ERRORS):
+        result = await db.execute(statement)
+        new_user = result.one()
+        await db.commit()
 
     return new_user
 
-@router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
+@router.post("/login", response_model=UserResponse)
+async def login_user(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(
-        select(UserORM).options(
-            selectinload(UserORM.posts),
-            selectinload(UserORM.comments),
-            selectinload(UserORM.following),
-            selectinload(UserORM.followers)
-        ).filter(UserORM.id == user_id)
+        select(*user_columns, users_table.c.hashed_password).where(users_table.c.username == credentials.username, ACTIVE)
     )
-    user = result.scalar_one_or_none()
+    user = result.first()
+    if not user:
+        # Тратим столько же времени, сколько на проверку, чтобы не выдавать,
+        # существует ли такой пользователь
+        await password_hasher.hash(credentials.password)
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+
+    valid, new_hash = await password_hasher.verify_and_update(credentials.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+
+    if new_hash:
+        # Стоимость bcrypt изменилась или пароль хранился открытым текстом.
+        # updated_at не трогаем: в ответах пароль не виден
+        await db.execute(
+            update(users_table)
+            .where(users_table.c.id == user.id)
+            .values(hashed_password=new_hash, updated_at=users_table.c.updated_at)
+        )
+        await db.commit()
+
+    return user
+
+@router.post("/follows/bulk", response_model=BulkResponse)
+async def create_follows_bulk(items: List[Any] = Body(...), db: AsyncSession = Depends(get_db)):
+    return await bulk_create(db, items, FollowCreate, load_follows)
+
+
+@router.post("/follows/import", response_model=BulkResponse)
+async def import_follows(request: Request, db: AsyncSession = Depends(get_db)):
+    return await import_ndjson(db, request, FollowCreate, load_follows)
+
+
+@router.get("/{user_id}", response_model=UserResponse)
+async def get_user(user_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
+    not_modified = await check_not_modified(
+        request, db, select(UserORM.id, UserORM.updated_at).filter(UserORM.id == user_id, ACTIVE)
+    )
+    if not_modified:
+        return not_modified
+
+    async def load(session: AsyncSession):
+        result = await session.execute(select(UserORM).filter(UserORM.id == user_id, ACTIVE))
+        user = result.scalar_one_or_none()
+        return UserResponse.model_validate(user).model_dump(mode="json") if user else None
+
+    user = await cached_read(request, db, user_key(user_id), load)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    set_validators(response, [(user["id"], user["updated_at"])])
     return user
 
 @router.get("/", response_model=List[UserResponse])
-async def get_users(skip: int = 0, limit: int = 10, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserORM).offset(skip).limit(limit))
-    users = result.scalars().all()
-    return users
+async def get_users(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    query = keyset_paginate(select(*user_columns).where(ACTIVE), UserORM, cursor, skip, limit)
+
+    not_modified = await check_not_modified(
+        request, db, query.with_only_columns(UserORM.id, UserORM.updated_at, UserORM.created_at), limit
+    )
+    if not_modified:
+        return not_modified
+
+    result = await db.execute(query)
+    users = result.all()
+    set_next_cursor(response, users, limit)
+    set_validators(response, [(user.id, user.updated_at) for user in users])
+    return rows_response(UserResponse, users, response)
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(user_id: int, user_update: UserUpdate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserORM).filter(UserORM.id == user_id))
-    user = result.scalar_one_or_none()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+    values = {}
     if user_update.username:
-        user.username = user_update.username
+        values["username"] = user_update.username
     if user_update.email:
-        user.email = user_update.email
+        values["email"] = user_update.email
     if user_update.password:
-        user.hashed_password = user_update.password
+        values["hashed_password"] = await password_hasher.hash(user_update.password)
 
-    await db.commit()
-    await db.refresh(user)
+    if values:
+        statement = update(users_table).where(users_table.c.id == user_id, ACTIVE).values(**values).returning(*user_columns)
+    else:
+        statement = select(*user_columns).where(users_table.c.id == user_id, ACTIVE)
+
+    async with integrity_errors(db, UNIQUE_ERRORS):
+        result = await db.execute(statement)
+        user = result.first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        await db.commit()
+
+    await cache.invalidate(user_key(user_id))
     return user
 
 @router.delete("/{user_id}")
-async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserORM).filter(UserORM.id == user_id))
-    user = result.scalar_one_or_none()
-    if not user:
+async def delete_user(user_id: int, response: Response, db: AsyncSession = Depends(get_db)):
+    # Сначала пометка: пользователь сразу пропадает из API. Затем один проход
+    # очистки пачками (src.purge) — небольшой аккаунт удаляется целиком здесь
+    # же, а большой дочищает фоновая задача, и запрос не растёт с его размером
+    marked = await db.scalar(
+        update(users_table)
+        .where(users_table.c.id == user_id, ACTIVE)
+        .values(deleted_at=func.now())
+        .returning(users_table.c.id)
+    )
+    if marked is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    await db.delete(user)
+    purged_keys = set()
+    if await purge_user(db, user_id, settings.USERS_PURGE_BATCH_SIZE, purged_keys):
+        detail = "User deleted"
+    else:
+        await enqueue(db, PURGE_USER_JOB, {"user_id": user_id})
+        response.status_code = status.HTTP_202_ACCEPTED
+        detail = "User deletion scheduled"
     await db.commit()
-    return {"detail": "User deleted"}
+
+    await cache.invalidate(*purged_keys)
+    return {"detail": detail}
 
 @router.post("/{user_id}/follow")
 async def follow_user(user_id: int, current_user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserORM).filter(UserORM.id == user_id))
-    target_user = result.scalar_one_or_none()
-    if not target_user:
+    # Повторная подписка не ошибка: ON CONFLICT DO NOTHING делает её идемпотентной
+    created, _, missing = await follow_many(db, current_user_id, [user_id])
+    if missing:
         raise HTTPException(status_code=404, detail="User not found")
+    await db.commit()
+
+    if not created:
+        return {"detail": "Already following"}
+    await cache.invalidate(user_key(current_user_id), user_key(user_id))
+    return {"detail": "Successfully followed"}
 
-    result = await db.execute(
-        select(UserORM).options(selectinload(UserORM.following)).filter(UserORM.id == current_user_id)
-    )
-    current_user = result.scalar_one_or_none()
-    if not current_user:
-        raise HTTPException(status_code=404, detail="Current user not found")
 
-    if target_user in current_user.following:
-        raise HTTPException(status_code=400, detail="Already following")
+@router.post("/{user_id}/follow/bulk", response_model=FollowBulkResponse)
+async def follow_users_bulk(user_id: int, followed_ids: List[int] = Body(...), db: AsyncSession = Depends(get_db)):
+    """Подписка на список пользователей (импорт контактов) одним оператором"""
+    if len(followed_ids) > settings.BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Too many rows, max {settings.BULK_MAX_ROWS}")
 
-    current_user.following.append(target_user)
+    created, already_following, missing = await follow_many(db, user_id, followed_ids)
     await db.commit()
-    return {"detail": "Successfully followed"}
+
+    if created:
+        await cache.invalidate(user_key(user_id), *(user_key(followed_id) for followed_id in created))
+    return FollowBulkResponse(followed=created, already_following=already_following, missing=missing)
 
 
 @router.delete("/{user_id}/unfollow")
 async def unfollow_user(user_id: int, current_user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(UserORM).filter(UserORM.id == user_id))
-    target_user = result.scalar_one_or_none()
-    if not target_user:
+    removed = await unfollow(db, current_user_id, user_id)
+    await db.commit()
+
+    if not removed:
+        return {"detail": "Not following"}
+    await cache.invalidate(user_key(current_user_id), user_key(user_id))
+    return {"detail": "Successfully unfollowed"}
+
+
+async def follow_page(
+    db: AsyncSession,
+    response: Response,
+    user_id: int,
+    own_side,
+    other_side,
+    counter,
+    cursor: Optional[str],
+    limit: int,
+    with_total: bool,
+):
+    """
+    Страница пользователей с другой стороны подписки по порядку их id.
+    Читается только страница по индексу (own_side, other_side); общее
+    число берётся из денормализованного счётчика, а не из COUNT(*)
+    """
+    total = await db.scalar(select(counter).where(users_table.c.id == user_id, ACTIVE))
+    if total is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    result = await db.execute(
-        select(UserORM).options(selectinload(UserORM.following)).filter(UserORM.id == current_user_id)
+    query = (
+        select(*user_columns)
+        .join(follows, other_side == users_table.c.id)
+        .where(own_side == user_id, ACTIVE)
+        .order_by(other_side)
+        .limit(limit)
     )
-    current_user = result.scalar_one_or_none()
-    if not current_user:
-        raise HTTPException(status_code=404, detail="Current user not found")
+    if cursor:
+        query = query.where(other_side > decode_id_cursor(cursor))
 
-    if target_user not in current_user.following:
-        raise HTTPException(status_code=400, detail="Not following")
-
-    current_user.following.remove(target_user)
-    await db.commit()
-    return {"detail": "Successfully unfollowed"}
+    result = await db.execute(query)
+    users = result.all()
+    if users and len(users) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_id_cursor(users[-1].id)
+    if with_total:
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+    return rows_response(UserResponse, users, response)
 
 
 @router.get("/{user_id}/followers", response_model=List[UserResponse])
-async def get_followers(user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(UserORM).options(selectinload(UserORM.followers)).filter(UserORM.id == user_id)
+async def get_followers(
+    user_id: int,
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_FOLLOW_PAGE),
+    cursor: Optional[str] = None,
+    with_total: bool = False,
+    db: AsyncSession = Depends(get_read_db)
+):
+    return await follow_page(
+        db, response, user_id, follows.c.followed_id, follows.c.follower_id,
+        users_table.c.follower_count, cursor, limit, with_total
     )
-    user = result.scalar_one_or_none()
+
+
+@router.get("/{user_id}/following", response_model=List[UserResponse])
+async def get_following(
+    user_id: int,
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_FOLLOW_PAGE),
+    cursor: Optional[str] = None,
+    with_total: bool = False,
+    db: AsyncSession = Depends(get_read_db)
+):
+    return await follow_page(
+        db, response, user_id, follows.c.follower_id, follows.c.followed_id,
+        users_table.c.following_count, cursor, limit, with_total
+    )
+
+
+@router.get("/{user_id}/feed", response_model=List[PostResponse])
+async def get_feed(
+    user_id: int,
+    response: Response,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    user = await db.scalar(select(UserORM.id).filter(UserORM.id == user_id, ACTIVE))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return user.followers
+    result = await db.execute(feed_query(user_id, cursor, limit, post_columns))
+    posts = result.all()
+    set_next_cursor(response, posts, limit)
+    return rows_response(PostResponse, posts, response)
 
 
-@router.get("/{user_id}/following", response_model=List[UserResponse])
-async def get_following(user_id: int, db: AsyncSession = Depends(get_db)):
+@router.get("/{user_id}/events")
+async def user_events(user_id: int, request: Request):
+    """Server-Sent Events пользователя: post.created и follow.created (новый подписчик)"""
+    async with read_sessionmaker(is_pinned(request))() as db:
+        found = await db.scalar(select(UserORM.id).filter(UserORM.id == user_id, ACTIVE))
+    if not found:
+        raise HTTPException(status_code=404, detail="User not found")
+    return event_response(request, user_topic(user_id))
+
+
+@router.get("/{user_id}/suggestions", response_model=List[UserSuggestion])
+async def get_suggestions(
+    user_id: int,
+    limit: int = Query(10, ge=1, le=settings.SUGGESTIONS_PER_USER),
+    db: AsyncSession = Depends(get_read_db)
+):
+    user = await db.scalar(select(UserORM.id).filter(UserORM.id == user_id, ACTIVE))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Рекомендации считает пакетная команда refresh_suggestions; здесь только
+    # отбрасываем тех, на кого пользователь успел подписаться после пересчёта
+    already_following = select(follows.c.followed_id).where(
+        follows.c.follower_id == user_id, follows.c.followed_id == suggestions.c.suggested_id
+    ).exists()
     result = await db.execute(
-        select(UserORM).options(selectinload(UserORM.following)).filter(UserORM.id == user_id)
+        select(*user_columns, suggestions.c.mutual_count)
+        .join(suggestions, suggestions.c.suggested_id == users_table.c.id)
+        .where(suggestions.c.user_id == user_id, ~already_following, ACTIVE)
+        .order_by(suggestions.c.mutual_count.desc(), suggestions.c.suggested_id)
+        .limit(limit)
     )
-    user = result.scalar_one_or_none()
-    if not user:
+    return rows_response(UserSuggestion, result.all())
+
+
+@router.get("/{user_id}/mutuals", response_model=List[UserResponse])
+async def get_mutuals(
+    user_id: int,
+    other: int,
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_FOLLOW_PAGE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    found = await db.scalar(select(func.count()).where(users_table.c.id.in_([user_id, other]), ACTIVE))
+    if found < len({user_id, other}):
         raise HTTPException(status_code=404, detail="User not found")
 
-    return user.following
\ No newline at end of file
+    # Пересечение подписок двух пользователей: оба соединения идут по
+    # первичному ключу follows (follower_id, followed_id)
+    mine = follows.alias("mine")
+    theirs = follows.alias("theirs")
+    query = (
+        select(*user_columns)
+        .join(mine, and_(mine.c.followed_id == users_table.c.id, mine.c.follower_id == user_id))
+        .join(theirs, and_(theirs.c.followed_id == users_table.c.id, theirs.c.follower_id == other))
+        .where(ACTIVE)
+        .order_by(users_table.c.id)
+        .limit(limit)
+    )
+    if cursor:
+        query = query.where(users_table.c.id > decode_id_cursor(cursor))
+
+    result = await db.execute(query)
+    users = result.all()
+    if users and len(users) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_id_cursor(users[-1].id)
+    return rows_response(UserResponse, users, response)
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class BulkRowError(BaseModel):
+    index: int
+    detail: str
+
+
+class BulkResponse(BaseModel):
+    created: int = 0
+    failed: int = 0
+    ids: List[int] = []
+    errors: List[BulkRowError] = []
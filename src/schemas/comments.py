@@ -7,6 +7,7 @@ class CommentCreate(BaseModel):
     content: str
     author_id: int
     post_id: int
+    parent_id: Optional[int] = None
 
 
 class CommentUpdate(BaseModel):
@@ -18,7 +19,10 @@ class CommentResponse(BaseModel):
     content: str
     author_id: int
     post_id: int
+    parent_id: Optional[int] = None
+    depth: int = 0
     created_at: datetime
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
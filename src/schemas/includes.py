@@ -0,0 +1,18 @@
+from typing import List, Optional
+
+from src.schemas.comments import CommentResponse
+from src.schemas.posts import PostResponse
+from src.schemas.users import UserResponse
+
+
+# Связанные объекты заполняются только при ?include=..., иначе поля
+# отсутствуют в ответе (эндпоинты отдают их с response_model_exclude_unset)
+
+class PostWithRelations(PostResponse):
+    author: Optional[UserResponse] = None
+    comments: Optional[List[CommentResponse]] = None
+
+
+class CommentWithRelations(CommentResponse):
+    author: Optional[UserResponse] = None
+    post: Optional[PostResponse] = None
@@ -20,6 +20,13 @@ class PostResponse(BaseModel):
     content: str
     author_id: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    comment_count: int = 0
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class PostSearchResult(PostResponse):
+    rank: float
+    headline: Optional[str] = None
\ No newline at end of file
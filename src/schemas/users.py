@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -12,12 +12,32 @@ class UserResponse(BaseModel):
     username: str
     email: str
     created_at: datetime
-    hashed_password: str
+    updated_at: Optional[datetime] = None
+    follower_count: int = 0
+    following_count: int = 0
+    post_count: int = 0
+    comment_count: int = 0
 
     class Config:
         from_attributes = True
 
+class UserSuggestion(UserResponse):
+    mutual_count: int
+
+class UserLogin(BaseModel):
+    username: str
+    password: str
+
 class UserUpdate(BaseModel):
     username: Optional[str] = None
     email: Optional[str] = None
-    password: Optional[str] = None
\ No newline at end of file
+    password: Optional[str] = None
+
+class FollowCreate(BaseModel):
+    follower_id: int
+    followed_id: int
+
+class FollowBulkResponse(BaseModel):
+    followed: List[int] = []
+    already_following: List[int] = []
+    missing: List[int] = []
\ No newline at end of file
@@ -0,0 +1,128 @@
+import asyncio
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import bcrypt
+from fastapi import HTTPException
+
+from settings import settings
+
+
+# bcrypt учитывает только первые 72 байта пароля, а bcrypt>=5 на длинных
+# паролях бросает ValueError — обрезаем явно, как это делали старые версии
+BCRYPT_MAX_BYTES = 72
+
+
+def _encode(password: str) -> bytes:
+    return password.encode()[:BCRYPT_MAX_BYTES]
+
+
+def _is_bcrypt(hashed: str) -> bool:
+    return hashed.startswith(("$2a$", "$2b$", "$2y$"))
+
+
+class PasswordHasher:
+    """
+    bcrypt в отдельном ограниченном пуле потоков: хэширование занимает
+    сотни миллисекунд CPU и не должно блокировать event loop. Если очередь
+    пула длиннее max_queue, запрос сразу получает 503
+    """
+
+    def __init__(self, rounds: int, workers: int, max_queue: int):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # Для подбора размера пула под p99
+        self.in_flight = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def queued(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    async def _run(self, fn, *args):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Password hashing is overloaded",
+                headers={"Retry-After": "1"},
+            )
+
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            return fn(*args), started - submitted
+
+        self.in_flight += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            result, waited = await asyncio.get_running_loop().run_in_executor(self._executor, task)
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return result
+
+    def _hash(self, password: str) -> str:
+        return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds=self.rounds)).decode()
+
+    @staticmethod
+    def _verify(password: str, hashed: str) -> bool:
+        if not _is_bcrypt(hashed):
+            # Пароли, сохранённые до перехода на bcrypt, лежат открытым текстом
+            return hmac.compare_digest(password.encode(), hashed.encode())
+        return bcrypt.checkpw(_encode(password), hashed.encode())
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self._verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        Проверяет пароль и, если хэш устарел (другая стоимость или открытый
+        текст), возвращает новый хэш для сохранения
+        """
+        if not await self.verify(password, hashed):
+            return False, None
+        if self.needs_rehash(hashed):
+            return True, await self.hash(password)
+        return True, None
+
+    def needs_rehash(self, hashed: str) -> bool:
+        if not _is_bcrypt(hashed):
+            return True
+        # Формат: $2b$<cost>$<salt+hash>
+        return int(hashed.split("$")[2]) != self.rounds
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+password_hasher = PasswordHasher(
+    rounds=settings.BCRYPT_ROUNDS,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
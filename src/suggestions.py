@@ -0,0 +1,148 @@
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List
+
+from sqlalchemy import delete, func, select, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from settings import settings
+from src.models.users import ACTIVE, follows, not_deleted, User
+from src.models.suggestions import suggestions, suggestions_stale
+from src.jobs import enqueue, enqueue_cte, job
+
+
+async def mark_stale(db: AsyncSession, user_ids: Iterable[int]) -> None:
+    """Ставит пользователей в очередь на пересчёт рекомендаций"""
+    rows = [{"user_id": user_id} for user_id in set(user_ids)]
+    if rows:
+        await db.execute(insert(suggestions_stale).values(rows).on_conflict_do_nothing())
+
+
+def mark_stale_cte(user_ids, name: str = "mark_stale"):
+    """То же, что mark_stale, но как CTE: user_ids — подзапрос с id"""
+    return (
+        insert(suggestions_stale)
+        .from_select(["user_id"], user_ids)
+        .on_conflict_do_nothing()
+        .cte(name)
+    )
+
+
+def candidates(user_id):
+    """
+    Кандидаты для user_id как LATERAL-подзапрос: аккаунты, на которых подписаны
+    те, на кого подписан пользователь, по числу таких общих связей. У аккаунтов
+    с тысячами подписок берём случайную выборку, чтобы двухшаговый обход
+    не разрастался
+    """
+    hop = follows.alias("hop")
+    second_hop = follows.alias("second_hop")
+    own = follows.alias("own")
+
+    middle = (
+        select(hop.c.followed_id.label("id"))
+        .where(hop.c.follower_id == user_id)
+        .correlate_except(hop)
+        .order_by(func.random())
+        .limit(settings.SUGGESTIONS_FOLLOWING_SAMPLE)
+        .lateral("middle")
+    )
+    reached = (
+        select(second_hop.c.followed_id.label("id"))
+        .where(second_hop.c.follower_id == middle.c.id)
+        .order_by(func.random())
+        .limit(settings.SUGGESTIONS_HOP_SAMPLE)
+        .lateral("reached")
+    )
+    already_following = (
+        select(own.c.followed_id)
+        .where(own.c.follower_id == user_id, own.c.followed_id == reached.c.id)
+        .correlate_except(own)
+        .exists()
+    )
+    mutual_count = func.count().label("mutual_count")
+    return (
+        select(reached.c.id.label("suggested_id"), mutual_count)
+        .select_from(middle.join(reached, true()))
+        .where(reached.c.id != user_id, ~already_following, not_deleted(reached.c.id))
+        .correlate_except(middle, reached)
+        .group_by(reached.c.id)
+        .order_by(mutual_count.desc(), reached.c.id)
+        .limit(settings.SUGGESTIONS_PER_USER)
+        .lateral("candidates")
+    )
+
+
+async def refresh_batch(db: AsyncSession, batch_size: int) -> List[int]:
+    """
+    Пересчитывает рекомендации для пачки пользователей из очереди и снимает
+    их с очереди. SKIP LOCKED позволяет запускать несколько пересчётов сразу
+    """
+    batch = (
+        select(suggestions_stale.c.user_id)
+        .order_by(suggestions_stale.c.marked_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(
+        delete(suggestions_stale)
+        .where(suggestions_stale.c.user_id.in_(batch.scalar_subquery()))
+        .returning(suggestions_stale.c.user_id)
+    )
+    user_ids = list(result.scalars())
+    if not user_ids:
+        return user_ids
+
+    await db.execute(delete(suggestions).where(suggestions.c.user_id.in_(user_ids)))
+
+    users = select(User.id.label("user_id")).where(User.id.in_(user_ids), ACTIVE).subquery("batch")
+    found = candidates(users.c.user_id)
+    await db.execute(
+        insert(suggestions).from_select(
+            ["user_id", "suggested_id", "mutual_count"],
+            select(users.c.user_id, found.c.suggested_id, found.c.mutual_count)
+            .select_from(users.join(found, true())),
+        )
+    )
+    return user_ids
+
+
+async def mark_all_stale(db: AsyncSession) -> None:
+    await db.execute(
+        insert(suggestions_stale)
+        .from_select(["user_id"], select(follows.c.follower_id).distinct())
+        .on_conflict_do_nothing()
+    )
+
+
+REFRESH_JOB = "suggestions.refresh"
+
+
+def schedule_refresh_cte(when):
+    """
+    Ставит пересчёт очереди рекомендаций не чаще раза в
+    SUGGESTIONS_REFRESH_INTERVAL_SECONDS: ключ идемпотентности — номер
+    интервала, задача выполняется в его конце и забирает всех накопившихся.
+    None, если автоматический пересчёт выключен
+    """
+    interval = settings.SUGGESTIONS_REFRESH_INTERVAL_SECONDS
+    if not interval:
+        return None
+    bucket = int(time.time() // interval)
+    return enqueue_cte(
+        REFRESH_JOB,
+        run_at=datetime.fromtimestamp((bucket + 1) * interval, timezone.utc),
+        idempotency_key=f"{REFRESH_JOB}:{bucket}",
+        when=when,
+        name="schedule_refresh",
+    )
+
+
+@job(REFRESH_JOB)
+async def refresh_job(db: AsyncSession, payload: dict) -> None:
+    # Одна пачка на задачу; если очередь не опустела — следующая задача в той же транзакции
+    batch_size = payload.get("batch_size", settings.SUGGESTIONS_REFRESH_BATCH_SIZE)
+    user_ids = await refresh_batch(db, batch_size)
+    if len(user_ids) == batch_size:
+        await enqueue(db, REFRESH_JOB, {"batch_size": batch_size})
@@ -0,0 +1,79 @@
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import select
+
+from src.models.comments import Comment
+from src.models.posts import Post
+from src.models.users import not_deleted
+from src.pagination import decode_id_cursor, decode_path_cursor
+from src.schemas.comments import CommentResponse
+
+
+# Наибольшая страница дерева и ответов
+MAX_THREAD_PAGE = 1000
+
+# Запас для отсечения секций по дате поста: created_at — время начала
+# транзакции, и комментарий из транзакции, начатой раньше поста, «старше»
+# его. Суток хватает с избытком, а секции за прошлые месяцы всё равно отсекаются
+PRUNE_MARGIN = timedelta(days=1)
+
+comments_table = Comment.__table__
+comment_columns = [comments_table.c[name] for name in CommentResponse.model_fields]
+
+
+def not_older_than_post(post_id):
+    """
+    Избыточное условие для запросов по post_id: комментарии не старше поста
+    (с запасом PRUNE_MARGIN). Значение подзапроса известно при выполнении, и
+    Postgres пропускает секции comments за месяцы до поста, не заглядывая в
+    их индексы
+    """
+    posted = select(Post.created_at).where(Post.id == post_id).scalar_subquery()
+    return comments_table.c.created_at >= posted - PRUNE_MARGIN
+
+
+def not_older_than_comment(comment_id):
+    """То же для ответов: ответ не старше комментария, на который отвечает"""
+    parent = comments_table.alias("parent")
+    posted = select(parent.c.created_at).where(parent.c.id == comment_id).scalar_subquery()
+    return comments_table.c.created_at >= posted - PRUNE_MARGIN
+
+
+def tree_query(post_id: int, max_depth: int, cursor: Optional[str], limit: int):
+    """
+    Страница дерева комментариев поста в порядке обхода (родитель, затем его
+    ответы) одним запросом по индексу (post_id, path): сортировка по path уже
+    даёт этот порядок, рекурсивный обход не нужен
+    """
+    query = (
+        select(*comment_columns, comments_table.c.path)
+        .where(
+            comments_table.c.post_id == post_id,
+            comments_table.c.depth <= max_depth,
+            not_older_than_post(post_id),
+            not_deleted(comments_table.c.author_id),
+        )
+        .order_by(comments_table.c.path)
+        .limit(limit)
+    )
+    if cursor:
+        query = query.where(comments_table.c.path > decode_path_cursor(cursor))
+    return query
+
+
+def replies_query(comment_id: int, cursor: Optional[str], limit: int):
+    """Прямые ответы на комментарий по порядку id, по индексу (parent_id, id)"""
+    query = (
+        select(*comment_columns)
+        .where(
+            comments_table.c.parent_id == comment_id,
+            not_older_than_comment(comment_id),
+            not_deleted(comments_table.c.author_id),
+        )
+        .order_by(comments_table.c.id)
+        .limit(limit)
+    )
+    if cursor:
+        query = query.where(comments_table.c.id > decode_id_cursor(cursor))
+    return query
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+
+# settings.py требует параметры подключения; модульным тестам база не нужна
+for name, value in {
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_DB": "test",
+    "DATABASE_HOST": "localhost",
+    "DATABASE_PORT": "5432",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,50 @@
+import os
+import uuid
+from typing import List
+
+import pytest
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from settings import settings
+from src.models.users import User
+
+
+# Тесты на живом Postgres: DB_TESTS=1 и POSTGRES_*/DATABASE_* на отдельную
+# базу после alembic upgrade head. Каждый тест создаёт свои строки и удаляет их
+ENABLED = os.environ.get("DB_TESTS") == "1"
+
+users_table = User.__table__
+
+
+@pytest.fixture
+async def sessions():
+    if not ENABLED:
+        pytest.skip("set DB_TESTS=1 and point POSTGRES_* at a migrated test database")
+    # Без пула: у каждого теста свой цикл событий, соединения asyncpg к нему привязаны
+    engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def make_users(sessions):
+    created: List[int] = []
+
+    async def make(count: int) -> List[int]:
+        async with sessions() as db:
+            result = await db.execute(insert(users_table).returning(users_table.c.id), [
+                {"username": f"test-{uuid.uuid4().hex}", "email": f"{uuid.uuid4().hex}@test", "hashed_password": "-"}
+                for _ in range(count)
+            ])
+            ids = list(result.scalars())
+            await db.commit()
+        created.extend(ids)
+        return ids
+
+    yield make
+    # Посты, комментарии и подписки уходят каскадом
+    async with sessions() as db:
+        await db.execute(delete(users_table).where(users_table.c.id.in_(created)))
+        await db.commit()
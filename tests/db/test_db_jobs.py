@@ -0,0 +1,71 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, func, insert, select
+
+from src.jobs import claim, enqueue
+from src.models.jobs import jobs
+
+
+@pytest.fixture
+async def kind(sessions):
+    # Своя разновидность задач: воркеры приложения их не знают и не трогают
+    kind = f"test.{uuid.uuid4().hex}"
+    yield kind
+    async with sessions() as db:
+        await db.execute(delete(jobs).where(jobs.c.kind == kind))
+        await db.commit()
+
+
+async def claim_kind(db, kind: str, limit: int) -> set:
+    return {row.id for row in await claim(db, "test-worker", limit) if row.kind == kind}
+
+
+@pytest.mark.anyio
+async def test_concurrent_claims_do_not_overlap(sessions, kind):
+    async with sessions() as db:
+        enqueued = {await enqueue(db, kind, {"n": n}) for n in range(6)}
+        await db.commit()
+
+    # Первая транзакция держит свои строки, вторая их пропускает (SKIP LOCKED)
+    async with sessions() as first, sessions() as second:
+        first_claimed = await claim_kind(first, kind, 3)
+        second_claimed = await claim_kind(second, kind, 100)
+        await first.commit()
+        await second.commit()
+
+    assert len(first_claimed) == 3
+    assert first_claimed.isdisjoint(second_claimed)
+    assert first_claimed | second_claimed == enqueued
+
+
+@pytest.mark.anyio
+async def test_expired_lease_on_last_attempt_goes_dead(sessions, kind):
+    async with sessions() as db:
+        job_id = await db.scalar(insert(jobs).values(
+            kind=kind, status="running", attempts=3, max_attempts=3,
+            run_at=func.now() - timedelta(minutes=1),
+        ).returning(jobs.c.id))
+        await db.commit()
+
+        assert job_id not in await claim_kind(db, kind, 100)
+        await db.commit()
+        status, attempts = (await db.execute(
+            select(jobs.c.status, jobs.c.attempts).where(jobs.c.id == job_id)
+        )).one()
+
+    assert (status, attempts) == ("dead", 3)
+
+
+@pytest.mark.anyio
+async def test_expired_lease_with_attempts_left_is_reclaimed(sessions, kind):
+    async with sessions() as db:
+        job_id = await db.scalar(insert(jobs).values(
+            kind=kind, status="running", attempts=1, max_attempts=3,
+            run_at=func.now() - timedelta(minutes=1),
+        ).returning(jobs.c.id))
+        await db.commit()
+
+        assert job_id in await claim_kind(db, kind, 100)
+        await db.commit()
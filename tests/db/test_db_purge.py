@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import func, insert, or_, select, update
+
+from src.commands.reconcile_counters import post_counters, user_counters
+from src.models.comments import Comment
+from src.models.posts import Post
+from src.models.users import follows, User
+from src.purge import purge_user
+
+
+users_table = User.__table__
+posts_table = Post.__table__
+comments_table = Comment.__table__
+
+
+async def comment(db, author_id: int, post_id: int, parent_id=None) -> int:
+    return await db.scalar(insert(comments_table).values(
+        content="c", author_id=author_id, post_id=post_id, parent_id=parent_id
+    ).returning(comments_table.c.id))
+
+
+async def drift(db, model, counters, ids) -> list:
+    """Строки, где хранимый счётчик расходится с фактом"""
+    drifted = or_(*(getattr(model, name) != value for name, value in counters.items()))
+    return list(await db.scalars(select(model.id).where(model.id.in_(ids), drifted)))
+
+
+@pytest.mark.anyio
+async def test_purge_in_batches_removes_account_and_keeps_counters(sessions, make_users):
+    alice, bob = await make_users(2)
+    async with sessions() as db:
+        post_ids = [
+            await db.scalar(insert(posts_table).values(title="t", content="c", author_id=author).returning(posts_table.c.id))
+            for author in (alice, alice, alice, bob)
+        ]
+        own_post, _, _, bobs_post = post_ids
+        root = await comment(db, alice, bobs_post)
+        # Чужой ответ на комментарий alice: удаляется вместе с поддеревом
+        await comment(db, bob, bobs_post, parent_id=root)
+        # Ветка bob под постом alice: уходит вместе с постом
+        bobs_root = await comment(db, bob, own_post)
+        await comment(db, alice, own_post, parent_id=bobs_root)
+        await comment(db, bob, own_post, parent_id=bobs_root)
+        await db.execute(insert(follows), [
+            {"follower_id": alice, "followed_id": bob},
+            {"follower_id": bob, "followed_id": alice},
+        ])
+        await db.execute(update(User).where(User.id.in_([alice, bob])).values(**user_counters()))
+        await db.execute(update(Post).where(Post.id.in_(post_ids)).values(**post_counters()))
+        await db.execute(update(users_table).where(users_table.c.id == alice).values(deleted_at=func.now()))
+        await db.commit()
+
+    keys = set()
+    passes = 0
+    done = False
+    while not done:
+        async with sessions() as db:
+            done = await purge_user(db, alice, 2, keys)
+            await db.commit()
+        passes += 1
+    assert passes > 1
+
+    async with sessions() as db:
+        assert await db.scalar(select(func.count()).where(users_table.c.id == alice)) == 0
+        assert await db.scalar(select(func.count()).where(posts_table.c.author_id == alice)) == 0
+        assert await db.scalar(select(func.count()).where(comments_table.c.author_id == alice)) == 0
+        # Оба комментария bob жили в поддеревьях, которые уходят вместе с alice
+        assert await db.scalar(select(func.count()).where(comments_table.c.author_id == bob)) == 0
+        assert await drift(db, User, user_counters(), [bob]) == []
+        assert await drift(db, Post, post_counters(), [bobs_post]) == []
+        follower_count, comment_count = (await db.execute(
+            select(users_table.c.follower_count, users_table.c.comment_count).where(users_table.c.id == bob)
+        )).one()
+
+    assert (follower_count, comment_count) == (0, 0)
+    assert {f"user:{bob}", f"post:{bobs_post}", f"post:{own_post}", f"comment:{root}"} <= keys
+
+
+@pytest.mark.anyio
+async def test_purge_of_missing_user_finishes(sessions):
+    async with sessions() as db:
+        assert await purge_user(db, 0, 10, set())
+        await db.rollback()
@@ -0,0 +1,17 @@
+import pytest
+
+from settings import settings
+from src.replicas import Replica
+
+
+@pytest.mark.anyio
+async def test_primary_as_replica_reports_no_lag(sessions):
+    # Запрос отставания работает и на primary: pg_is_in_recovery() = false
+    replica = Replica(settings.DATABASE_URL)
+    try:
+        await replica.check()
+    finally:
+        await replica.engine.dispose()
+    assert replica.healthy
+    assert replica.lag_seconds == 0
+    assert replica.last_error is None
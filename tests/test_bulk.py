@@ -0,0 +1,32 @@
+import pytest
+from fastapi import HTTPException
+
+from settings import settings
+from src.bulk import iter_ndjson
+
+
+class FakeRequest:
+    def __init__(self, *chunks: bytes):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+async def collect(request):
+    return [item async for item in iter_ndjson(request)]
+
+
+@pytest.mark.anyio
+async def test_lines_split_across_chunks():
+    rows = await collect(FakeRequest(b'{"a": 1}\n{"a"', b': 2}\n\nnot json'))
+    assert rows == [(0, {"a": 1}), (1, {"a": 2}), (2, "not json")]
+
+
+@pytest.mark.anyio
+async def test_long_line_is_rejected_before_it_ends(monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_MAX_LINE_BYTES", 8)
+    with pytest.raises(HTTPException) as error:
+        await collect(FakeRequest(b'{"a": 1}\n', b'{"a": "1234', b'5678"}\n'))
+    assert error.value.status_code == 413
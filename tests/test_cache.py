@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from src.cache import Cache, CacheBackend, LRUBackend
+
+
+def test_backend_must_implement_interface():
+    class Partial(CacheBackend):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def make_cache():
+    return Cache(LRUBackend(max_size=10, ttl=60))
+
+
+@pytest.mark.anyio
+async def test_concurrent_misses_share_one_load():
+    cache = make_cache()
+    release = asyncio.Event()
+    loads = 0
+
+    async def loader():
+        nonlocal loads
+        loads += 1
+        await release.wait()
+        return {"id": 1}
+
+    waiting = [asyncio.create_task(cache.get_or_load("post:1", loader)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*waiting) == [{"id": 1}] * 5
+    assert loads == 1
+    assert (cache.misses, cache.coalesced) == (1, 4)
+
+    assert await cache.get_or_load("post:1", loader) == {"id": 1}
+    assert (loads, cache.hits) == (1, 1)
+
+
+@pytest.mark.anyio
+async def test_invalidation_during_load_is_not_overwritten():
+    cache = make_cache()
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def stale_loader():
+        started.set()
+        await release.wait()
+        return {"title": "old"}
+
+    load = asyncio.create_task(cache.get_or_load("post:1", stale_loader))
+    await started.wait()
+    # Запись закоммичена, пока читали старую версию
+    await cache.invalidate("post:1")
+    release.set()
+    assert await load == {"title": "old"}
+
+    async def fresh_loader():
+        return {"title": "new"}
+
+    assert await cache.get_or_load("post:1", fresh_loader) == {"title": "new"}
+
+
+@pytest.mark.anyio
+async def test_failed_load_reaches_waiters_and_is_not_cached():
+    cache = make_cache()
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise RuntimeError("db down")
+
+    waiting = [asyncio.create_task(cache.get_or_load("user:1", failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiting, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def loader():
+        return {"id": 1}
+
+    assert await cache.get_or_load("user:1", loader) == {"id": 1}
+
+
+@pytest.mark.anyio
+async def test_missing_rows_are_not_cached():
+    cache = make_cache()
+    loads = 0
+
+    async def loader():
+        nonlocal loads
+        loads += 1
+        return None
+
+    assert await cache.get_or_load("user:404", loader) is None
+    assert await cache.get_or_load("user:404", loader) is None
+    assert loads == 2
+
+
+@pytest.mark.anyio
+async def test_lru_evicts_least_recently_used():
+    backend = LRUBackend(max_size=2, ttl=60)
+    await backend.set("a", 1)
+    await backend.set("b", 2)
+    assert await backend.get("a") == 1
+    await backend.set("c", 3)
+    assert (await backend.get("a"), await backend.get("b"), await backend.get("c")) == (1, None, 3)
+    assert backend.stats()["evictions"] == 1
@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+from starlette.requests import Request
+
+from src.conditional import check_not_modified, not_modified, validators
+from src.pagination import NEXT_CURSOR_HEADER, decode_cursor
+
+
+UPDATED = datetime(2026, 10, 18, 12, 0, 0, 500000, tzinfo=timezone.utc)
+
+
+def make_request(**headers) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "headers": raw})
+
+
+def test_etag_depends_on_ids_and_versions():
+    etag, last_modified = validators([(1, UPDATED), (2, None)])
+    assert etag.startswith('W/"')
+    assert last_modified == UPDATED
+    assert validators([(1, UPDATED), (2, None)])[0] == etag
+    assert validators([(2, None), (1, UPDATED)])[0] != etag
+    assert validators([(1, UPDATED.replace(microsecond=0)), (2, None)])[0] != etag
+
+
+def test_cached_string_version_matches_database_datetime():
+    # Из кэша updated_at приходит ISO-строкой, из БД — datetime
+    assert validators([(1, UPDATED.isoformat())]) == validators([(1, UPDATED)])
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("{etag}", True),
+    ('"other", {etag}', True),
+    ("*", True),
+    ('"other"', False),
+])
+def test_if_none_match(header, expected):
+    etag, last_modified = validators([(1, UPDATED)])
+    request = make_request(if_none_match=header.format(etag=etag))
+    assert not_modified(request, etag, last_modified) is expected
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    etag, last_modified = validators([(1, UPDATED)])
+    request = make_request(if_none_match='"other"', if_modified_since=format_datetime(UPDATED, usegmt=True))
+    assert not not_modified(request, etag, last_modified)
+
+
+@pytest.mark.parametrize("since, expected", [
+    # HTTP-даты с точностью до секунды: дробная часть updated_at не мешает
+    (UPDATED, True),
+    (UPDATED.replace(second=1), True),
+    (UPDATED.replace(minute=59, hour=11), False),
+])
+def test_if_modified_since(since, expected):
+    etag, last_modified = validators([(1, UPDATED)])
+    request = make_request(if_modified_since=format_datetime(since.replace(microsecond=0), usegmt=True))
+    assert not_modified(request, etag, last_modified) is expected
+
+
+def test_malformed_if_modified_since_is_ignored():
+    etag, last_modified = validators([(1, UPDATED)])
+    assert not not_modified(make_request(if_modified_since="yesterday"), etag, last_modified)
+
+
+class Row:
+    def __init__(self, row_id: int):
+        self.id = row_id
+        self.updated_at = UPDATED
+        self.created_at = datetime(2026, 10, row_id, tzinfo=timezone.utc)
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, query):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+@pytest.mark.anyio
+async def test_list_304_keeps_next_cursor():
+    rows = [Row(1), Row(2)]
+    etag, _ = validators([(row.id, row.updated_at) for row in rows])
+
+    response = await check_not_modified(make_request(if_none_match=etag), FakeSession(rows), None, limit=2)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER]) == (rows[-1].created_at, 2)
+
+    response = await check_not_modified(make_request(if_none_match=etag), FakeSession(rows), None, limit=3)
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+@pytest.mark.anyio
+async def test_list_ignores_if_modified_since_when_a_row_leaves_the_page():
+    since = make_request(if_modified_since=format_datetime(UPDATED.replace(microsecond=0), usegmt=True))
+    etag, _ = validators([(row.id, row.updated_at) for row in [Row(1), Row(2)]])
+    # Строка 1 удалена: max(updated_at) прежний, а содержимое страницы другое
+    page = FakeSession([Row(2)])
+
+    assert await check_not_modified(since, page, None, limit=2) is None
+    response = await check_not_modified(make_request(if_none_match=etag), page, None, limit=2)
+    assert response is None
+    # Одиночная сущность по-прежнему понимает If-Modified-Since
+    assert (await check_not_modified(since, page, None)).status_code == 304
+
+
+@pytest.mark.anyio
+async def test_unconditional_request_skips_version_query():
+    assert await check_not_modified(make_request(), None, None) is None
@@ -0,0 +1,79 @@
+import base64
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException, Response
+
+from src.pagination import (
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    decode_id_cursor,
+    decode_path_cursor,
+    decode_rank_cursor,
+    encode_cursor,
+    encode_id_cursor,
+    encode_path_cursor,
+    encode_rank_cursor,
+    set_next_cursor,
+)
+
+
+def raw(payload: bytes) -> str:
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 10, 18, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, 42)
+    assert decode_cursor(cursor) == (created_at, 42)
+    # Курсор уходит в заголовок и query string: без паддинга и небезопасных символов
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+def test_other_cursors_round_trip():
+    assert decode_rank_cursor(encode_rank_cursor(0.25, 7)) == (0.25, 7)
+    assert decode_id_cursor(encode_id_cursor(9)) == 9
+    assert decode_path_cursor(encode_path_cursor("0000000a.0000000b", 11)) == "0000000a.0000000b"
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor!",
+    raw(b"not json"),
+    raw(b"null"),
+    raw(b"[1]"),
+    raw(b'["2026-10-18T12:00:00+00:00", "x"]'),
+    raw(b'["yesterday", 1]'),
+    raw(b"[5, 1]"),
+    raw(b"\xff\xfe"),
+])
+def test_invalid_cursor_is_bad_request(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("decode, cursor", [
+    (decode_rank_cursor, raw(b"[null, 1]")),
+    (decode_id_cursor, raw(b"[null]")),
+    (decode_path_cursor, raw(b"[5, 1]")),
+])
+def test_invalid_typed_cursor_is_bad_request(decode, cursor):
+    with pytest.raises(HTTPException) as error:
+        decode(cursor)
+    assert error.value.status_code == 400
+
+
+class Row:
+    def __init__(self, row_id: int):
+        self.id = row_id
+        self.created_at = datetime(2026, 10, row_id, tzinfo=timezone.utc)
+
+
+def test_next_cursor_only_for_full_page():
+    response = Response()
+    set_next_cursor(response, [Row(1), Row(2)], limit=3)
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+    set_next_cursor(response, [Row(1), Row(2), Row(3)], limit=3)
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER]) == (Row(3).created_at, 3)
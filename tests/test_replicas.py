@@ -0,0 +1,73 @@
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from starlette.requests import Request
+
+from src import replicas
+from src.cache import Cache, LRUBackend
+
+
+class FakeSession:
+    """Сессия с одной «строкой»: value читает load"""
+
+    def __init__(self, value, bind=None):
+        self.value = value
+        self.bind = bind
+        self.reads = 0
+
+
+async def load(session):
+    session.reads += 1
+    return session.value
+
+
+def make_request(pinned: bool) -> Request:
+    headers = []
+    if pinned:
+        headers.append((replicas.PIN_HEADER.lower().encode(), f"{time.time() + 5:.3f}".encode()))
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+@pytest.fixture
+def primary(monkeypatch):
+    session = FakeSession("new", bind=replicas.engine)
+
+    @asynccontextmanager
+    async def sessionmaker():
+        yield session
+
+    monkeypatch.setattr(replicas, "AsyncSessionLocal", sessionmaker)
+    monkeypatch.setattr(replicas, "cache", Cache(LRUBackend(max_size=10, ttl=30)))
+    return session
+
+
+@pytest.mark.anyio
+async def test_pinned_read_sees_write_despite_stale_cache(primary):
+    replica = FakeSession("old")
+    await replicas.cache.backend.set("post:1", "old")
+
+    assert await replicas.cached_read(make_request(pinned=True), primary, "post:1", load) == "new"
+    # Мимо кэша: чужую запись закреплённый клиент не трогает
+    assert await replicas.cache.backend.get("post:1") == "old"
+    assert replica.reads == 0
+
+
+@pytest.mark.anyio
+async def test_miss_is_filled_from_primary_not_replica(primary):
+    replica = FakeSession("old")
+    await replicas.cache.backend.set("post:1", "old")
+    await replicas.cache.invalidate("post:1")
+
+    assert await replicas.cached_read(make_request(pinned=False), replica, "post:1", load) == "new"
+    assert replica.reads == 0
+    assert await replicas.cache.backend.get("post:1") == "new"
+    # Закреплённый клиент после записи видит новое значение и при попадании
+    assert await replicas.cached_read(make_request(pinned=True), primary, "post:1", load) == "new"
+
+
+@pytest.mark.anyio
+async def test_unpinned_hit_is_served_from_cache(primary):
+    await replicas.cache.backend.set("post:1", "cached")
+    assert await replicas.cached_read(make_request(pinned=False), FakeSession("old"), "post:1", load) == "cached"
+    assert primary.reads == 0
@@ -0,0 +1,67 @@
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import Response
+
+from src.schemas.comments import CommentResponse
+from src.schemas.posts import PostResponse, PostSearchResult
+from src.schemas.users import UserResponse
+from src.serialization import render_rows, rows_response
+
+
+CREATED = datetime(2026, 10, 18, 12, 0, 0, 123456, tzinfo=timezone.utc)
+
+ROWS = {
+    UserResponse: [
+        {"id": 1, "username": "anna", "email": "anna@example.com", "created_at": CREATED,
+         "updated_at": None, "follower_count": 3, "following_count": 0, "post_count": 2, "comment_count": 5},
+    ],
+    PostResponse: [
+        {"id": 1, "title": "Привет", "content": "«кавычки» и \"escapes\"\n", "author_id": 1,
+         "created_at": CREATED, "updated_at": CREATED + timedelta(hours=1), "comment_count": 0},
+        {"id": 2, "title": "", "content": "emoji 🎉", "author_id": 1,
+         "created_at": CREATED.astimezone(timezone(timedelta(hours=3))), "updated_at": None, "comment_count": 7},
+    ],
+    PostSearchResult: [
+        {"id": 3, "title": "t", "content": "c", "author_id": 1, "created_at": CREATED,
+         "updated_at": None, "comment_count": 0, "rank": 0.0607927, "headline": None},
+    ],
+    CommentResponse: [
+        {"id": 1, "content": "ответ", "author_id": 1, "post_id": 1, "parent_id": None,
+         "depth": 0, "created_at": CREATED, "updated_at": None},
+        {"id": 2, "content": "ещё", "author_id": 2, "post_id": 1, "parent_id": 1,
+         "depth": 1, "created_at": CREATED, "updated_at": CREATED},
+    ],
+}
+
+
+def as_rows(dicts, extra=()):
+    """Строки результата как из SQLAlchemy: кортежи с _fields, плюс лишние колонки"""
+    fields = list(dicts[0]) + list(extra)
+    Row = namedtuple("Row", fields)
+    return [Row(*row.values(), *(f"extra-{name}" for name in extra)) for row in dicts]
+
+
+@pytest.mark.parametrize("schema", list(ROWS))
+def test_render_rows_matches_response_model(schema):
+    dicts = [{name: row[name] for name in schema.model_fields} for row in ROWS[schema]]
+    # Так тело сериализует FastAPI через response_model
+    expected = [schema.model_validate(row).model_dump(mode="json") for row in dicts]
+    assert json.loads(render_rows(schema, as_rows(dicts, extra=("path",)))) == expected
+
+
+def test_empty_page():
+    assert render_rows(PostResponse, []) == b"[]"
+
+
+def test_rows_response_keeps_headers():
+    response = Response()
+    response.headers["X-Next-Cursor"] = "abc"
+    response.headers["ETag"] = 'W/"1"'
+    rendered = rows_response(PostResponse, as_rows(ROWS[PostResponse]), response)
+    assert rendered.media_type == "application/json"
+    assert rendered.headers["X-Next-Cursor"] == "abc"
+    assert rendered.headers["ETag"] == 'W/"1"'
+    assert len(json.loads(rendered.body)) == 2